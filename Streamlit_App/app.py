@@ -3,41 +3,175 @@ from app_sidebar import sidebar
 from llm_functions import instantiate_LLM_main, get_api_keys_from_local_env
 from retrieval import retrieval_main
 from resume_analyzer import resume_analyzer_main
-from app_display_results import display_resume_analysis
+from app_display_results import (
+    display_resume_analysis,
+    create_result_placeholders,
+    display_stage_results,
+    display_streamed_field,
+    display_token_usage,
+)
+from llm_cache import get_llm_cache
+from rate_limiter import get_rate_limiters_stats
+from results_store import get_result_key, load_result
+from prompt_templates import get_registry_stats
+from client_registry import preconnect, get_client_registry_stats
+from app_constants import PRECONNECT_CLIENTS
+from tracing import trace
+
+
+def analyze_resume(result_key=None, on_stage_done=None, on_field=None):
+    """Create the retrieval, instantiate the LLMs and analyze the uploaded resume.
+    on_stage_done is called with (stage_name, result) as soon as an analysis stage is done.
+    on_field is called with (path, value) for each field of the streamed extraction responses.
+    """
+
+    # 1. Create the Langchain retrieval
+    retrieval_main()
+
+    # 2. Instantiate a deterministic LLM with a temperature of 0.0.
+    st.session_state.llm = instantiate_LLM_main(temperature=0.0, top_p=0.95)
+
+    # 3. Instantiate LLM with temperature >0.1 for creativity.
+    st.session_state.llm_creative = instantiate_LLM_main(
+        temperature=st.session_state.temperature,
+        top_p=st.session_state.top_p,
+    )
+
+    # 4. Analyze the resume
+    get_llm_cache().cache_creative = st.session_state.cache_creative_responses
+    SCANNED_RESUME = resume_analyzer_main(
+        llm=st.session_state.llm,
+        llm_creative=st.session_state.llm_creative,
+        documents=st.session_state.documents,
+        language=st.session_state.assistant_language,
+        retriever=st.session_state.retriever,
+        result_key=result_key,
+        on_stage_done=on_stage_done,
+        extraction_mode=st.session_state.extraction_mode,
+        streaming=st.session_state.streaming,
+        prompt_layout=st.session_state.prompt_layout,
+        on_field=on_field,
+    )
+
+    return SCANNED_RESUME
 
 
 def main():
     """Analyze the uploaded resume."""
 
+    force_refresh = st.checkbox(
+        "Force refresh",
+        help="Analyze the resume again, even if it has already been analyzed with the same settings.",
+    )
+
     if st.button("Analyze resume"):
         with st.spinner("Please wait..."):
             try:
-                # 1. Create the Langchain retrieval
-                retrieval_main()
-
-                # 2. Instantiate a deterministic LLM with a temperature of 0.0.
-                st.session_state.llm = instantiate_LLM_main(temperature=0.0, top_p=0.95)
+                # 1. Reuse the stored analysis of this resume (same PDF, provider, model, language, prompts and settings).
+                if st.session_state.uploaded_file is None:
+                    st.error("Please upload a resume!")
+                    st.stop()
 
-                # 3. Instantiate LLM with temperature >0.1 for creativity.
-                st.session_state.llm_creative = instantiate_LLM_main(
-                    temperature=st.session_state.temperature,
-                    top_p=st.session_state.top_p,
+                result_key = get_result_key(
+                    st.session_state.uploaded_file.getvalue(),
+                    st.session_state.LLM_provider,
+                    st.session_state.selected_model,
+                    st.session_state.assistant_language,
+                    settings={
+                        "extraction_mode": st.session_state.extraction_mode,
+                        "structured_output": st.session_state.structured_output,
+                        "prompt_layout": st.session_state.prompt_layout,
+                        "temperature": st.session_state.temperature,
+                        "top_p": st.session_state.top_p,
+                        "reranker": st.session_state.reranker,
+                        "retrieval_token_budget": st.session_state.retrieval_token_budget,
+                    },
                 )
+                SCANNED_RESUME = None if force_refresh else load_result(result_key)
 
-                # 4. Analyze the resume
-                st.session_state.SCANNED_RESUME = resume_analyzer_main(
-                    llm=st.session_state.llm,
-                    llm_creative=st.session_state.llm_creative,
-                    documents=st.session_state.documents,
-                )
+                if SCANNED_RESUME is not None:
+                    st.info(
+                        "This resume has already been analyzed. Check 'Force refresh' to analyze it again."
+                    )
+                    st.session_state.SCANNED_RESUME = SCANNED_RESUME
+                    display_resume_analysis(st.session_state.SCANNED_RESUME)
+                else:
+                    # 2. Analyze the resume: progress messages are displayed above the results,
+                    # and each section is displayed as soon as its analysis stage is done.
+                    progress_container = st.container()
+                    placeholders = create_result_placeholders()
 
-                # 5. Display results
-                display_resume_analysis(st.session_state.SCANNED_RESUME)
+                    def on_stage_done(stage_name, stage_result):
+                        display_stage_results(placeholders, stage_name, stage_result)
+
+                    # With streaming, the extracted sections are previewed before their analysis is done.
+                    streamed_sections = {}
+
+                    def on_field(path, value):
+                        display_streamed_field(
+                            placeholders, streamed_sections, path, value
+                        )
+
+                    with progress_container, trace(
+                        "resume_analysis", file=st.session_state.uploaded_file.name
+                    ) as tracer:
+                        st.session_state.SCANNED_RESUME = analyze_resume(
+                            result_key, on_stage_done=on_stage_done, on_field=on_field
+                        )
+                    st.caption(
+                        f"Trace saved to {tracer.trace_path} (open it in https://ui.perfetto.dev)."
+                    )
+
+                    # 3. Display the overview and scores
+                    display_resume_analysis(
+                        st.session_state.SCANNED_RESUME, placeholders
+                    )
+
+                display_token_usage(st.session_state.SCANNED_RESUME)
+
+                cache_stats = get_llm_cache().stats()
+                st.caption(
+                    f"LLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                    f"{cache_stats['entries']} cached responses."
+                )
+                templates_stats = get_registry_stats()
+                st.caption(
+                    f"Prompt templates (version {templates_stats['version']}): "
+                    f"{templates_stats['compiled_templates']} compiled, {templates_stats['hits']} reused."
+                )
+                for name, stats in get_rate_limiters_stats().items():
+                    st.caption(
+                        f"Rate limiter {name}: {stats['delayed_calls']}/{stats['calls']} calls delayed, "
+                        f"queue depth: {stats['queue_depth']} (max {stats['max_queue_depth']}), "
+                        f"max wait: {stats['max_wait']:.1f}s."
+                    )
 
             except Exception as e:
                 st.error(f"An error occured: {e}")
 
 
+def display_client_stats():
+    """Display the clients created and reused, and the connections of each provider in the sidebar
+    (see client_registry.py)."""
+    clients_stats = get_client_registry_stats()
+    if not clients_stats["clients"]:
+        return
+    with st.sidebar:
+        st.caption(
+            "Clients: "
+            + ", ".join(
+                f"{kind} {counters['created']} created, {counters['reused']} reused"
+                for kind, counters in clients_stats["clients"].items()
+            )
+            + "."
+        )
+        for name, stats in clients_stats["connections"].items():
+            st.caption(
+                f"Connections {name}: {stats['requests']} requests on {stats['connections']} connections "
+                f"({stats['reused_connections']} served by a reused connection)."
+            )
+
+
 if __name__ == "__main__":
     # 1. Set app configuration
     st.set_page_config(page_title="Resume Scanner", page_icon="🚀")
@@ -49,6 +183,22 @@ if __name__ == "__main__":
     # 3. Create the sidebar
     sidebar(openai_api_key, google_api_key, cohere_api_key)
 
+    # Open the connections of the selected provider in the background (once per API key, see client_registry.py).
+    if PRECONNECT_CLIENTS:
+        preconnect(
+            st.session_state.LLM_provider,
+            (
+                st.session_state.openai_api_key
+                if st.session_state.LLM_provider == "OpenAI"
+                else st.session_state.google_api_key
+            ),
+            (
+                st.session_state.cohere_api_key
+                if st.session_state.reranker == "cohere"
+                else None
+            ),
+        )
+
     # 4. File uploader widget
     st.session_state.uploaded_file = st.file_uploader(
         label="**Upload Resume**",
@@ -58,3 +208,6 @@ if __name__ == "__main__":
 
     # 5. Analyze the uploaded resume
     main()
+
+    # 6. Client and connection reuse, updated by the analysis
+    display_client_stats()
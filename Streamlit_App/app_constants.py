@@ -18,7 +18,109 @@ list_Assistant_Languages = [
     "Japanese",
 ]
 
-TMP_DIR = Path(__file__).resolve().parent.joinpath("data", "tmp")
+# Analysis results (results_<timestamp>.json) and their index.
+RESULTS_DIR = Path(__file__).resolve().parent.joinpath("data")
+RESULTS_INDEX_PATH = RESULTS_DIR.joinpath("results_index.json")
+
+# Maximum number of analysis stages (LLM calls) running at the same time.
+MAX_CONCURRENT_STAGES = 4
+
+# Maximum number of concurrent per-job and per-project LLM calls, per provider.
+# Set the value to 1 to process the items one after another.
+PROVIDER_CONCURRENCY = {"OpenAI": 8, "Google": 4}
+DEFAULT_PROVIDER_CONCURRENCY = 4
+
+# Extraction of the resume sections:
+# "multi_call": one LLM call per section group; "single_call": all the sections in one LLM call.
+EXTRACTION_MODES = ["multi_call", "single_call"]
+DEFAULT_EXTRACTION_MODE = "multi_call"
+
+# Structured output: the json responses are requested with their schema (see structured_output.py),
+# with function calling or JSON mode (OpenAI). Google models only get the schema through the prompt.
+# The responses are validated against their schema in all cases.
+STRUCTURED_OUTPUT = True
+
+# Streaming: the extraction responses are streamed, and each field is used as soon as it is complete
+# (displayed, and the duties of each work experience and the details of each project are extracted
+# before the end of the response). The token counts of streamed responses are estimated.
+STREAMING = False
+
+# Layout of the prompts on the whole resume (extraction, summary evaluation and resume evaluation):
+# "instructions_first": the instructions of each prompt, then the resume;
+# "resume_first": every prompt starts with the same prefix (PROMPT_RESUME_PREFIX with the resume),
+# and ends with its own instructions. The providers with prompt caching (e.g. OpenAI, from 1024 prompt tokens)
+# then reuse the prefix of the first calls of the analysis: its tokens are billed at a discount
+# ("cached_input" of LLM_PRICING) and prefilled faster.
+PROMPT_LAYOUTS = ["instructions_first", "resume_first"]
+DEFAULT_PROMPT_LAYOUT = "instructions_first"
+
+# Rate limits per provider and API key, shared by all the LLM, embedding and rerank calls of the process.
+# Calls over the limits are queued (delayed) instead of failing with a 429 error.
+# Set a value to None to remove the limit.
+RATE_LIMITS = {
+    "OpenAI": {"requests_per_minute": 3500, "tokens_per_minute": 60000},
+    "Google": {"requests_per_minute": 60, "tokens_per_minute": None},
+    "Cohere": {"requests_per_minute": 100, "tokens_per_minute": None},
+}
+
+# Estimated LLM prices in USD per million tokens, used to report the cost of an analysis.
+# "cached_input": price of the prompt tokens read from the prompt cache of the provider (default: "input").
+LLM_PRICING = {
+    "gpt-3.5-turbo-0125": {"input": 0.5, "cached_input": 0.25, "output": 1.5},
+    "gpt-3.5-turbo": {"input": 0.5, "cached_input": 0.25, "output": 1.5},
+    "gpt-4-turbo-preview": {"input": 10.0, "cached_input": 5.0, "output": 30.0},
+    "gemini-pro": {"input": 0.5, "output": 1.5},
+}
+
+# Vector store: below this number of chunks (a short resume), the chunk embeddings are searched
+# by brute force with NumPy (NumpyVectorStore) instead of building a FAISS index.
+# benchmarks/benchmark_vectorstore.py (dim 1536, median of 30 builds): NumPy builds faster at 5 chunks
+# (0.40 vs 0.44 ms) and on par at 20 (1.04 vs 1.03 ms); from 10 chunks its queries are slower
+# (0.072 vs 0.066 ms at 20, 0.166 vs 0.072 ms at 100), and at 1000 chunks it is slower overall (62 vs 47 ms build).
+NUMPY_VECTORSTORE_MAX_CHUNKS = 20
+
+# PDF parsing (see pdf_parser.py).
+# Backend: "pdfminer" (default), or a faster optional backend when installed: "pypdfium2" or "pymupdf".
+PDF_PARSER_BACKEND = "pdfminer"
+# PDFs with at least PDF_PARSER_PARALLEL_MIN_PAGES pages to parse are parsed in parallel,
+# in a pool of PDF_PARSER_WORKERS processes. Set PDF_PARSER_WORKERS to 1 to parse in the current process.
+PDF_PARSER_WORKERS = min(4, os.cpu_count() or 1)
+PDF_PARSER_PARALLEL_MIN_PAGES = 8
+# In-memory cache of the page texts (keyed by PDF content hash and page number): maximum number of pages.
+PDF_PAGE_CACHE_MAX_PAGES = 2000
+
+# Resumes shorter than this number of tokens are sent in full in the per-job and per-project prompts:
+# the retrieval (embeddings, vector store and reranking) is skipped, as it would not make the prompts shorter
+# (it selects up to 3 chunks of 4000 characters, about 3000 tokens). Set to 0 to always use the retrieval.
+RETRIEVAL_TOKEN_BUDGET = 3000
+
+# Reranker of the retrieved chunks:
+# "local": BM25 + dense similarity, computed locally (no API key); "cohere": Cohere rerank API.
+RERANKERS = ["local", "cohere"]
+DEFAULT_RERANKER = "local"
+# Weight of the dense similarity in the local reranker score (the rest is the normalized BM25 score).
+LOCAL_RERANKER_DENSE_WEIGHT = 0.5
+
+# Client registry (see client_registry.py): the LLM, embedding and rerank clients and their HTTP connections
+# are reused across reruns and sessions. The analyses run on pooled event loops (the async connections are
+# bound to their event loop): at most MAX_IDLE_EVENT_LOOPS idle loops are kept for the next analyses.
+# PRECONNECT_CLIENTS: open the connections of the selected provider in the background when the app starts.
+MAX_IDLE_EVENT_LOOPS = 8
+PRECONNECT_CLIENTS = True
+# Idle keep-alive connections are closed after this delay (the httpx default is 5 seconds).
+HTTP_KEEPALIVE_SECONDS = 60
+
+# Traces of the analyses (Chrome trace event format)
+TRACES_DIR = Path(__file__).resolve().parent.joinpath("data", "traces")
+
+# LLM response cache
+CACHE_DIR = Path(__file__).resolve().parent.joinpath("data", "cache")
+LLM_CACHE_PATH = CACHE_DIR.joinpath("llm_cache.sqlite")
+LLM_CACHE_MAX_SIZE_MB = 100
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600  # one week
+
+# Embeddings cache: one file per (embedding model, chunk text hash)
+EMBEDDINGS_CACHE_DIR = CACHE_DIR.joinpath("embeddings")
 
 
 #  2. PROMPT TEMPLATES
@@ -182,6 +284,48 @@ Please include: years of experience, top skills and experiences, some of the big
 </resume>
 """
 
+# Prefix of the prompts on the whole resume in the "resume_first" layout (see DEFAULT_PROMPT_LAYOUT):
+# it must be the same for all the prompts of an analysis.
+PROMPT_RESUME_PREFIX = """You are given a resume delimited by <resume></resume>. \
+The instructions on the resume follow it.
+
+<resume>
+{resume}
+</resume>
+
+"""
+
+# Instructions of PROMPT_IMPROVE_SUMMARY after PROMPT_RESUME_PREFIX ("resume_first" layout).
+PROMPT_IMPROVE_SUMMARY_RESUME_FIRST = """You are also given a summary (delimited by <summary></summary>).
+1. In {language}, evaluate the summary (format and content) .
+2. Rate the summary by giving an integer score from 0 to 100. \
+If the summary is "unknown", the score is 0.
+3. In {language}, strengthen the summary. The summary should not exceed 5 sentences. \
+If the summary is "unknown", generate a strong summary in {language} with no more than 5 sentences. \
+Please include: years of experience, top skills and experiences, some of the biggest achievements, and finally an attractive objective.
+4. Format your response as a json dictionary with the following keys: evaluation__summary, score__summary, CV__summary_enhanced.
+
+<summary>
+{summary}
+</summary>
+"""
+
+# Retrieval queries (and prompt headers) of the duties of a work experience and of the details of a project.
+# {fields}: the known fields of the item, e.g. "title = 'Data Scientist' and company = 'Acme'".
+PROMPT_JOB_QUERY = """Extract from the resume delimited by triple backticks \
+all the duties and responsibilities of the following work experience: ({fields})
+"""
+
+PROMPT_PROJECT_QUERY = """Extract from the resume (delimited by triple backticks) \
+what is listed about the following project: ({fields})"""
+
+PROMPT_EXTRACT_WORK_DUTIES = """{query}Output the duties in a json dictionary with the following keys (__duty_id__,__duty__). \
+Use this format: "1":"duty","2":"another duty".
+Resume:\n\n ```{resume}```"""
+
+PROMPT_EXTRACT_PROJECT_DESCRIPTION = """{query}Format the extracted text into a string (with bullet points).
+Resume:\n\n ```{resume}```"""
+
 PROMPT_IMPROVE_WORK_EXPERIENCE = """you are given a work experience text delimited by triple backticks.
 1. Rate the quality of the work experience text by giving an integer score from 0 to 100. 
 2. Suggest in {language} how to make the work experience text better and stronger.
@@ -214,5 +358,16 @@ Format the top 3 weaknesses as string containg three bullet points.
 
 The strengths and weaknesses lie in the format, style and content of the resume.
 
-Resume: ```{text}```
+Resume: ```{resume}```
+"""
+
+# Instructions of PROMPT_EVALUATE_RESUME after PROMPT_RESUME_PREFIX ("resume_first" layout).
+PROMPT_EVALUATE_RESUME_RESUME_FIRST = """1. Provide an overview of the resume in {language}.
+2. Provide a comprehensive analysis of the three main strengths of the resume in {language}. \
+Format the top 3 strengths as string containg three bullet points.
+3. Provide a comprehensive analysis of the three main weaknesses of the resume in {language}. \
+Format the top 3 weaknesses as string containg three bullet points.
+4. Format your response as a json dictionary with the following keys: resume_cv_overview, top_3_strengths, top_3_weaknesses.
+
+The strengths and weaknesses lie in the format, style and content of the resume.
 """
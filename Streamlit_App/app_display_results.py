@@ -1,6 +1,7 @@
 import streamlit as st
 import markdown
-from resume_analyzer import get_section_scores
+import pandas as pd
+from resume_analyzer import get_section_scores, get_average_score
 
 
 def custom_markdown(
@@ -169,286 +170,438 @@ def display_assessment(score, section_assessment):
     st.write("")
 
 
-def display_resume_analysis(SCANNED_RESUME):
-    """Display the resume analysis."""
-    try:
-        ###############################################################
-        #        Overview, Top 3 strengths and Top 3 weaknesses
-        ###############################################################
-        st.divider()
-        st.header("🎯 Overview and scores")
+def display_overview(SCANNED_RESUME):
+    """Display the overview, the top 3 strengths and the top 3 weaknesses."""
+    list_task = ["Overview", "Top 3 strengths", "Top 3 weaknesses"]
+    list_content = [
+        SCANNED_RESUME["resume_cv_overview"],
+        SCANNED_RESUME["top_3_strengths"],
+        SCANNED_RESUME["top_3_weaknesses"],
+    ]
+    list_colors = ["#ededed", "#D4F1F4", "#fbcccd"]
 
-        list_task = ["Overview", "Top 3 strengths", "Top 3 weaknesses"]
-        list_content = [
-            SCANNED_RESUME["resume_cv_overview"],
-            SCANNED_RESUME["top_3_strengths"],
-            SCANNED_RESUME["top_3_weaknesses"],
-        ]
-        list_colors = ["#ededed", "#D4F1F4", "#fbcccd"]
+    for i in range(3):
+        st.write("")
+        st.subheader(list_task[i])
+        custom_markdown(
+            html_tag="div",
+            text=markdown_to_html(format_object_to_string(list_content[i])),
+            bg_color=list_colors[i],
+        )
 
-        for i in range(3):
-            st.write("")
-            st.subheader(list_task[i])
-            custom_markdown(
-                html_tag="div",
-                text=markdown_to_html(format_object_to_string(list_content[i])),
-                bg_color=list_colors[i],
-            )
 
-        ###############################################################
-        #                      Display scores
-        ###############################################################
-        st.write("")
-        st.subheader("Scores over 100")
-        st.write("")
+def display_scores(SCANNED_RESUME):
+    """Display the scores of all the sections."""
+    st.write("")
+    st.subheader("Scores over 100")
+    st.write("")
 
-        dict_scores = get_section_scores(SCANNED_RESUME)
+    dict_scores = get_section_scores(SCANNED_RESUME)
+
+    display_scores_in_columns(
+        section_names=[
+            "👤 Contact",
+            "📋 Summary",
+            "📋 Work Experience",
+            "💪 Skills",
+        ],
+        scores=[
+            dict_scores.get(key)
+            for key in ["ContactInfo", "summary", "work_experience", "skills"]
+        ],
+        column_width=[2.25, 2.25, 2.75, 2.25],
+    )
 
-        display_scores_in_columns(
-            section_names=[
-                "👤 Contact",
-                "📋 Summary",
-                "📋 Work Experience",
-                "💪 Skills",
-            ],
-            scores=[
-                dict_scores.get(key)
-                for key in ["ContactInfo", "summary", "work_experience", "skills"]
-            ],
-            column_width=[2.25, 2.25, 2.75, 2.25],
-        )
+    display_scores_in_columns(
+        section_names=[
+            "🎓 Education",
+            "🗣 Language",
+            "📋 Projects",
+            "🏅 Certifications",
+        ],
+        scores=[
+            dict_scores.get(key)
+            for key in ["education", "language", "projects", "certfication"]
+        ],
+        column_width=[2.5, 2.5, 2.5, 2.75],
+    )
 
-        display_scores_in_columns(
-            section_names=[
-                "🎓 Education",
-                "🗣 Language",
-                "📋 Projects",
-                "🏅 Certifications",
-            ],
-            scores=[
-                dict_scores.get(key)
-                for key in ["education", "language", "projects", "certfication"]
+
+def display_contact_information(SCANNED_RESUME):
+    """Display the contact information and its assessment."""
+    score = max(-1, SCANNED_RESUME["Contact__information"]["score__ContactInfo"])
+
+    st.write("")
+    st.subheader(f"Contact Information - 🎯 **{score}**/100")
+    display_section_results(
+        expander_label="🛈 Contact Information",
+        expander_header_fields=[
+            f"**👤 {SCANNED_RESUME['Contact__information']['candidate__name']}**",
+            f"{SCANNED_RESUME['Contact__information']['candidate__title']}",
+            "",
+            [
+                f"**📌 Location:** {SCANNED_RESUME['Contact__information']['candidate__location']}",
+                f"**:telephone_receiver::** {SCANNED_RESUME['Contact__information']['candidate__phone']}",
             ],
-            column_width=[2.5, 2.5, 2.5, 2.75],
-        )
+            "",
+            "**Email and Social media:**",
+            f"**:e-mail:** {SCANNED_RESUME['Contact__information']['candidate__email']}",
+        ],
+        expander_header_links=SCANNED_RESUME["Contact__information"][
+            "candidate__social_media"
+        ],
+        score=score,
+        section_original_text_header=None,
+        section_original_text=None,
+        original_text_bullet_points=False,
+        section_assessment=SCANNED_RESUME["Contact__information"][
+            "evaluation__ContactInfo"
+        ],
+        section_improved_text=None,
+    )
 
-        ##################################################################################
-        #                          Detailed analysis
-        ##################################################################################
-        st.divider()
-        st.header("🔎 Detailed Analysis")
 
-        # 1. Contact Information
+def display_summary(SCANNED_RESUME):
+    """Display the summary, its assessment and the improved summary."""
+    score = max(-1, SCANNED_RESUME["Summary__evaluation"]["score__summary"])
 
-        st.write("")
-        st.subheader(f"Contact Information - 🎯 **{dict_scores['ContactInfo']}**/100")
-        display_section_results(
-            expander_label="🛈 Contact Information",
-            expander_header_fields=[
-                f"**👤 {SCANNED_RESUME['Contact__information']['candidate__name']}**",
-                f"{SCANNED_RESUME['Contact__information']['candidate__title']}",
-                "",
-                [
-                    f"**📌 Location:** {SCANNED_RESUME['Contact__information']['candidate__location']}",
-                    f"**:telephone_receiver::** {SCANNED_RESUME['Contact__information']['candidate__phone']}",
-                ],
-                "",
-                "**Email and Social media:**",
-                f"**:e-mail:** {SCANNED_RESUME['Contact__information']['candidate__email']}",
-            ],
-            expander_header_links=SCANNED_RESUME["Contact__information"][
-                "candidate__social_media"
-            ],
-            score=dict_scores["ContactInfo"],
-            section_original_text_header=None,
-            section_original_text=None,
-            original_text_bullet_points=False,
-            section_assessment=SCANNED_RESUME["Contact__information"][
-                "evaluation__ContactInfo"
-            ],
-            section_improved_text=None,
-        )
+    st.write("")
+    st.write("")
+    st.subheader(f"Summary - 🎯 **{score}**/100")
+    display_section_results(
+        expander_label="Summary",
+        expander_header_fields=[],
+        expander_header_links=None,
+        score=score,
+        section_original_text_header="**📋 Summary:**",
+        section_original_text=[SCANNED_RESUME["CV__summary"]],
+        original_text_bullet_points=False,
+        section_assessment=SCANNED_RESUME["Summary__evaluation"]["evaluation__summary"],
+        section_improved_text=SCANNED_RESUME["Summary__evaluation"][
+            "CV__summary_enhanced"
+        ],
+    )
 
-        # 2. Summary
 
-        st.write("")
-        st.write("")
-        st.subheader(f"Summary - 🎯 **{dict_scores['summary']}**/100")
-        display_section_results(
-            expander_label="Summary",
-            expander_header_fields=[],
-            expander_header_links=None,
-            score=dict_scores["summary"],
-            section_original_text_header="**📋 Summary:**",
-            section_original_text=[SCANNED_RESUME["CV__summary"]],
-            original_text_bullet_points=False,
-            section_assessment=SCANNED_RESUME["Summary__evaluation"][
-                "evaluation__summary"
-            ],
-            section_improved_text=SCANNED_RESUME["Summary__evaluation"][
-                "CV__summary_enhanced"
-            ],
-        )
+def display_work_experience(SCANNED_RESUME):
+    """Display each work experience, its assessment and the improved text."""
+    score = get_average_score(
+        SCANNED_RESUME["Work__experience"], "Score__WorkExperience"
+    )
 
-        #  3. Work Experience
+    st.write("")
+    st.write("")
+    st.subheader(f"work experience - 🎯 **{score}**/100")
 
-        st.write("")
-        st.write("")
-        st.subheader(f"work experience - 🎯 **{dict_scores['work_experience']}**/100")
+    if len(SCANNED_RESUME["Work__experience"]) == 0:
+        st.info("No work experience results.")
+    else:
+        for work_experience in SCANNED_RESUME["Work__experience"]:
+            display_section_results(
+                expander_label=f"{work_experience['job__title']}",
+                expander_header_fields=[
+                    [
+                        f"**Company:**\n {work_experience['job__company']}",
+                        f"**📅**\n {work_experience['job__start_date']} - {work_experience['job__end_date']}",
+                    ]
+                ],
+                expander_header_links=None,
+                score=work_experience["Score__WorkExperience"],
+                section_original_text_header="**📋 Responsibilities:**",
+                section_original_text=list(work_experience["work__duties"].values()),
+                original_text_bullet_points=True,
+                section_assessment=work_experience["Comments__WorkExperience"],
+                section_improved_text=work_experience["Improvement__WorkExperience"],
+            )
 
-        if len(SCANNED_RESUME["Work__experience"]) == 0:
-            st.info("No work experience results.")
-        else:
-            for work_experience in SCANNED_RESUME["Work__experience"]:
-                display_section_results(
-                    expander_label=f"{work_experience['job__title']}",
-                    expander_header_fields=[
-                        [
-                            f"**Company:**\n {work_experience['job__company']}",
-                            f"**📅**\n {work_experience['job__start_date']} - {work_experience['job__end_date']}",
-                        ]
-                    ],
-                    expander_header_links=None,
-                    score=work_experience["Score__WorkExperience"],
-                    section_original_text_header="**📋 Responsibilities:**",
-                    section_original_text=list(
-                        work_experience["work__duties"].values()
-                    ),
-                    original_text_bullet_points=True,
-                    section_assessment=work_experience["Comments__WorkExperience"],
-                    section_improved_text=work_experience[
-                        "Improvement__WorkExperience"
-                    ],
-                )
 
-        # 4. Skills
+def display_skills(SCANNED_RESUME):
+    """Display the skills and their assessment."""
+    score = max(-1, SCANNED_RESUME["Skills__evaluation"]["score__skills"])
 
+    st.write("")
+    st.write("")
+    st.subheader(f"Skills - 🎯 **{score}**/100")
+    display_section_results(
+        expander_label="💪 Skills",
+        expander_header_fields=None,
+        expander_header_links=None,
+        score=score,
+        section_original_text_header=None,
+        section_original_text=[SCANNED_RESUME["candidate__skills"]],
+        original_text_bullet_points=True,
+        section_assessment=SCANNED_RESUME["Skills__evaluation"]["evaluation__skills"],
+        section_improved_text=None,
+    )
+
+
+def display_education(SCANNED_RESUME):
+    """Display the educational background and its assessment."""
+    score = max(-1, SCANNED_RESUME["Education__evaluation"]["score__edu"])
+
+    st.write("")
+    st.write("")
+    st.subheader(f"Education - 🎯 **{score}**/100")
+    with st.expander(f"🎓 Educational background and academic achievements."):
         st.write("")
-        st.write("")
-        st.subheader(f"Skills - 🎯 **{dict_scores['skills']}**/100")
-        display_section_results(
-            expander_label="💪 Skills",
-            expander_header_fields=None,
-            expander_header_links=None,
-            score=dict_scores["skills"],
-            section_original_text_header=None,
-            section_original_text=[SCANNED_RESUME["candidate__skills"]],
-            original_text_bullet_points=True,
-            section_assessment=SCANNED_RESUME["Skills__evaluation"][
-                "evaluation__skills"
+        list_education = SCANNED_RESUME["CV__Education"]
+        if not isinstance(list_education, list):
+            st.markdown(f"- {list_education}")
+        else:
+            for edu in list_education:
+                col1, col2 = st.columns([6, 4])
+                with col1:
+                    st.markdown(f"**🎓 Degree:** {edu['edu__degree']}")
+                with col2:
+                    st.markdown(
+                        f"**📅** {edu['edu__start_date']} - {edu['edu__end_date']}"
+                    )
+                st.markdown(f"**🏛️** {edu['edu__college']}")
+                st.divider()
+
+        display_assessment(
+            score=score,
+            section_assessment=SCANNED_RESUME["Education__evaluation"][
+                "evaluation__edu"
             ],
-            section_improved_text=None,
         )
 
-        # 5. Education
 
+def display_languages(SCANNED_RESUME):
+    """Display the languages and their assessment."""
+    score = max(-1, SCANNED_RESUME["Languages__evaluation"]["score__language"])
+
+    st.divider()
+    st.subheader(f"Language - 🎯 **{score}**/100")
+    languages = []
+    for language in SCANNED_RESUME["CV__Languages"]:
+        languages.append(
+            f"**🗣 {language['spoken__language']}** : {language['language__fluency']}"
+        )
+    display_section_results(
+        expander_label="🗣 Language",
+        expander_header_fields=None,
+        expander_header_links=None,
+        score=score,
+        section_original_text_header=None,
+        section_original_text=languages,
+        original_text_bullet_points=False,
+        section_assessment=SCANNED_RESUME["Languages__evaluation"][
+            "evaluation__language"
+        ],
+        section_improved_text=None,
+    )
+
+
+def display_certifications(SCANNED_RESUME):
+    """Display the certifications and their assessment."""
+    score = max(-1, SCANNED_RESUME["Certif__evaluation"]["score__certif"])
+
+    st.write("")
+    st.write("")
+    st.subheader(f"Certifications - 🎯 **{score}**/100")
+    with st.expander("🏅 Certifications"):
         st.write("")
-        st.write("")
-        st.subheader(f"Education - 🎯 **{dict_scores['education']}**/100")
-        with st.expander(f"🎓 Educational background and academic achievements."):
-            st.write("")
-            list_education = SCANNED_RESUME["CV__Education"]
-            if not isinstance(list_education, list):
-                st.markdown(f"- {list_education}")
-            else:
-                for edu in list_education:
-                    col1, col2 = st.columns([6, 4])
-                    with col1:
-                        st.markdown(f"**🎓 Degree:** {edu['edu__degree']}")
-                    with col2:
-                        st.markdown(
-                            f"**📅** {edu['edu__start_date']} - {edu['edu__end_date']}"
-                        )
-                    st.markdown(f"**🏛️** {edu['edu__college']}")
-                    st.divider()
+        list_certifs = SCANNED_RESUME["CV__Certifications"]
+        if not isinstance(list_certifs, list):
+            st.markdown(f"- {list_certifs}")
+        else:
+            for certif in list_certifs:
+                col1, col2 = st.columns([6, 4])
+                with col1:
+                    st.markdown(f"**🏅 Title:** {certif['certif__title']}")
+                with col2:
+                    st.markdown(f"**📅** {certif['certif__date']} ")
+                st.markdown(f"**🏛️** {certif['certif__organization']}")
+
+                if certif["certif__expiry_date"].lower() != "unknown":
+                    st.markdown(f"**📅 Expiry date:** {certif['certif__expiry_date']}")
+                if certif["certif__details"].lower() != "unknown":
+                    st.write("")
+                    st.markdown(f"{certif['certif__details']}")
+                st.divider()
 
             display_assessment(
-                score=dict_scores["education"],
-                section_assessment=SCANNED_RESUME["Education__evaluation"][
-                    "evaluation__edu"
+                score=score,
+                section_assessment=SCANNED_RESUME["Certif__evaluation"][
+                    "evaluation__certif"
                 ],
             )
 
-        # 6. Language (Optional section)
-
-        st.divider()
-        st.subheader(f"Language - 🎯 **{dict_scores['language']}**/100")
-        languages = []
-        for language in SCANNED_RESUME["CV__Languages"]:
-            languages.append(
-                f"**🗣 {language['spoken__language']}** : {language['language__fluency']}"
-            )
-        display_section_results(
-            expander_label="🗣 Language",
-            expander_header_fields=None,
-            expander_header_links=None,
-            score=dict_scores["language"],
-            section_original_text_header=None,
-            section_original_text=languages,
-            original_text_bullet_points=False,
-            section_assessment=SCANNED_RESUME["Languages__evaluation"][
-                "evaluation__language"
-            ],
-            section_improved_text=None,
-        )
 
-        # 7. CERTIFICATIONS (optional section)
+def display_projects(SCANNED_RESUME):
+    """Display each project, its assessment and the improved text."""
+    score = get_average_score(SCANNED_RESUME["CV__Projects"], "Score__project")
 
-        st.write("")
-        st.write("")
-        st.subheader(f"Certifications - 🎯 **{dict_scores['certfication']}**/100")
-        with st.expander("🏅 Certifications"):
-            st.write("")
-            list_certifs = SCANNED_RESUME["CV__Certifications"]
-            if not isinstance(list_certifs, list):
-                st.markdown(f"- {list_certifs}")
-            else:
-                for certif in list_certifs:
-                    col1, col2 = st.columns([6, 4])
-                    with col1:
-                        st.markdown(f"**🏅 Title:** {certif['certif__title']}")
-                    with col2:
-                        st.markdown(f"**📅** {certif['certif__date']} ")
-                    st.markdown(f"**🏛️** {certif['certif__organization']}")
-
-                    if certif["certif__expiry_date"].lower() != "unknown":
-                        st.markdown(
-                            f"**📅 Expiry date:** {certif['certif__expiry_date']}"
-                        )
-                    if certif["certif__details"].lower() != "unknown":
-                        st.write("")
-                        st.markdown(f"{certif['certif__details']}")
-                    st.divider()
-
-                display_assessment(
-                    score=dict_scores["certfication"],
-                    section_assessment=SCANNED_RESUME["Certif__evaluation"][
-                        "evaluation__certif"
-                    ],
-                )
+    st.write("")
+    st.write("")
+    st.subheader(f"Projects - 🎯 **{score}**/100")
+    if len(SCANNED_RESUME["CV__Projects"]) == 0:
+        st.info("No projects found.")
+    else:
+        for project in SCANNED_RESUME["CV__Projects"]:
+            display_section_results(
+                expander_label=f"{project['project__title']}",
+                expander_header_fields=[
+                    f"**📅**\n {project['project__start_date']} - {project['project__end_date']}"
+                ],
+                expander_header_links=None,
+                score=project["Score__project"],
+                section_original_text_header="**📋 Project details:**",
+                section_original_text=[project["project__description"]],
+                original_text_bullet_points=True,
+                section_assessment=project["Comments__project"],
+                section_improved_text=project["Improvement__project"],
+            )
 
-        # 8. Projects (Optional section)
 
-        st.write("")
-        st.write("")
-        st.subheader(f"Projects - 🎯 **{dict_scores['projects']}**/100")
-        if len(SCANNED_RESUME["CV__Projects"]) == 0:
-            st.info("No projects found.")
+# Display functions of the detailed analysis, in display order: {section: function}
+DETAILED_ANALYSIS_SECTIONS = {
+    "contact_information": display_contact_information,
+    "summary": display_summary,
+    "work_experience": display_work_experience,
+    "skills": display_skills,
+    "education": display_education,
+    "languages": display_languages,
+    "certifications": display_certifications,
+    "projects": display_projects,
+}
+
+# Sections displayed when an analysis stage (see resume_analyzer_main) is done: {stage: [sections]}
+STAGE_SECTIONS = {
+    "CONTACT_INFORMATION": ["contact_information"],
+    "Summary_SECTION": ["summary"],
+    "Work__experience": ["work_experience"],
+    "SKILLS_and_CERTIF": ["skills", "certifications"],
+    "Education_Language_sections": ["education", "languages"],
+    "CV__Projects": ["projects"],
+}
+
+
+def display_section(display_function, SCANNED_RESUME, placeholder=None):
+    """Display a section of the resume analysis, in a placeholder (st.empty) if not None."""
+    try:
+        if placeholder is None:
+            display_function(SCANNED_RESUME)
         else:
-            for project in SCANNED_RESUME["CV__Projects"]:
-                display_section_results(
-                    expander_label=f"{project['project__title']}",
-                    expander_header_fields=[
-                        f"**📅**\n {project['project__start_date']} - {project['project__end_date']}"
-                    ],
-                    expander_header_links=None,
-                    score=project["Score__project"],
-                    section_original_text_header="**📋 Project details:**",
-                    section_original_text=[project["project__description"]],
-                    original_text_bullet_points=True,
-                    section_assessment=project["Comments__project"],
-                    section_improved_text=project["Improvement__project"],
-                )
-
+            with placeholder.container():
+                display_function(SCANNED_RESUME)
     except Exception as exception:
         print(exception)
+
+
+def create_result_placeholders():
+    """Create the layout of the resume analysis, with an empty placeholder for each section.
+    The sections are then filled in as soon as their analysis stage is done."""
+    placeholders = {}
+
+    st.divider()
+    st.header("🎯 Overview and scores")
+    placeholders["overview"] = st.empty()
+    placeholders["scores"] = st.empty()
+
+    st.divider()
+    st.header("🔎 Detailed Analysis")
+    for section in DETAILED_ANALYSIS_SECTIONS:
+        placeholders[section] = st.empty()
+
+    return placeholders
+
+
+def display_stage_results(placeholders, stage_name, stage_result):
+    """Display the sections of an analysis stage in their placeholders, as soon as the stage is done."""
+    if stage_name in ["Work__experience", "CV__Projects"]:
+        stage_result = {stage_name: stage_result}  # these stages return a list
+
+    for section in STAGE_SECTIONS.get(stage_name, []):
+        display_section(
+            DETAILED_ANALYSIS_SECTIONS[section], stage_result, placeholders[section]
+        )
+
+
+# Sections previewed while the extraction responses are streamed: {resume section: section placeholder}
+STREAMED_SECTIONS = {
+    "Contact__information": "contact_information",
+    "CV__summary": "summary",
+    "Work__experience": "work_experience",
+    "candidate__skills": "skills",
+    "CV__Education": "education",
+    "CV__Languages": "languages",
+    "CV__Certifications": "certifications",
+    "CV__Projects": "projects",
+}
+
+
+def format_streamed_value(value):
+    """One-line preview of a streamed value: the known values of a dictionary, or the value itself."""
+    if isinstance(value, dict):
+        value = ", ".join(
+            str(item) for item in value.values() if str(item).lower() != "unknown"
+        )
+    return str(value)[:200]
+
+
+def display_streamed_field(placeholders, streamed_sections, path, value):
+    """Preview a field of a streamed extraction response (see resume_analyzer_main, on_field)
+    in the placeholder of its section, until the analysis of the section is displayed.
+    Parameters:
+     - streamed_sections (dict): the preview lines of each section, updated in place.
+     - path (tuple), value: the streamed field: (section,) or (section, item index).
+    """
+    section = STREAMED_SECTIONS.get(path[0])
+    if section is None:
+        return
+    lines = streamed_sections.setdefault(section, [])
+    if len(path) == 2:
+        lines.append(format_streamed_value(value))
+    else:  # the whole section (a list: its items were already previewed)
+        values = value if isinstance(value, list) else [value]
+        lines[:] = [format_streamed_value(item) for item in values]
+
+    with placeholders[section].container():
+        for line in lines:
+            st.caption(f"⏳ {line}")
+
+
+def display_resume_analysis(SCANNED_RESUME, placeholders=None):
+    """Display the resume analysis.
+    If placeholders is not None (see create_result_placeholders),
+    only the overview and scores are displayed: the other sections were displayed progressively.
+    """
+    if placeholders is None:
+        placeholders = create_result_placeholders()
+        for section, display_function in DETAILED_ANALYSIS_SECTIONS.items():
+            display_section(display_function, SCANNED_RESUME, placeholders[section])
+
+    # The overview and the scores are displayed last: they need all sections.
+    display_section(display_overview, SCANNED_RESUME, placeholders["overview"])
+    display_section(display_scores, SCANNED_RESUME, placeholders["scores"])
+
+
+def display_token_usage(SCANNED_RESUME):
+    """Display the tokens and the estimated cost of the analysis, in total and per stage."""
+    token_usage = SCANNED_RESUME.get("Token__usage")
+    if token_usage is None:
+        return  # results saved before token accounting
+
+    totals = token_usage["total"]
+    with st.expander(
+        f"**🪙 Tokens: {totals['prompt_tokens']} prompt + {totals['completion_tokens']} completion, "
+        f"estimated cost: ${totals['cost_usd']:.4f}**"
+    ):
+        st.write(
+            f"{totals['calls']} LLM calls, {totals['cached_calls']} responses read from the LLM cache, "
+            f"{totals.get('cached_prompt_tokens', 0)} prompt tokens read from the prompt cache of the provider."
+        )
+        parse_stats = SCANNED_RESUME.get("Parse__stats")
+        if parse_stats is not None:
+            parse_totals = parse_stats["total"]
+            st.write(
+                f"LLM responses: {parse_totals['valid']} valid, "
+                f"{parse_totals['repaired']} repaired, "
+                f"{parse_totals['failed']} failed."
+            )
+        st.dataframe(
+            pd.DataFrame.from_dict(token_usage["stages"], orient="index"),
+            use_container_width=True,
+        )
@@ -1,6 +1,18 @@
 import streamlit as st
 
-from app_constants import list_Assistant_Languages, list_LLM_providers
+from app_constants import (
+    list_Assistant_Languages,
+    list_LLM_providers,
+    EXTRACTION_MODES,
+    DEFAULT_EXTRACTION_MODE,
+    RERANKERS,
+    DEFAULT_RERANKER,
+    RETRIEVAL_TOKEN_BUDGET,
+    STRUCTURED_OUTPUT,
+    STREAMING,
+    PROMPT_LAYOUTS,
+    DEFAULT_PROMPT_LAYOUT,
+)
 
 
 def expander_model_parameters(
@@ -49,6 +61,40 @@ def expander_model_parameters(
             value=0.95,
             step=0.05,
         )
+        st.session_state.cache_creative_responses = st.checkbox(
+            "Cache creative responses",
+            value=False,
+            help="Deterministic responses (temperature = 0) are always cached. \
+Check this box to also reuse the responses of the creative LLM for identical prompts.",
+        )
+        st.session_state.extraction_mode = st.radio(
+            "Extraction mode",
+            EXTRACTION_MODES,
+            index=EXTRACTION_MODES.index(DEFAULT_EXTRACTION_MODE),
+            horizontal=True,
+            help="multi_call: one request per group of resume sections. \
+single_call: all the sections are extracted with a single request (the resume is sent once).",
+        )
+        st.session_state.structured_output = st.checkbox(
+            "Structured output",
+            value=STRUCTURED_OUTPUT,
+            help="Request the json responses with their schema (OpenAI function calling), \
+instead of parsing free-text responses. Not supported by Google models.",
+        )
+        st.session_state.streaming = st.checkbox(
+            "Streaming",
+            value=STREAMING,
+            help="Stream the extraction responses: the sections are displayed as soon as they are extracted, \
+and each work experience and project is analyzed as soon as it is streamed.",
+        )
+        st.session_state.prompt_layout = st.radio(
+            "Prompt layout",
+            PROMPT_LAYOUTS,
+            index=PROMPT_LAYOUTS.index(DEFAULT_PROMPT_LAYOUT),
+            horizontal=True,
+            help="resume_first: all the prompts on the resume start with the resume, \
+so that the provider prompt cache serves it to the calls after the first ones (cheaper and faster prompts).",
+        )
 
 
 def sidebar(openai_api_key, google_api_key, cohere_api_key):
@@ -92,13 +138,32 @@ def sidebar(openai_api_key, google_api_key, cohere_api_key):
                 google_api_key=google_api_key,
             )
 
-        # Cohere API Key
+        # Reranker and Cohere API Key
         st.write("")
-        st.session_state.cohere_api_key = st.text_input(
-            "Coher API Key - [Get an API key](https://dashboard.cohere.com/api-keys)",
-            type="password",
-            value=cohere_api_key,
-            placeholder="insert your API key",
+        st.session_state.reranker = st.radio(
+            "Reranker",
+            RERANKERS,
+            index=RERANKERS.index(DEFAULT_RERANKER),
+            horizontal=True,
+            help="local: BM25 and embeddings similarity, computed locally (no API key). \
+cohere: Cohere rerank API (one request per retrieval).",
+        )
+        if st.session_state.reranker == "cohere":
+            st.session_state.cohere_api_key = st.text_input(
+                "Coher API Key - [Get an API key](https://dashboard.cohere.com/api-keys)",
+                type="password",
+                value=cohere_api_key,
+                placeholder="insert your API key",
+            )
+        else:
+            st.session_state.cohere_api_key = cohere_api_key
+        st.session_state.retrieval_token_budget = st.number_input(
+            "Retrieval token budget",
+            min_value=0,
+            value=RETRIEVAL_TOKEN_BUDGET,
+            step=500,
+            help="Resumes under this number of tokens are sent in full to the LLM: \
+the retrieval (embeddings and reranking) is skipped. Set to 0 to always use the retrieval.",
         )
 
         # Assistant language
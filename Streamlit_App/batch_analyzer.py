@@ -0,0 +1,478 @@
+"""Analyze a directory (or a glob) of PDF resumes from the command line, without the Streamlit UI.
+
+Example:
+    python batch_analyzer.py "./resumes/*.pdf" --output results.jsonl --workers 8
+
+Each resume goes through the same steps as the app: document loader, vector store + reranking retrieval
+and resume_analyzer_main. Results are appended to the output as soon as a resume is done;
+a checkpoint file (<output>.checkpoint) records the analyzed resumes, so an interrupted run can be restarted
+and only the remaining resumes are analyzed.
+"""
+
+import argparse, glob, hashlib, json, logging, os, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from streamlit import config as st_config
+
+from app_constants import (
+    MAX_CONCURRENT_STAGES,
+    RATE_LIMITS,
+    EXTRACTION_MODES,
+    DEFAULT_EXTRACTION_MODE,
+    RERANKERS,
+    DEFAULT_RERANKER,
+    RETRIEVAL_TOKEN_BUDGET,
+    STRUCTURED_OUTPUT,
+    STREAMING,
+    PROMPT_LAYOUTS,
+    DEFAULT_PROMPT_LAYOUT,
+    PRECONNECT_CLIENTS,
+)
+from llm_functions import instantiate_LLM, get_api_keys_from_local_env
+from rate_limiter import set_rate_limit, get_rate_limiters_stats
+from client_registry import preconnect, get_client_registry_stats
+from retrieval import langchain_document_loader, create_retriever
+from resume_analyzer import resume_analyzer_main
+from results_store import get_result_key, load_result
+from tracing import trace
+
+# Streamlit calls (st.info...) are no-ops outside of `streamlit run`: hide the related warnings.
+st_config.set_option("global.showWarningOnDirectExecution", False)
+logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").setLevel(
+    logging.ERROR
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Analyze a directory or a glob of PDF resumes."
+    )
+    parser.add_argument(
+        "inputs", nargs="+", help="PDF files, directories or glob patterns."
+    )
+    parser.add_argument(
+        "--output",
+        default="results.jsonl",
+        help="Output file: .jsonl, or .parquet (a directory of parquet files).",
+    )
+    parser.add_argument("--provider", default="OpenAI", choices=["OpenAI", "Google"])
+    parser.add_argument(
+        "--model", default=None, help="Default: gpt-3.5-turbo-0125 or gemini-pro."
+    )
+    parser.add_argument("--language", default="english")
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--top_p", type=float, default=0.95)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of resumes analyzed at the same time.",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=MAX_CONCURRENT_STAGES,
+        help="Maximum number of concurrent stages per resume.",
+    )
+    parser.add_argument(
+        "--extraction-mode",
+        default=DEFAULT_EXTRACTION_MODE,
+        choices=EXTRACTION_MODES,
+        help="single_call extracts all the resume sections with one LLM call.",
+    )
+    parser.add_argument(
+        "--prompt-layout",
+        default=DEFAULT_PROMPT_LAYOUT,
+        choices=PROMPT_LAYOUTS,
+        help="resume_first: the prompts on the resume share the same prefix, served by the provider prompt cache.",
+    )
+    parser.add_argument(
+        "--reranker",
+        default=DEFAULT_RERANKER,
+        choices=RERANKERS,
+        help="local: BM25 + dense similarity (no Cohere API key); cohere: Cohere rerank API.",
+    )
+    parser.add_argument(
+        "--retrieval-token-budget",
+        type=int,
+        default=RETRIEVAL_TOKEN_BUDGET,
+        help="Resumes under this number of tokens are analyzed without retrieval (0: always use the retrieval).",
+    )
+    parser.add_argument(
+        "--structured-output",
+        action=argparse.BooleanOptionalAction,
+        default=STRUCTURED_OUTPUT,
+        help="Request the json responses with their schema (OpenAI function calling).",
+    )
+    parser.add_argument(
+        "--streaming",
+        action=argparse.BooleanOptionalAction,
+        default=STREAMING,
+        help="Stream the extraction responses and analyze each work experience and project as soon as it is streamed.",
+    )
+    parser.add_argument(
+        "--requests-per-minute",
+        type=float,
+        default=None,
+        help="Requests per minute of the LLM provider, shared by all workers. Default: RATE_LIMITS.",
+    )
+    parser.add_argument(
+        "--tokens-per-minute",
+        type=float,
+        default=None,
+        help="Tokens per minute of the LLM provider, shared by all workers. Default: RATE_LIMITS.",
+    )
+    parser.add_argument(
+        "--force-refresh",
+        action="store_true",
+        help="Analyze resumes again, even if their results are already stored.",
+    )
+    return parser.parse_args()
+
+
+def list_pdf_files(inputs):
+    """Expand the inputs (files, directories, glob patterns) to a sorted list of PDF files."""
+    pdf_files = set()
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            pdf_files.update(
+                glob.glob(os.path.join(input_path, "**", "*.pdf"), recursive=True)
+            )
+        else:
+            pdf_files.update(glob.glob(input_path, recursive=True))
+    return sorted(f for f in pdf_files if f.lower().endswith(".pdf"))
+
+
+def get_file_hash(file_path):
+    with open(file_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def read_checkpoint(checkpoint_path):
+    """Return the SHA-256 of the resumes already analyzed."""
+    done = set()
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["sha256"])
+                except (json.JSONDecodeError, KeyError):
+                    pass  # last line of an interrupted run
+    return done
+
+
+def write_checkpoint(checkpoint, records):
+    """Record the successfully analyzed resumes among the records written to the output."""
+    for record in records:
+        if record["status"] == "ok":
+            checkpoint.write(
+                json.dumps({"sha256": record["sha256"], "file": record["file"]}) + "\n"
+            )
+    checkpoint.flush()
+
+
+class JsonlWriter:
+    """Append one JSON record per line, flushed after each record.
+    write and close return the records written to the file (to checkpoint)."""
+
+    def __init__(self, output_path):
+        self.file = open(output_path, "a", encoding="utf-8")
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        return [record]
+
+    def close(self):
+        self.file.close()
+        return []
+
+
+class ParquetWriter:
+    """Write the records to a new parquet file of the output directory, one row group every `batch_size` records.
+    The analysis result is stored as a JSON string column.
+    write, flush and close return the records written to the file (to checkpoint), not the buffered ones.
+    """
+
+    def __init__(self, output_path, batch_size=50):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        os.makedirs(output_path, exist_ok=True)
+        file_path = os.path.join(
+            output_path, f"part-{time.strftime('%Y%m%d_%H%M%S')}.parquet"
+        )
+        self.schema = pa.schema(
+            [
+                ("file", pa.string()),
+                ("sha256", pa.string()),
+                ("status", pa.string()),
+                ("error", pa.string()),
+                ("latency_s", pa.float64()),
+                ("trace", pa.string()),
+                ("result", pa.string()),
+            ]
+        )
+        self.pa = pa
+        self.writer = pq.ParquetWriter(file_path, self.schema)
+        self.batch_size = batch_size
+        self.records = []
+
+    def write(self, record):
+        self.records.append(record)
+        if len(self.records) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        records = self.records
+        if records:
+            table = self.pa.Table.from_pylist(
+                [
+                    dict(record, result=json.dumps(record.get("result")))
+                    for record in records
+                ],
+                schema=self.schema,
+            )
+            self.writer.write_table(table)
+            self.records = []
+        return records
+
+    def close(self):
+        records = self.flush()
+        self.writer.close()
+        return records
+
+
+def analyze_file(file_path, file_hash, args, api_key, cohere_api_key):
+    """Analyze one resume. Return the output record (status, latency and results)."""
+    start = time.perf_counter()
+    record = {
+        "file": file_path,
+        "sha256": file_hash,
+        "status": "ok",
+        "error": None,
+        "trace": None,
+    }
+    try:
+        with open(file_path, "rb") as f:
+            result_key = get_result_key(
+                f.read(),
+                args.provider,
+                args.model,
+                args.language,
+                settings={
+                    "extraction_mode": args.extraction_mode,
+                    "structured_output": args.structured_output,
+                    "prompt_layout": args.prompt_layout,
+                    "temperature": args.temperature,
+                    "top_p": args.top_p,
+                    "reranker": args.reranker,
+                    "retrieval_token_budget": args.retrieval_token_budget,
+                },
+            )
+
+        SCANNED_RESUME = None if args.force_refresh else load_result(result_key)
+        if SCANNED_RESUME is None:
+            with trace("resume_analysis", file=os.path.basename(file_path)) as tracer:
+                # 1. Load the resume and create the retriever
+                documents = langchain_document_loader(file_path)
+                _, retriever = create_retriever(
+                    documents,
+                    args.provider,
+                    api_key,
+                    cohere_api_key,
+                    reranker=args.reranker,
+                    retrieval_token_budget=args.retrieval_token_budget,
+                )
+
+                # 2. Instantiate the LLMs (one pair per resume: async clients are bound to the event loop of the run)
+                llm = instantiate_LLM(
+                    args.provider,
+                    api_key,
+                    temperature=0.0,
+                    top_p=0.95,
+                    model_name=args.model,
+                    structured_output=args.structured_output,
+                )
+                llm_creative = instantiate_LLM(
+                    args.provider,
+                    api_key,
+                    temperature=args.temperature,
+                    top_p=args.top_p,
+                    model_name=args.model,
+                    structured_output=args.structured_output,
+                )
+
+                # 3. Analyze the resume
+                SCANNED_RESUME = resume_analyzer_main(
+                    llm=llm,
+                    llm_creative=llm_creative,
+                    documents=documents,
+                    language=args.language,
+                    retriever=retriever,
+                    max_concurrency=args.max_concurrency,
+                    result_key=result_key,
+                    extraction_mode=args.extraction_mode,
+                    streaming=args.streaming,
+                    prompt_layout=args.prompt_layout,
+                )
+            record["trace"] = str(tracer.trace_path)
+        record["result"] = SCANNED_RESUME
+
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = str(e)
+        record["result"] = None
+
+    record["latency_s"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def print_summary(records, skipped, wall_time):
+    """Print the throughput and latency summary of the run.
+    The throughput counts the analyzed resumes: the errors (often fast) are counted separately.
+    """
+    latencies = np.array([r["latency_s"] for r in records if r["status"] == "ok"])
+    errors = sum(1 for r in records if r["status"] == "error")
+    # Results of the analyzed resumes (a stored result may not load as a dictionary, e.g. a corrupt file).
+    results = [
+        r.get("result") if isinstance(r.get("result"), dict) else {}
+        for r in records
+        if r["status"] == "ok"
+    ]
+
+    print("\n" + "=" * 60)
+    print(
+        f"Analyzed: {len(latencies)}  |  Errors: {errors}  |  Skipped (checkpoint): {skipped}"
+    )
+    print(f"Wall time: {wall_time:.1f}s")
+    if wall_time > 0:
+        print(
+            f"Throughput: {60 * len(latencies) / wall_time:.2f} analyzed resumes/min, "
+            f"{60 * errors / wall_time:.2f} errors/min"
+        )
+    if len(latencies) > 0:
+        print(
+            f"Latency per resume: p50={np.percentile(latencies, 50):.1f}s  "
+            f"p95={np.percentile(latencies, 95):.1f}s  max={latencies.max():.1f}s"
+        )
+    prompt_tokens = {"prompt_tokens": 0, "cached_prompt_tokens": 0}
+    for result in results:
+        if "Token__usage" in result:
+            totals = result["Token__usage"].get("total", {})
+            for key in prompt_tokens:
+                prompt_tokens[key] += totals.get(key, 0)
+    if prompt_tokens["prompt_tokens"] > 0:
+        print(
+            f"Prompt tokens read from the provider prompt cache: "
+            f"{prompt_tokens['cached_prompt_tokens']}/{prompt_tokens['prompt_tokens']} "
+            f"({100 * prompt_tokens['cached_prompt_tokens'] / prompt_tokens['prompt_tokens']:.1f}%)"
+        )
+    parse_totals = {"responses": 0, "invalid": 0}
+    for result in results:
+        if "Parse__stats" in result:
+            totals = result["Parse__stats"]["total"]
+            parse_totals["responses"] += (
+                totals["valid"] + totals["repaired"] + totals["failed"]
+            )
+            parse_totals["invalid"] += totals["repaired"] + totals["failed"]
+    if parse_totals["responses"] > 0:
+        print(
+            f"Invalid LLM responses: {parse_totals['invalid']}/{parse_totals['responses']} "
+            f"({100 * parse_totals['invalid'] / parse_totals['responses']:.1f}%)"
+        )
+    for name, stats in get_rate_limiters_stats().items():
+        print(
+            f"Rate limiter {name}: {stats['delayed_calls']}/{stats['calls']} calls delayed, "
+            f"max queue depth={stats['max_queue_depth']}, "
+            f"average wait={stats['average_wait']:.2f}s, max wait={stats['max_wait']:.2f}s"
+        )
+    for name, stats in get_client_registry_stats()["connections"].items():
+        print(
+            f"Connections {name}: {stats['requests']} requests on {stats['connections']} connections "
+            f"({stats['reused_connections']} served by a reused connection)"
+        )
+    print("=" * 60)
+
+
+def main():
+    args = parse_args()
+    if args.model is None:
+        args.model = "gpt-3.5-turbo-0125" if args.provider == "OpenAI" else "gemini-pro"
+
+    openai_api_key, google_api_key, cohere_api_key = get_api_keys_from_local_env()
+    api_key = openai_api_key if args.provider == "OpenAI" else google_api_key
+
+    if args.requests_per_minute is not None or args.tokens_per_minute is not None:
+        default_limits = RATE_LIMITS.get(args.provider, {})
+        set_rate_limit(
+            args.provider,
+            requests_per_minute=args.requests_per_minute
+            or default_limits.get("requests_per_minute"),
+            tokens_per_minute=args.tokens_per_minute
+            or default_limits.get("tokens_per_minute"),
+        )
+    if PRECONNECT_CLIENTS:
+        preconnect(
+            args.provider,
+            api_key,
+            cohere_api_key if args.reranker == "cohere" else None,
+        )
+
+    # 1. List the resumes, skip the ones already in the checkpoint.
+    checkpoint_path = args.output + ".checkpoint"
+    done = read_checkpoint(checkpoint_path)
+    todo = []
+    todo_hashes = set()
+    skipped = 0
+    for file_path in list_pdf_files(args.inputs):
+        file_hash = get_file_hash(file_path)
+        if file_hash in done:
+            skipped += 1
+        elif file_hash not in todo_hashes:  # duplicated files are analyzed once
+            todo.append((file_path, file_hash))
+            todo_hashes.add(file_hash)
+    print(f"{len(todo)} resumes to analyze ({skipped} already done).")
+
+    # 2. Analyze the resumes with a pool of workers; write each record as soon as it is available.
+    # The resumes are checkpointed once their record is written to the output (not buffered).
+    if args.output.endswith(".parquet"):
+        writer = ParquetWriter(args.output)
+    else:
+        writer = JsonlWriter(args.output)
+    records = []
+
+    start = time.perf_counter()
+    with open(checkpoint_path, "a") as checkpoint:
+        try:
+            with ThreadPoolExecutor(max_workers=args.workers) as executor:
+                futures = [
+                    executor.submit(
+                        analyze_file,
+                        file_path,
+                        file_hash,
+                        args,
+                        api_key,
+                        cohere_api_key,
+                    )
+                    for file_path, file_hash in todo
+                ]
+                for future in as_completed(futures):
+                    record = future.result()
+                    write_checkpoint(checkpoint, writer.write(record))
+                    records.append(record)
+                    print(
+                        f"[{len(records)}/{len(todo)}] {record['status']} {record['file']} "
+                        f"({record['latency_s']:.1f}s)"
+                    )
+        finally:
+            write_checkpoint(checkpoint, writer.close())
+
+    # 3. Summary
+    print_summary(records, skipped, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
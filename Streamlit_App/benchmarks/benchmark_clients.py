@@ -0,0 +1,193 @@
+"""Benchmark the reuse of the LLM clients and their connections across analyses (see client_registry.py).
+
+Example:
+    python benchmarks/benchmark_clients.py --reruns 5 --calls 10 --handshake-ms 150
+
+Starts a local server speaking the OpenAI chat completions API, which simulates the TCP and TLS handshake
+of each new connection (--handshake-ms) and the latency of each request (--latency-ms).
+Each rerun instantiates the deterministic and creative LLMs (like a click on "Analyze resume") and sends
+--calls concurrent chat completions on a pooled event loop (like resume_analyzer_main). Reports for each mode:
+ - "fresh": new clients and a new event loop for each rerun (the client registry is cleared),
+ - "registry": the clients, their connections and the event loops are reused,
+ - "registry + preconnect": the connections are opened before the first rerun (like at app start),
+the latency of the first and of the next reruns, the connections opened by the server and the client statistics.
+The LLM cache is not used.
+"""
+
+import argparse, asyncio, json, os, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from client_registry import (
+    run_async,
+    open_connections,
+    clear_client_registry,
+    get_client_registry_stats,
+)
+from llm_cache import get_llm_cache
+from llm_functions import instantiate_LLM, call_LLM
+from rate_limiter import set_rate_limit
+
+API_KEY = "sk-benchmark"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the reuse of the LLM clients and connections."
+    )
+    parser.add_argument("--reruns", type=int, default=5, help="Reruns per mode.")
+    parser.add_argument(
+        "--calls", type=int, default=10, help="Concurrent LLM calls per rerun."
+    )
+    parser.add_argument(
+        "--handshake-ms",
+        type=float,
+        default=150,
+        help="Simulated TCP + TLS handshake of each new connection (milliseconds).",
+    )
+    parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=50,
+        help="Simulated latency of each request (milliseconds).",
+    )
+    return parser.parse_args()
+
+
+def start_server(handshake_s, latency_s):
+    """Start the fake OpenAI server in a thread. Return the server (server.connections counts the connections)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive connections
+
+        def setup(self):
+            super().setup()
+            time.sleep(handshake_s)
+            with self.server.lock:
+                self.server.connections += 1
+
+        def send_json(self, response):
+            body = json.dumps(response).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.send_json({"object": "list", "data": []})
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            time.sleep(latency_s)
+            self.send_json(
+                {
+                    "id": "chatcmpl-benchmark",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": "{}"},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": 10,
+                        "completion_tokens": 1,
+                        "total_tokens": 11,
+                    },
+                }
+            )
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # Listen backlog: the concurrent connections are not delayed by SYN retransmissions.
+        request_queue_size = 128
+
+    server = Server(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def analyze(llm, llm_creative, calls):
+    """Send the calls concurrently, half with each LLM."""
+    await asyncio.gather(
+        *[
+            call_LLM(llm if i % 2 == 0 else llm_creative, f"Prompt {i} {time.time()}")
+            for i in range(calls)
+        ]
+    )
+
+
+def rerun(calls):
+    """Instantiate the LLMs and analyze: return the latency in seconds."""
+    start = time.perf_counter()
+    llm = instantiate_LLM(
+        "OpenAI", API_KEY, temperature=0.0, model_name="gpt-3.5-turbo-0125"
+    )
+    llm_creative = instantiate_LLM(
+        "OpenAI", API_KEY, temperature=0.7, model_name="gpt-3.5-turbo-0125"
+    )
+    run_async(analyze(llm, llm_creative, calls))
+    return time.perf_counter() - start
+
+
+def benchmark_mode(mode, server, args):
+    clear_client_registry()
+    server.connections = 0
+    clients_before = get_client_registry_stats()["clients"].get("chat", {})
+    if mode == "registry + preconnect":
+        open_connections("OpenAI", API_KEY)
+    latencies = []
+    for _ in range(args.reruns):
+        if mode == "fresh":
+            clear_client_registry()
+        latencies.append(rerun(args.calls))
+    clients = get_client_registry_stats()["clients"].get("chat", {})
+    created, reused = [
+        clients.get(key, 0) - clients_before.get(key, 0)
+        for key in ["created", "reused"]
+    ]
+    print(
+        f"{mode:<22} {1000 * latencies[0]:>10.0f} {1000 * np.median(latencies[1:]):>11.0f} "
+        f"{server.connections:>12} {created:>8} {reused:>7}"
+    )
+
+
+def main():
+    args = parse_args()
+    server = start_server(args.handshake_ms / 1000, args.latency_ms / 1000)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_port}/v1"
+    get_llm_cache().enabled = False
+    set_rate_limit("OpenAI")  # no rate limit
+
+    print(
+        f"{args.reruns} reruns of {args.calls} concurrent calls, "
+        f"handshake {args.handshake_ms:.0f} ms, latency {args.latency_ms:.0f} ms"
+    )
+    print(
+        f"{'mode':<22} {'first (ms)':>10} {'next (ms)':>11} {'connections':>12} {'created':>8} {'reused':>7}"
+    )
+    for mode in ["fresh", "registry", "registry + preconnect"]:
+        benchmark_mode(mode, server, args)
+
+    for name, stats in get_client_registry_stats()["connections"].items():
+        print(
+            f"Connections {name}: {stats['requests']} requests on {stats['connections']} connections "
+            f"({stats['reused_connections']} served by a reused connection)"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Compare the multi-call and the single-call extraction of the resume sections.
+
+Example:
+    python benchmarks/benchmark_extraction.py --runs 3 --malformed-rate 0.2
+    python benchmarks/benchmark_extraction.py "./resumes/*.pdf" --provider OpenAI --runs 3
+
+For each resume and each run, both extraction modes send their prompts concurrently (as the app does)
+and report:
+ - the input (prompt) and output tokens,
+ - the wall-clock time of the extraction,
+ - the parse success rate: share of the extraction stages (see resume_analyzer.EXTRACTION_STAGES)
+   found with the expected type in the json responses.
+The summary evaluation and the later stages are the same in both modes and are not benchmarked.
+The LLM cache is disabled.
+With the "Fake" provider (default), the fake chat model of fake_models.py answers offline (no API key,
+no cost) after --chat-latency seconds, with malformed json at --malformed-rate; the default resume is the
+sample resume of Notebooks/data/resume. The OpenAI and Google providers read their API key from keys.env.
+"""
+
+import argparse, asyncio, glob, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import json_scanner
+from benchmark_pipeline import SAMPLE_RESUME
+from fake_models import configure_fake_models, set_fake_models_seed
+from llm_cache import get_llm_cache
+from llm_functions import instantiate_LLM, get_api_keys_from_local_env, call_LLM
+from retrieval import langchain_document_loader
+from token_accounting import count_tokens
+from resume_analyzer import create_prompt, split_all_sections, EXTRACTION_STAGES
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the multi-call and single-call extraction modes."
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="*",
+        default=[SAMPLE_RESUME],
+        help="PDF files or glob patterns. Default: the sample resume.",
+    )
+    parser.add_argument(
+        "--provider", default="Fake", choices=["Fake", "OpenAI", "Google"]
+    )
+    parser.add_argument(
+        "--model",
+        default=None,
+        help="Default: fake-chat, gpt-3.5-turbo-0125 or gemini-pro.",
+    )
+    parser.add_argument(
+        "--chat-latency",
+        type=float,
+        default=0.5,
+        help="Median latency of the fake chat model (seconds).",
+    )
+    parser.add_argument(
+        "--malformed-rate",
+        type=float,
+        default=0.0,
+        help="Rate of malformed json responses of the fake chat model.",
+    )
+    parser.add_argument("--language", default="english")
+    parser.add_argument("--runs", type=int, default=3, help="Runs per resume.")
+    return parser.parse_args()
+
+
+def get_extraction_prompts(documents, extraction_mode, language):
+    """Return the prompts of the extraction mode."""
+    if extraction_mode == "single_call":
+        all_sections = [
+            section for sections in EXTRACTION_STAGES.values() for section in sections
+        ]
+        return [create_prompt(documents, all_sections, language)]
+    return [
+        create_prompt(documents, sections, language)
+        for sections in EXTRACTION_STAGES.values()
+    ]
+
+
+def parse_response(response_content):
+    """Load the json dictionary of the response (repaired if malformed), or return an empty dict."""
+    try:
+        parsed_response = json_scanner.loads(response_content)
+    except json_scanner.JSONScanError:
+        return {}
+    return parsed_response if isinstance(parsed_response, dict) else {}
+
+
+async def run_extraction(llm, prompts):
+    """Send the prompts concurrently. Return the response contents and the wall-clock time."""
+    start = time.perf_counter()
+    responses = await asyncio.gather(*[call_LLM(llm, prompt) for prompt in prompts])
+    return [response.content for response in responses], time.perf_counter() - start
+
+
+def benchmark_resume(llm, documents, extraction_mode, language, model):
+    """Run the extraction mode once. Return the measures of the run."""
+    prompts = get_extraction_prompts(documents, extraction_mode, language)
+    contents, wall_time = asyncio.run(run_extraction(llm, prompts))
+
+    # Merge the parsed responses, then check each extraction stage.
+    ALL_SECTIONS = {}
+    for content in contents:
+        ALL_SECTIONS.update(parse_response(content))
+    parsed_stages = sum(
+        split_all_sections(ALL_SECTIONS, stage_name) is not None
+        for stage_name in EXTRACTION_STAGES
+    )
+
+    return {
+        "calls": len(prompts),
+        "input_tokens": sum(count_tokens(prompts, model)),
+        "output_tokens": sum(count_tokens(contents, model)),
+        "wall_time": wall_time,
+        "parse_success": parsed_stages / len(EXTRACTION_STAGES),
+    }
+
+
+def print_report(measures):
+    """Print the mean measures of each extraction mode."""
+    print("\n" + "=" * 84)
+    print(
+        f"{'mode':<12} {'calls':>6} {'input tokens':>13} {'output tokens':>14} "
+        f"{'time p50':>9} {'time p95':>9} {'parse success':>14}"
+    )
+    for extraction_mode, runs in measures.items():
+        wall_times = [run["wall_time"] for run in runs]
+        print(
+            f"{extraction_mode:<12} "
+            f"{np.mean([run['calls'] for run in runs]):>6.1f} "
+            f"{np.mean([run['input_tokens'] for run in runs]):>13.0f} "
+            f"{np.mean([run['output_tokens'] for run in runs]):>14.0f} "
+            f"{np.percentile(wall_times, 50):>8.2f}s "
+            f"{np.percentile(wall_times, 95):>8.2f}s "
+            f"{100 * np.mean([run['parse_success'] for run in runs]):>13.1f}%"
+        )
+    print("=" * 84)
+
+
+def main():
+    args = parse_args()
+    if args.model is None:
+        args.model = {
+            "Fake": "fake-chat",
+            "OpenAI": "gpt-3.5-turbo-0125",
+            "Google": "gemini-pro",
+        }[args.provider]
+
+    if args.provider == "Fake":
+        api_key = None
+        configure_fake_models(
+            "chat",
+            latency_median=args.chat_latency,
+            malformed_rate=args.malformed_rate,
+        )
+    else:
+        openai_api_key, google_api_key, _ = get_api_keys_from_local_env()
+        api_key = openai_api_key if args.provider == "OpenAI" else google_api_key
+    get_llm_cache().enabled = False
+
+    pdf_files = sorted(
+        {file for pattern in args.inputs for file in glob.glob(pattern, recursive=True)}
+    )
+    measures = {"multi_call": [], "single_call": []}
+
+    for file_path in pdf_files:
+        documents = langchain_document_loader(file_path)
+        for run in range(args.runs):
+            set_fake_models_seed(run)
+            for extraction_mode in measures:
+                # Async clients are bound to the event loop of the run: one LLM per run.
+                llm = instantiate_LLM(
+                    args.provider,
+                    api_key,
+                    temperature=0.0,
+                    top_p=0.95,
+                    model_name=args.model,
+                )
+                run_measures = benchmark_resume(
+                    llm, documents, extraction_mode, args.language, args.model
+                )
+                measures[extraction_mode].append(run_measures)
+                print(
+                    f"{os.path.basename(file_path)} run {run+1} {extraction_mode}: "
+                    f"{run_measures['input_tokens']} input tokens, "
+                    f"{run_measures['wall_time']:.2f}s, "
+                    f"parse success {100 * run_measures['parse_success']:.0f}%"
+                )
+
+    print_report(measures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark the ingestion of uploaded resumes under N concurrent sessions.
+
+Example:
+    python benchmarks/benchmark_ingestion.py --sessions 1 4 16 --uploads 5 --pages 2
+
+Each session is a thread (Streamlit runs the script of each session in its own thread) ingesting
+`--uploads` resumes one after another, with:
+ - "shared tmp dir": the former ingestion, which deleted all the files of a directory shared by the sessions,
+   wrote the upload there and parsed it back from disk with PDFMinerLoader,
+ - "in memory": langchain_document_loader(name, file_bytes=...), which parses the upload buffer.
+   The page cache of pdf_parser.py is not used: every upload is parsed, like in the former ingestion.
+Reports the p50/p95 latency of an ingestion and the failed ingestions (files deleted by another session).
+"""
+
+import argparse, glob, os, sys, tempfile, threading, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_community.document_loaders import PDFMinerLoader
+
+from benchmark_pipeline import create_synthetic_resume
+from retrieval import langchain_document_loader
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the upload ingestion under concurrent sessions."
+    )
+    parser.add_argument(
+        "--sessions",
+        type=int,
+        nargs="*",
+        default=[1, 4, 16],
+        help="Numbers of concurrent sessions.",
+    )
+    parser.add_argument(
+        "--uploads", type=int, default=5, help="Uploads ingested per session."
+    )
+    parser.add_argument(
+        "--pages", type=int, default=2, help="Pages of the synthetic resume."
+    )
+    return parser.parse_args()
+
+
+def ingest_shared_tmp_dir(tmp_dir, file_name, file_bytes):
+    """Former ingestion: sweep the shared directory, save the upload, parse it from disk."""
+    for f in glob.glob(os.path.join(tmp_dir, "*")):
+        try:
+            os.remove(f)
+        except:
+            pass
+    file_path = os.path.join(tmp_dir, file_name)
+    with open(file_path, "wb") as temp_file:
+        temp_file.write(file_bytes)
+    return PDFMinerLoader(file_path=file_path).load_and_split()
+
+
+def ingest_in_memory(tmp_dir, file_name, file_bytes):
+    return langchain_document_loader(file_name, file_bytes=file_bytes, use_cache=False)
+
+
+def run_sessions(ingest, n_sessions, file_bytes, args, tmp_dir):
+    """Run n_sessions concurrent sessions. Return the ingestion latencies and the number of failures."""
+    latencies, failures = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(n_sessions)
+
+    def session(session_id):
+        barrier.wait()
+        for upload in range(args.uploads):
+            start = time.perf_counter()
+            try:
+                ingest(tmp_dir, f"resume_{session_id}_{upload}.pdf", file_bytes)
+                failed = False
+            except Exception:
+                failed = True
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                failures.append(failed)
+
+    threads = [
+        threading.Thread(target=session, args=(session_id,))
+        for session_id in range(n_sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(failures)
+
+
+def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        resume_path = os.path.join(tmp_dir, "resume.pdf")
+        create_synthetic_resume(resume_path, args.pages)
+        with open(resume_path, "rb") as f:
+            file_bytes = f.read()
+
+        shared_tmp_dir = os.path.join(tmp_dir, "shared")
+        os.makedirs(shared_tmp_dir)
+
+        print(
+            f"{'sessions':>8} {'ingestion':<16} {'p50 (ms)':>9} {'p95 (ms)':>9} {'failed':>10}"
+        )
+        for n_sessions in args.sessions:
+            for name, ingest in [
+                ("shared tmp dir", ingest_shared_tmp_dir),
+                ("in memory", ingest_in_memory),
+            ]:
+                latencies, failures = run_sessions(
+                    ingest, n_sessions, file_bytes, args, shared_tmp_dir
+                )
+                print(
+                    f"{n_sessions:>8} {name:<16} "
+                    f"{1000 * np.percentile(latencies, 50):>9.1f} "
+                    f"{1000 * np.percentile(latencies, 95):>9.1f} "
+                    f"{failures:>4}/{len(latencies):<5}"
+                )
+
+
+if __name__ == "__main__":
+    main()
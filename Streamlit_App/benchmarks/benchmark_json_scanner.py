@@ -0,0 +1,192 @@
+"""Benchmark and fuzz the tolerant json scanner of json_scanner.py.
+
+Example:
+    python benchmarks/benchmark_json_scanner.py --runs 200 --fuzz 2000
+
+Reports:
+ - the corpus benchmarks/data/malformed_responses.jsonl (malformed responses with the defects seen in the
+   LLM responses to the prompts of resume_analyzer, and their expected value): for the former parsing
+   (json.loads of the text between the first '{' and the last '}') and the json scanner,
+   the share of the responses recovered exactly and the median parsing time,
+ - the parsing time of a malformed response (slow path) of growing size: the scan must stay linear,
+ - with --fuzz N: N random mutations (deleted or inserted characters, truncation, code fences...) of
+   a valid response of the fake chat model. The scanner must never raise anything but a JSONScanError;
+   reports the share of the resume sections recovered by each parser.
+"""
+
+import argparse, json, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from fake_models import FAKE_RESUME_SECTIONS
+from json_scanner import JSONScanError, scan_json
+
+CORPUS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "malformed_responses.jsonl"
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the tolerant json scanner.")
+    parser.add_argument("--runs", type=int, default=200, help="Runs per response.")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=[1, 10, 100],
+        help="Sizes (in copies of the work experience) of the linearity check.",
+    )
+    parser.add_argument(
+        "--fuzz", type=int, default=0, help="Number of random mutations to parse."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fuzzer.")
+    return parser.parse_args()
+
+
+def parse_sliced_json(text):
+    """Former parsing: json.loads of the text between the first '{' and the last '}'."""
+    return json.loads(text[text.find("{") : text.rfind("}") + 1])
+
+
+def parse_json_scanner(text):
+    return scan_json(text)[0]
+
+
+PARSERS = {"sliced json.loads": parse_sliced_json, "json scanner": parse_json_scanner}
+
+
+def try_parse(parse, text):
+    try:
+        return parse(text)
+    except ValueError:
+        return None
+
+
+def measure(parse, text, runs):
+    """Return the median time of parse(text)."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        try_parse(parse, text)
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def benchmark_corpus(runs):
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    print(f"Corpus: {len(corpus)} responses")
+    print(f"{'parser':<18} {'recovered':>10} {'median (us)':>12}")
+    for name, parse in PARSERS.items():
+        recovered = [try_parse(parse, e["response"]) == e["expected"] for e in corpus]
+        times = [measure(parse, e["response"], runs) for e in corpus]
+        print(
+            f"{name:<18} {sum(recovered):>4}/{len(corpus):<5} "
+            f"{1e6 * np.median(times):>12.1f}"
+        )
+    for e in corpus:
+        if try_parse(parse_json_scanner, e["response"]) != e["expected"]:
+            print(f"Not recovered by the json scanner: {e['defect']}")
+
+
+def benchmark_linearity(sizes, runs):
+    """Parse a response with a trailing comma (slow path) of growing size."""
+    print(f"\n{'size (KB)':>9} {'scan (ms)':>10} {'us/KB':>8}")
+    for size in sizes:
+        response = dict(FAKE_RESUME_SECTIONS)
+        response["Work__experience"] = FAKE_RESUME_SECTIONS["Work__experience"] * size
+        text = json.dumps(response, indent=4)
+        text = text[: text.rfind("}")].rstrip() + ",\n}"
+        scan_time = measure(parse_json_scanner, text, max(1, runs // size))
+        size_kb = len(text) / 1024
+        print(
+            f"{size_kb:>9.1f} {1000 * scan_time:>10.2f} {1e6 * scan_time / size_kb:>8.1f}"
+        )
+
+
+def mutate(text, rng):
+    """Apply a random defect to the text."""
+    mutation = rng.choice(
+        [
+            "delete",
+            "insert comma",
+            "insert newline",
+            "insert quote",
+            "delete comma",
+            "truncate",
+            "code fence",
+        ]
+    )
+    i = rng.randrange(len(text) + 1)
+    if mutation == "delete":
+        return text[:i] + text[i + 1 :]
+    if mutation == "insert comma":
+        return text[:i] + "," + text[i:]
+    if mutation == "insert newline":
+        return text[:i] + "\n" + text[i:]
+    if mutation == "insert quote":
+        return text[:i] + '"' + text[i:]
+    if mutation == "delete comma" and "," in text:
+        commas = [j for j, char in enumerate(text) if char == ","]
+        j = rng.choice(commas)
+        return text[:j] + text[j + 1 :]
+    if mutation == "truncate":
+        return text[:i]
+    if mutation == "code fence":
+        return "```json\n" + text + "\n```\nThe resume sections are above."
+    return text
+
+
+def fuzz(n_mutations, seed):
+    """Parse random mutations of a valid response. Report the resume sections recovered."""
+    rng = random.Random(seed)
+    text = json.dumps(FAKE_RESUME_SECTIONS, indent=4)
+    recovered = {name: 0 for name in PARSERS}
+    scan_errors, crashes = 0, []
+    for _ in range(n_mutations):
+        mutated = mutate(text, rng)
+        if rng.random() < 0.5:
+            mutated = mutate(mutated, rng)
+        for name, parse in PARSERS.items():
+            try:
+                value = parse(mutated)
+            except JSONScanError:
+                scan_errors += 1
+                continue
+            except ValueError:
+                if name == "json scanner":
+                    crashes.append(mutated)
+                continue
+            except Exception:
+                crashes.append(mutated)
+                continue
+            if isinstance(value, dict):
+                recovered[name] += sum(
+                    value.get(key) == section
+                    for key, section in FAKE_RESUME_SECTIONS.items()
+                )
+
+    n_sections = n_mutations * len(FAKE_RESUME_SECTIONS)
+    print(f"\nFuzzing: {n_mutations} mutated responses")
+    print(f"{'parser':<18} {'sections recovered':>19}")
+    for name, n_recovered in recovered.items():
+        print(f"{name:<18} {100 * n_recovered / n_sections:>18.1f}%")
+    print(f"No json found: {scan_errors}, unexpected exceptions: {len(crashes)}")
+    for mutated in crashes[:3]:
+        print(repr(mutated[:200]))
+    return not crashes
+
+
+def main():
+    args = parse_args()
+    benchmark_corpus(args.runs)
+    benchmark_linearity(args.sizes, args.runs)
+    if args.fuzz and not fuzz(args.fuzz, args.seed):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
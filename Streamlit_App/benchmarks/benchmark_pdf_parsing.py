@@ -0,0 +1,115 @@
+"""Benchmark the PDF parsing of pdf_parser.py on synthetic 1-, 5- and 30-page resumes.
+
+Example:
+    python benchmarks/benchmark_pdf_parsing.py --pages 1 5 30 --runs 5 --workers 4
+
+For each PDF, reports the median parsing time of:
+ - "PDFMinerLoader": the former parsing (whole document, single process),
+ - "pdfminer serial": parse_pdf with one process,
+ - "pdfminer parallel": parse_pdf with a pool of --workers processes (the pool is started before the runs),
+ - "pdfminer cached": parse_pdf when all the pages are in the page cache,
+ - the optional fast backends ("pypdfium2", "pymupdf") when they are installed,
+and whether the extracted text is identical to PDFMinerLoader's.
+"""
+
+import argparse, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from langchain_community.document_loaders import PDFMinerLoader
+
+from benchmark_pipeline import create_synthetic_resume
+from pdf_parser import (
+    PDF_BACKENDS,
+    is_backend_available,
+    parse_pdf,
+    get_page_cache,
+    get_process_pool,
+    extract_pages,
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF parsing.")
+    parser.add_argument(
+        "--pages",
+        type=int,
+        nargs="*",
+        default=[1, 5, 30],
+        help="Page counts of the synthetic resumes.",
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Runs per parser.")
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Processes of the parallel parsing."
+    )
+    return parser.parse_args()
+
+
+def measure(parse, runs):
+    """Return the median time of parse() and its last output."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        text = parse()
+        times.append(time.perf_counter() - start)
+    return np.median(times), text
+
+
+def get_parsers(file_path, pdf_bytes, workers):
+    parsers = {
+        "PDFMinerLoader": lambda: PDFMinerLoader(file_path).load()[0].page_content,
+        "pdfminer serial": lambda: "".join(
+            parse_pdf(pdf_bytes, max_workers=1, use_cache=False)
+        ),
+        "pdfminer parallel": lambda: "".join(
+            parse_pdf(pdf_bytes, max_workers=workers, use_cache=False)
+        ),
+        "pdfminer cached": lambda: "".join(parse_pdf(pdf_bytes, max_workers=1)),
+    }
+    for backend in PDF_BACKENDS[1:]:
+        if is_backend_available(backend):
+            parsers[backend] = lambda backend=backend: "".join(
+                parse_pdf(pdf_bytes, backend=backend, use_cache=False)
+            )
+    return parsers
+
+
+def main():
+    args = parse_args()
+
+    # Start the worker processes before the measures.
+    if args.workers > 1:
+        pool = get_process_pool(args.workers)
+        list(
+            pool.map(
+                extract_pages,
+                ["pdfminer"] * args.workers,
+                [b""] * args.workers,
+                [[]] * args.workers,
+            )
+        )
+
+    print(f"{'pages':>5} {'parser':<18} {'time (ms)':>10} {'identical text':>15}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_pages in args.pages:
+            file_path = os.path.join(tmp_dir, f"synthetic_{n_pages}_pages.pdf")
+            create_synthetic_resume(file_path, n_pages)
+            with open(file_path, "rb") as f:
+                pdf_bytes = f.read()
+
+            get_page_cache().clear()
+            parse_pdf(pdf_bytes, max_workers=1)  # fill the page cache
+            reference = None
+            for name, parse in get_parsers(file_path, pdf_bytes, args.workers).items():
+                parse_time, text = measure(parse, args.runs)
+                if reference is None:
+                    reference = text
+                print(
+                    f"{n_pages:>5} {name:<18} {1000 * parse_time:>10.1f} "
+                    f"{str(text == reference):>15}"
+                )
+
+
+if __name__ == "__main__":
+    main()
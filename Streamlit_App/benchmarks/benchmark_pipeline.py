@@ -0,0 +1,384 @@
+"""Offline end-to-end benchmark of the resume analysis, with the fake models (no API key, no network, no cost).
+
+Example:
+    python benchmarks/benchmark_pipeline.py --runs 5 --pages 1 5 20 --chat-latency 0.5 --failure-rate 0.02
+    python benchmarks/benchmark_pipeline.py --malformed-rate 0.2 --no-structured-output
+    python benchmarks/benchmark_pipeline.py --streaming
+    python benchmarks/benchmark_pipeline.py --prompt-layout resume_first
+
+Runs the whole pipeline (PDF loading, vector store, retriever and resume_analyzer_main) on the sample resume
+of Notebooks/data/resume and on synthetic multi-page resumes, with the fake chat model, embeddings and reranker
+of fake_models.py. For each resume, reports per stage (from the trace spans):
+ - p50 and p95 latency,
+ - LLM calls per run,
+ - CPU time per run (process CPU time: with concurrent stages, it includes the CPU time of the other stages;
+   run with --max-concurrency 1 to attribute the CPU time to each stage),
+ - the share of invalid LLM responses (repaired by the json scanner or failed, see structured_output.py).
+   The fake chat model returns malformed json at --malformed-rate, unless structured output is used,
+ - the share of the prompt tokens read from the prompt cache of the provider (simulated by the fake chat model,
+   emptied before each run). With --prompt-layout resume_first, the prompts on the whole resume share
+   their prefix (see prompt_templates.py).
+The fake chat model answers ['unknown'] to the --unknown-sections (list sections missing from the resume,
+as requested by the extraction prompts): they must be parsed as empty lists, not as failed responses.
+With --streaming, the extraction responses are streamed (the fake chat model spreads its latency over the
+chunks of the response), and the work experiences and projects are processed as soon as they are streamed.
+The LLM and embeddings caches are not used.
+"""
+
+import argparse, logging, os, sys, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from streamlit import config as st_config
+
+from app_constants import (
+    MAX_CONCURRENT_STAGES,
+    RETRIEVAL_TOKEN_BUDGET,
+    PROMPT_LAYOUTS,
+    DEFAULT_PROMPT_LAYOUT,
+)
+from fake_models import (
+    configure_fake_models,
+    set_fake_models_seed,
+    clear_fake_prompt_cache,
+)
+from llm_cache import get_llm_cache
+from llm_functions import instantiate_LLM
+from retrieval import langchain_document_loader, create_retriever
+from resume_analyzer import resume_analyzer_main
+from tracing import trace
+
+# Streamlit calls (st.info...) are no-ops outside of `streamlit run`: hide the related warnings.
+st_config.set_option("global.showWarningOnDirectExecution", False)
+logging.getLogger("streamlit.runtime.scriptrunner.script_run_context").setLevel(
+    logging.ERROR
+)
+
+SAMPLE_RESUME = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "Notebooks",
+    "data",
+    "resume",
+    "ChatGPT_dataScientist.pdf",
+)
+
+# Spans reported per stage: the analysis stages, PDF loading, retrieval decision and vector store creation.
+REPORTED_CATEGORIES = ["ingestion", "stage"]
+REPORTED_SPANS = ["retrieval_decision", "vectorstore_creation", "prompt_template"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Offline benchmark of the resume analysis with fake models."
+    )
+    parser.add_argument("--runs", type=int, default=3, help="Runs per resume.")
+    parser.add_argument(
+        "--pages",
+        type=int,
+        nargs="*",
+        default=[1, 5, 20],
+        help="Page counts of the synthetic resumes.",
+    )
+    parser.add_argument(
+        "--chat-latency",
+        type=float,
+        default=0.5,
+        help="Median latency of the fake chat model (seconds).",
+    )
+    parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=0.3,
+        help="Sigma of the lognormal latency distribution of the fake models.",
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="Failure rate of the fake chat model calls.",
+    )
+    parser.add_argument(
+        "--malformed-rate",
+        type=float,
+        default=0.0,
+        help="Rate of malformed json responses of the fake chat model (without structured output).",
+    )
+    parser.add_argument(
+        "--unknown-sections",
+        nargs="*",
+        default=["CV__Certifications"],
+        help="List sections answered with ['unknown'] by the fake chat model (missing from the resume).",
+    )
+    parser.add_argument(
+        "--structured-output",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Request the json responses with their schema (function calling or JSON mode).",
+    )
+    parser.add_argument(
+        "--streaming",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="Stream the extraction responses and start the per-item stages as soon as the items are streamed.",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        type=int,
+        default=MAX_CONCURRENT_STAGES,
+        help="Maximum number of concurrent stages.",
+    )
+    parser.add_argument(
+        "--extraction-mode", default="multi_call", choices=["multi_call", "single_call"]
+    )
+    parser.add_argument(
+        "--prompt-layout", default=DEFAULT_PROMPT_LAYOUT, choices=PROMPT_LAYOUTS
+    )
+    parser.add_argument(
+        "--reranker",
+        default="local",
+        choices=["local", "cohere"],
+        help="cohere: the fake Cohere reranker (simulated latency).",
+    )
+    parser.add_argument(
+        "--retrieval-token-budget",
+        type=int,
+        default=RETRIEVAL_TOKEN_BUDGET,
+        help="Resumes under this number of tokens are analyzed without retrieval (0: always use the retrieval).",
+    )
+    return parser.parse_args()
+
+
+###############################################################################
+#                           Synthetic resumes
+###############################################################################
+
+
+def escape_pdf_text(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(file_path, pages):
+    """Write a minimal PDF file: one page of Helvetica text per list of lines."""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # the page tree, written once the page ids are known
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        stream = "BT /F1 10 Tf 14 TL 50 810 Td " + " ".join(
+            f"({escape_pdf_text(line)}) '" for line in lines
+        )
+        stream += " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] "
+        f"/Count {len(page_ids)} >>"
+    )
+
+    content = "%PDF-1.4\n"
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(content.encode("latin-1")))
+        content += f"{i+1} 0 obj\n{obj}\nendobj\n"
+    xref_offset = len(content.encode("latin-1"))
+    content += f"xref\n0 {len(objects)+1}\n0000000000 65535 f \n"
+    content += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    content += f"trailer\n<< /Size {len(objects)+1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n"
+
+    with open(file_path, "wb") as f:
+        f.write(content.encode("latin-1"))
+
+
+def create_synthetic_resume(file_path, n_pages, lines_per_page=50):
+    """Write a synthetic resume of n_pages pages: contact, summary, then work experiences,
+    projects, education, skills and languages, repeated to fill the pages."""
+    lines = [
+        "Jane Doe - Data Scientist",
+        "Paris, France | jane.doe@example.com | +33 6 00 00 00 00 | github.com/janedoe",
+        "",
+        "SUMMARY",
+        "Data scientist with 6 years of experience in machine learning and data engineering.",
+        "",
+    ]
+    i = 0
+    while len(lines) < n_pages * lines_per_page:
+        i += 1
+        lines += [
+            "WORK EXPERIENCE",
+            f"Data Scientist {i} - Company {i} (20{10 + i % 10}/01 - 20{11 + i % 10}/12)",
+            f"- Built machine learning model {i} to predict customer churn.",
+            f"- Deployed pipeline {i} to production with Python, SQL and Airflow.",
+            f"- Reduced the processing time of report {i} by {10 + i % 50}%.",
+            "",
+            "PROJECTS",
+            f"Project {i}: recommendation engine (20{12 + i % 10})",
+            f"- Designed feature store {i} and trained gradient boosting models.",
+            "",
+            "EDUCATION",
+            f"University {i} - MSc in Applied Mathematics (2015 - 2017)",
+            "",
+            "SKILLS",
+            "Python, SQL, Spark, Machine learning, Deep learning, Communication",
+            "",
+            "LANGUAGES",
+            "English (fluent), French (native)",
+            "",
+        ]
+    lines = lines[: n_pages * lines_per_page]
+    write_pdf(
+        file_path,
+        [
+            lines[page * lines_per_page : (page + 1) * lines_per_page]
+            for page in range(n_pages)
+        ],
+    )
+
+
+###############################################################################
+#                           Benchmark
+###############################################################################
+
+
+def run_pipeline(file_path, args):
+    """Analyze the resume with the fake models.
+    Return the trace events, the token usage, the parse statistics and the number of chunks.
+    """
+    with trace("benchmark", export=False, file=os.path.basename(file_path)) as tracer:
+        documents = langchain_document_loader(file_path)
+        _, retriever = create_retriever(
+            documents,
+            "Fake",
+            None,
+            None,
+            use_embeddings_cache=False,
+            reranker=args.reranker,
+            retrieval_token_budget=args.retrieval_token_budget,
+        )
+        llm = instantiate_LLM(
+            "Fake", None, temperature=0.0, structured_output=args.structured_output
+        )
+        llm_creative = instantiate_LLM(
+            "Fake", None, temperature=0.7, structured_output=args.structured_output
+        )
+        SCANNED_RESUME = resume_analyzer_main(
+            llm=llm,
+            llm_creative=llm_creative,
+            documents=documents,
+            retriever=retriever,
+            max_concurrency=args.max_concurrency,
+            extraction_mode=args.extraction_mode,
+            save_results=False,
+            streaming=args.streaming,
+            prompt_layout=args.prompt_layout,
+        )
+    return (
+        tracer.events,
+        SCANNED_RESUME["Token__usage"],
+        SCANNED_RESUME["Parse__stats"],
+        len(documents),
+    )
+
+
+def benchmark_resume(name, file_path, args):
+    """Run the pipeline args.runs times on a resume, print the per-stage report."""
+    measures = (
+        {}
+    )  # {stage: {"latency": [...], "cpu": [...], "calls": [...], "invalid": [...], "cached": [...]}}
+    failed_calls = 0
+    for run in range(args.runs):
+        set_fake_models_seed(run)
+        clear_fake_prompt_cache()
+        events, token_usage, parse_stats, n_chunks = run_pipeline(file_path, args)
+
+        for event in events:
+            if event["name"] == "llm_call" and "error" in event["args"]:
+                failed_calls += 1
+            if event["cat"] == "run":
+                stage = "TOTAL"
+            elif event["cat"] in REPORTED_CATEGORIES or event["name"] in REPORTED_SPANS:
+                stage = event["name"]
+            else:
+                continue
+            stage_measures = measures.setdefault(
+                stage,
+                {"latency": [], "cpu": [], "calls": [], "invalid": [], "cached": []},
+            )
+            stage_measures["latency"].append(event["dur"] / 1e6)
+            stage_measures["cpu"].append(event["args"]["cpu_s"])
+            if stage == "TOTAL":
+                stage_token_usage = token_usage["total"]
+                stage_parse_stats = parse_stats["total"]
+            else:
+                stage_token_usage = token_usage["stages"].get(stage, {})
+                stage_parse_stats = parse_stats["stages"].get(stage)
+            stage_measures["calls"].append(stage_token_usage.get("calls", 0))
+            if stage_token_usage.get("prompt_tokens"):
+                stage_measures["cached"].append(
+                    stage_token_usage["cached_prompt_tokens"]
+                    / stage_token_usage["prompt_tokens"]
+                )
+            if stage_parse_stats is not None:
+                stage_measures["invalid"].append(stage_parse_stats["failure_rate"])
+
+    print(
+        f"\n{name}: {n_chunks} chunks, {args.runs} runs, {failed_calls} failed LLM calls"
+    )
+    print(
+        f"{'stage':<30} {'p50 (s)':>9} {'p95 (s)':>9} {'LLM calls':>10} {'CPU (ms)':>10} "
+        f"{'invalid':>8} {'cached prompt':>14}"
+    )
+    for stage, stage_measures in measures.items():
+        invalid = (
+            f"{100 * np.mean(stage_measures['invalid']):>7.1f}%"
+            if stage_measures["invalid"]
+            else f"{'-':>8}"
+        )
+        cached = (
+            f"{100 * np.mean(stage_measures['cached']):>13.1f}%"
+            if stage_measures["cached"]
+            else f"{'-':>14}"
+        )
+        print(
+            f"{stage:<30} "
+            f"{np.percentile(stage_measures['latency'], 50):>9.3f} "
+            f"{np.percentile(stage_measures['latency'], 95):>9.3f} "
+            f"{np.mean(stage_measures['calls']):>10.1f} "
+            f"{1000 * np.mean(stage_measures['cpu']):>10.1f} "
+            f"{invalid} {cached}"
+        )
+
+
+def main():
+    args = parse_args()
+    configure_fake_models(
+        "chat",
+        latency_median=args.chat_latency,
+        latency_sigma=args.latency_sigma,
+        failure_rate=args.failure_rate,
+        malformed_rate=args.malformed_rate,
+        unknown_sections=args.unknown_sections,
+    )
+    for model_type in ["embeddings", "rerank"]:
+        configure_fake_models(model_type, latency_sigma=args.latency_sigma)
+    get_llm_cache().enabled = False
+
+    resumes = [("sample resume", SAMPLE_RESUME)]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_pages in args.pages:
+            file_path = os.path.join(tmp_dir, f"synthetic_{n_pages}_pages.pdf")
+            create_synthetic_resume(file_path, n_pages)
+            resumes.append((f"synthetic resume ({n_pages} pages)", file_path))
+
+        for name, file_path in resumes:
+            benchmark_resume(name, file_path, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Micro-benchmark of the NumPy brute-force vector store against FAISS, per resume session.
+
+Example:
+    python benchmarks/benchmark_vectorstore.py --chunks 5 20 100 1000 --dim 1536 --queries 100
+
+For each number of chunks, builds both vector stores from the same precomputed (random) embeddings
+and reports:
+ - the build time,
+ - the mean query time of a top-k similarity search (query embedding precomputed),
+ - the memory of the index (NumPy: embeddings matrix; FAISS: serialized index),
+ - the share of the queries where both stores return the same top-k chunks.
+The embedding calls are not measured: they are the same for both stores.
+"""
+
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from fake_models import FakeEmbeddings
+from numpy_vectorstore import NumpyVectorStore, normalize
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the NumPy vector store against FAISS."
+    )
+    parser.add_argument(
+        "--chunks",
+        type=int,
+        nargs="*",
+        default=[5, 20, 100, 1000, 5000],
+        help="Numbers of chunks per session.",
+    )
+    parser.add_argument(
+        "--dim", type=int, default=1536, help="Embedding size (OpenAI: 1536)."
+    )
+    parser.add_argument("--queries", type=int, default=100, help="Queries per store.")
+    parser.add_argument("--k", type=int, default=4, help="Documents per query.")
+    parser.add_argument("--repeats", type=int, default=5, help="Builds per store.")
+    return parser.parse_args()
+
+
+def build_numpy(texts, vectors, embeddings):
+    vector_store = NumpyVectorStore(embeddings)
+    vector_store.add_embeddings(texts, vectors)
+    return vector_store
+
+
+def build_faiss(texts, vectors, embeddings):
+    return FAISS.from_embeddings(list(zip(texts, vectors)), embeddings)
+
+
+def get_index_memory(vector_store):
+    if isinstance(vector_store, NumpyVectorStore):
+        return vector_store.memory_usage()
+    return len(faiss.serialize_index(vector_store.index))
+
+
+def benchmark(n_chunks, args, rng):
+    """Measure both vector stores on n_chunks random embeddings. Return {store: measures}."""
+    embeddings = FakeEmbeddings(size=args.dim)
+    texts = [f"chunk {i}" for i in range(n_chunks)]
+    # FAISS uses the L2 distance: with normalized vectors, it ranks the chunks like the cosine similarity.
+    vectors = normalize(rng.standard_normal((n_chunks, args.dim))).tolist()
+    queries = normalize(rng.standard_normal((args.queries, args.dim))).tolist()
+
+    measures, results = {}, {}
+    for name, build in [("numpy", build_numpy), ("faiss", build_faiss)]:
+        build_times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            vector_store = build(texts, vectors, embeddings)
+            build_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results[name] = [
+            [
+                document.page_content
+                for document in vector_store.similarity_search_by_vector(
+                    query, k=args.k
+                )
+            ]
+            for query in queries
+        ]
+        query_time = (time.perf_counter() - start) / len(queries)
+
+        measures[name] = {
+            "build_ms": 1000 * np.median(build_times),
+            "query_ms": 1000 * query_time,
+            "memory_kb": get_index_memory(vector_store) / 1024,
+        }
+
+    same_results = np.mean(
+        [
+            set(numpy_result) == set(faiss_result)
+            for numpy_result, faiss_result in zip(results["numpy"], results["faiss"])
+        ]
+    )
+    return measures, same_results
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(0)
+
+    print(
+        f"{'chunks':>7} {'store':<6} {'build (ms)':>11} {'query (ms)':>11} "
+        f"{'memory (KB)':>12} {'same top-k':>11}"
+    )
+    for n_chunks in args.chunks:
+        measures, same_results = benchmark(n_chunks, args, rng)
+        for name, store_measures in measures.items():
+            print(
+                f"{n_chunks:>7} {name:<6} "
+                f"{store_measures['build_ms']:>11.3f} "
+                f"{store_measures['query_ms']:>11.3f} "
+                f"{store_measures['memory_kb']:>12.1f} "
+                f"{100 * same_results:>10.0f}%"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Process-wide registry of the LLM, embedding and rerank clients, reused across Streamlit reruns and sessions.
+
+Each client is created once per (kind, provider, model, API key hash, parameters), see `get_client`.
+The OpenAI chat and embeddings clients of an API key share the same HTTP clients (`get_openai_client`),
+so their keep-alive connections (TCP and TLS handshakes done) serve all the analyses of the process.
+Async connections are bound to the event loop that opened them: the analyses run on pooled event loops
+(`run_async`, instead of a new event loop for each asyncio.run), and the async OpenAI clients are created
+once per event loop (`bind_to_running_loop`).
+The requests and connections of the HTTP clients are counted per provider and API key (`get_client_registry_stats`).
+"""
+
+import asyncio, copy, threading, weakref
+
+import httpx
+import openai
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+
+from app_constants import (
+    MAX_IDLE_EVENT_LOOPS,
+    HTTP_KEEPALIVE_SECONDS,
+    MAX_CONCURRENT_STAGES,
+)
+from rate_limiter import get_api_key_hash
+
+# Connection pool of each HTTP client (the OpenAI SDK defaults, with longer keep-alive).
+HTTP_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+)
+
+
+class ConnectionStats:
+    """Requests and connections of the HTTP clients of a provider and API key.
+    A request is served by a reused connection when its network stream was already used by a previous request.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = weakref.WeakSet()
+        self.requests = 0
+        self.connections = 0
+
+    def record(self, response):
+        """httpx response hook: count the request, and the connection if it is new."""
+        stream = response.extensions.get("network_stream")
+        with self._lock:
+            self.requests += 1
+            try:
+                if stream is not None and stream in self._streams:
+                    return
+                if stream is not None:
+                    self._streams.add(stream)
+            except TypeError:  # the stream cannot be weakly referenced: count it as new
+                pass
+            self.connections += 1
+
+    async def arecord(self, response):
+        """httpx response hook of the async clients."""
+        self.record(response)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "reused_connections": self.requests - self.connections,
+            }
+
+
+_lock = threading.RLock()
+_clients = {}  # {client key: client}
+_client_stats = {}  # {kind: {"created": n, "reused": n}}
+_connection_stats = {}  # {(provider, API key hash): ConnectionStats}
+_openai_clients = {}  # {API key hash: openai.OpenAI}
+_unbound_async_openai_clients = {}  # {API key hash: AsyncOpenAI}, no loop
+_async_openai_clients = weakref.WeakKeyDictionary()  # {loop: {key hash: AsyncOpenAI}}
+_openai_api_keys = {}  # {id(ChatOpenAI or OpenAIEmbeddings): (client, API key)}
+_loop_clients = weakref.WeakKeyDictionary()  # {loop: {id(client): client of the loop}}
+_cohere_clients = {}  # {API key hash: cohere.Client}
+_idle_loops = []
+_preconnected = set()  # {(provider, API key hash)}
+
+
+def get_client(kind, provider, model, api_key, create, **params):
+    """Return the client of (kind, provider, model, API key, params), created by `create()` on first use.
+    Parameters:
+     - kind (str): "chat", "embeddings" or "rerank".
+     - provider, model (str) and api_key (str or SecretStr): only the hash of the API key is kept in the key.
+     - create: function creating the client.
+     - params: the other parameters of the client (e.g. temperature and top_p), hashable.
+    """
+    key = (
+        kind,
+        provider,
+        model,
+        get_api_key_hash(api_key),
+        tuple(sorted(params.items())),
+    )
+    with _lock:
+        counters = _client_stats.setdefault(kind, {"created": 0, "reused": 0})
+        if key in _clients:
+            counters["reused"] += 1
+        else:
+            _clients[key] = create()
+            counters["created"] += 1
+        return _clients[key]
+
+
+def get_connection_stats(provider, api_key):
+    """Return the ConnectionStats of the provider and API key."""
+    key = (provider, get_api_key_hash(api_key))
+    with _lock:
+        if key not in _connection_stats:
+            _connection_stats[key] = ConnectionStats()
+        return _connection_stats[key]
+
+
+def get_openai_client(api_key):
+    """Return the OpenAI client of the API key, shared by all its chat and embeddings clients (sync requests)."""
+    key_hash = get_api_key_hash(api_key)
+    with _lock:
+        if key_hash not in _openai_clients:
+            connection_stats = get_connection_stats("OpenAI", api_key)
+            _openai_clients[key_hash] = openai.OpenAI(
+                api_key=api_key,
+                http_client=httpx.Client(
+                    timeout=openai.DEFAULT_TIMEOUT,
+                    limits=HTTP_LIMITS,
+                    follow_redirects=True,
+                    event_hooks={"response": [connection_stats.record]},
+                ),
+            )
+        return _openai_clients[key_hash]
+
+
+def get_async_openai_client(api_key):
+    """Return the async OpenAI client of the API key for the running event loop (async connections cannot
+    be shared between event loops). Outside an event loop, return the client kept for that case.
+    """
+    key_hash = get_api_key_hash(api_key)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    with _lock:
+        if loop is None:
+            clients = _unbound_async_openai_clients
+        else:
+            clients = _async_openai_clients.setdefault(loop, {})
+        if key_hash not in clients:
+            connection_stats = get_connection_stats("OpenAI", api_key)
+            clients[key_hash] = openai.AsyncOpenAI(
+                api_key=api_key,
+                http_client=httpx.AsyncClient(
+                    timeout=openai.DEFAULT_TIMEOUT,
+                    limits=HTTP_LIMITS,
+                    follow_redirects=True,
+                    event_hooks={"response": [connection_stats.arecord]},
+                ),
+            )
+        return clients[key_hash]
+
+
+def create_openai_client(client_class, api_key, **kwargs):
+    """Create a ChatOpenAI or OpenAIEmbeddings client using the shared OpenAI clients of the API key."""
+    openai_client = get_openai_client(api_key)
+    async_openai_client = get_async_openai_client(api_key)
+    if client_class is ChatOpenAI:
+        sync_resource = openai_client.chat.completions
+        async_resource = async_openai_client.chat.completions
+    else:
+        sync_resource = openai_client.embeddings
+        async_resource = async_openai_client.embeddings
+    client = client_class(
+        api_key=api_key, client=sync_resource, async_client=async_resource, **kwargs
+    )
+    with _lock:
+        _openai_api_keys[id(client)] = (client, api_key)
+    return client
+
+
+def bind_to_running_loop(client):
+    """Return the client to use in the running event loop: for a client of create_openai_client,
+    a copy using the async OpenAI client of the loop (created once per loop). Other clients are returned as is.
+    """
+    with _lock:
+        registered = _openai_api_keys.get(id(client))
+    if registered is None:
+        return client
+    api_key = registered[1]
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _loop_clients.setdefault(loop, {})
+        if id(client) not in clients:
+            async_openai_client = get_async_openai_client(api_key)
+            if isinstance(client, ChatOpenAI):
+                async_resource = async_openai_client.chat.completions
+            else:
+                async_resource = async_openai_client.embeddings
+            # Shallow copy: the pydantic copy() of langchain models drops their excluded fields (callbacks...).
+            loop_client = copy.copy(client)
+            loop_client.async_client = async_resource
+            clients[id(client)] = loop_client
+        return clients[id(client)]
+
+
+def get_cohere_client(api_key):
+    """Return the Cohere client of the API key, shared by all its rerank clients."""
+    import cohere
+
+    key_hash = get_api_key_hash(api_key)
+    with _lock:
+        if key_hash not in _cohere_clients:
+            _cohere_clients[key_hash] = cohere.Client(api_key, client_name="langchain")
+        return _cohere_clients[key_hash]
+
+
+###############################################################################
+#                           Pooled event loops
+###############################################################################
+
+
+def cancel_remaining_tasks(loop):
+    """Cancel the tasks still running in the loop (e.g. unused early starts), like asyncio.run."""
+    tasks = [task for task in asyncio.all_tasks(loop) if not task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+
+
+def run_async(coroutine):
+    """Run the coroutine to completion on a pooled event loop and return its result.
+    Like asyncio.run, but the event loop (with its async clients and their connections) is kept
+    for the next call: at most MAX_IDLE_EVENT_LOOPS idle loops are kept.
+    The context variables of the caller are copied to the coroutine, as with asyncio.run.
+    """
+    with _lock:
+        loop = _idle_loops.pop() if _idle_loops else asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        try:
+            cancel_remaining_tasks(loop)
+        finally:
+            asyncio.set_event_loop(None)
+            with _lock:
+                keep_loop = len(_idle_loops) < MAX_IDLE_EVENT_LOOPS
+                if keep_loop:
+                    _idle_loops.append(loop)
+            if not keep_loop:
+                loop.close()
+
+
+###############################################################################
+#                           Pre-connection and statistics
+###############################################################################
+
+
+def open_connections(provider, api_key):
+    """Open the connections of the provider with free requests: list the OpenAI models with the sync client,
+    and with MAX_CONCURRENT_STAGES concurrent requests (the first stages of an analysis) with the async client
+    of a pooled event loop; or check the Cohere API key.
+    Google clients are managed by google.generativeai: they are not pre-connected."""
+
+    if provider == "OpenAI":
+        get_openai_client(api_key).models.list()
+
+        async def list_models():
+            async_openai_client = get_async_openai_client(api_key)
+            await asyncio.gather(
+                *[
+                    async_openai_client.models.list()
+                    for _ in range(MAX_CONCURRENT_STAGES)
+                ]
+            )
+
+        run_async(list_models())
+
+    if provider == "Cohere":
+        get_cohere_client(api_key).check_api_key()
+
+
+def preconnect(provider, api_key, cohere_api_key=None):
+    """Open the connections of the LLM provider (and of Cohere) in a background thread,
+    once per provider and API key of the process."""
+    targets = []
+    with _lock:
+        for target_provider, target_api_key in [
+            (provider, api_key),
+            ("Cohere", cohere_api_key),
+        ]:
+            key = (target_provider, get_api_key_hash(target_api_key))
+            if target_api_key and key not in _preconnected:
+                _preconnected.add(key)
+                targets.append((target_provider, target_api_key))
+    if not targets:
+        return
+
+    def open_all_connections():
+        for target_provider, target_api_key in targets:
+            try:
+                open_connections(target_provider, target_api_key)
+            except Exception as e:
+                print(f"[ERROR] Could not pre-connect to {target_provider}: {e}")
+
+    threading.Thread(
+        target=open_all_connections, name="preconnect", daemon=True
+    ).start()
+
+
+def get_client_registry_stats():
+    """Return the clients created and reused per kind, the idle event loops, and the requests and connections
+    of the HTTP clients of each provider and API key: {"provider (key hash)": stats}."""
+    with _lock:
+        clients = {kind: dict(counters) for kind, counters in _client_stats.items()}
+        idle_event_loops = len(_idle_loops)
+        connection_stats = dict(_connection_stats)
+    return {
+        "clients": clients,
+        "idle_event_loops": idle_event_loops,
+        "connections": {
+            f"{provider} ({key_hash})": stats.stats()
+            for (provider, key_hash), stats in connection_stats.items()
+        },
+    }
+
+
+def clear_client_registry():
+    """Drop all the clients and close the idle event loops (e.g. to benchmark the analyses without reuse).
+    The statistics are kept."""
+    with _lock:
+        idle_loops = list(_idle_loops)
+        _idle_loops.clear()
+        for registry in [
+            _clients,
+            _openai_clients,
+            _unbound_async_openai_clients,
+            _async_openai_clients,
+            _openai_api_keys,
+            _loop_clients,
+            _cohere_clients,
+            _preconnected,
+        ]:
+            registry.clear()
+    for loop in idle_loops:
+        loop.close()
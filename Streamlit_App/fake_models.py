@@ -0,0 +1,449 @@
+"""Fake chat model, embeddings and reranker, to run the whole pipeline offline (benchmarks and tests).
+
+They return canned responses after a random latency, and fail at a configurable rate.
+The chat model returns malformed json at a configurable rate, unless the response is requested
+with structured output (function calling or JSON mode, see structured_output.py), and answers
+['unknown'] to the list sections configured as missing from the resume (unknown_sections).
+It simulates the prompt cache of the providers: the prompt prefixes already processed are reported
+as cached tokens, and shorten the latency (prefill).
+Select them with the "Fake" provider: instantiate_LLM("Fake", ...), select_embeddings_model("Fake")
+and create_retriever(documents, "Fake", ...).
+"""
+
+import asyncio, hashlib, json, math, random, re, time
+from typing import Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Default latency (lognormal distribution: median in seconds and sigma), failure rate of the fake models,
+# rate of malformed json responses of the chat model, share of its latency spent on the prompt (prefill),
+# saved on the cached prompt prefix, and list sections answered with ['unknown'] (missing from the resume).
+# Change them with `configure_fake_models`.
+FAKE_MODELS_CONFIG = {
+    "chat": {
+        "latency_median": 0.5,
+        "latency_sigma": 0.3,
+        "failure_rate": 0.0,
+        "malformed_rate": 0.0,
+        "prefill_share": 0.3,
+        "unknown_sections": [],
+    },
+    "embeddings": {"latency_median": 0.05, "latency_sigma": 0.2, "failure_rate": 0.0},
+    "rerank": {"latency_median": 0.1, "latency_sigma": 0.2, "failure_rate": 0.0},
+}
+
+# Canned sections returned by the fake chat model to the extraction prompts (see create_prompt_template).
+FAKE_RESUME_SECTIONS = {
+    "Contact__information": {
+        "candidate__name": "Jane Doe",
+        "candidate__title": "Data Scientist",
+        "candidate__location": "Paris, France",
+        "candidate__email": "jane.doe@example.com",
+        "candidate__phone": "+33 6 00 00 00 00",
+        "candidate__social_media": ["https://github.com/janedoe"],
+        "evaluation__ContactInfo": "The contact information is complete.",
+        "score__ContactInfo": 90,
+    },
+    "CV__summary": "Data scientist with 6 years of experience in machine learning.",
+    "Work__experience": [
+        {
+            "job__title": "Senior Data Scientist",
+            "job__company": "Acme",
+            "job__start_date": "2021/01",
+            "job__end_date": "unknown",
+        },
+        {
+            "job__title": "Data Scientist",
+            "job__company": "Globex",
+            "job__start_date": "2018/06",
+            "job__end_date": "2020/12",
+        },
+        {
+            "job__title": "Data Analyst",
+            "job__company": "Initech",
+            "job__start_date": "2017/01",
+            "job__end_date": "2018/05",
+        },
+    ],
+    "CV__Projects": [
+        {
+            "project__title": "Churn prediction",
+            "project__start_date": "2022",
+            "project__end_date": "2022",
+        },
+        {
+            "project__title": "Resume scanner",
+            "project__start_date": "2023",
+            "project__end_date": "unknown",
+        },
+    ],
+    "CV__Education": [
+        {
+            "edu__college": "University of Paris",
+            "edu__degree": "MSc in Applied Mathematics",
+            "edu__start_date": "2015",
+            "edu__end_date": "2017",
+        }
+    ],
+    "Education__evaluation": {
+        "score__edu": 80,
+        "evaluation__edu": "The education section is clear.",
+    },
+    "candidate__skills": ["Python", "SQL", "Machine learning", "Communication"],
+    "Skills__evaluation": {
+        "score__skills": 75,
+        "evaluation__skills": "The skills are relevant.",
+    },
+    "CV__Languages": [
+        {"spoken__language": "English", "language__fluency": "Fluent"},
+        {"spoken__language": "French", "language__fluency": "Native"},
+    ],
+    "Languages__evaluation": {
+        "score__language": 85,
+        "evaluation__language": "The languages are well described.",
+    },
+    "CV__Certifications": [
+        {
+            "certif__title": "Cloud Practitioner",
+            "certif__organization": "AWS",
+            "certif__date": "2022",
+            "certif__expiry_date": "2025",
+            "certif__details": "unknown",
+        }
+    ],
+    "Certif__evaluation": {
+        "score__certif": 70,
+        "evaluation__certif": "The certification is relevant.",
+    },
+}
+
+
+# Characters per chunk of the streamed responses.
+STREAM_CHUNK_CHARS = 16
+
+# Simulated prompt cache, like OpenAI: once a response is done, the prefixes of its prompt are cached
+# in blocks of PROMPT_CACHE_BLOCK_CHARS characters (128 tokens), from PROMPT_CACHE_MIN_CHARS (1024 tokens).
+PROMPT_CACHE_BLOCK_CHARS = 512
+PROMPT_CACHE_MIN_CHARS = 4096
+_prompt_cache = set()
+
+# The random draws are seeded with (seed, request text). Set the seed to None for non-reproducible draws.
+_seed = 0
+
+
+class FakeModelError(RuntimeError):
+    """Simulated provider error."""
+
+
+def configure_fake_models(model_type, **config):
+    """Update the latency and failure rate of a fake model type ("chat", "embeddings" or "rerank")."""
+    FAKE_MODELS_CONFIG[model_type].update(config)
+
+
+def set_fake_models_seed(seed):
+    """Set the seed of the random latencies and failures (None: non-reproducible)."""
+    global _seed
+    _seed = seed
+
+
+def get_rng(text):
+    """Random generator seeded with (seed, text), or non-reproducible without seed."""
+    if _seed is None:
+        return random.Random()
+    seed_text = f"{_seed}:{text}"
+    return random.Random(hashlib.sha256(seed_text.encode("utf-8")).hexdigest())
+
+
+def simulate_call(model_type, text):
+    """Return the simulated latency of a call, raise FakeModelError at the configured failure rate.
+    With a seed, the same text always gets the same latency and outcome."""
+    config = FAKE_MODELS_CONFIG[model_type]
+    rng = get_rng(text)
+    latency = config["latency_median"] * math.exp(rng.gauss(0, config["latency_sigma"]))
+    if rng.random() < config["failure_rate"]:
+        raise FakeModelError(f"Simulated {model_type} failure")
+    return latency
+
+
+def clear_fake_prompt_cache():
+    """Empty the simulated prompt cache (e.g. between benchmark runs)."""
+    _prompt_cache.clear()
+
+
+def get_prompt_prefixes(prompt):
+    """Yield (length, hash) of the prefixes of the prompt, in blocks of PROMPT_CACHE_BLOCK_CHARS characters."""
+    prefix_hash = hashlib.sha256()
+    for end in range(
+        PROMPT_CACHE_BLOCK_CHARS, len(prompt) + 1, PROMPT_CACHE_BLOCK_CHARS
+    ):
+        prefix_hash.update(prompt[end - PROMPT_CACHE_BLOCK_CHARS : end].encode("utf-8"))
+        yield end, prefix_hash.copy().hexdigest()
+
+
+def get_cached_prefix_chars(prompt):
+    """Return the length of the longest prefix of the prompt in the simulated prompt cache (0 if none)."""
+    cached_chars = 0
+    for end, prefix_hash in get_prompt_prefixes(prompt):
+        if prefix_hash not in _prompt_cache:
+            break
+        cached_chars = end
+    return cached_chars if cached_chars >= PROMPT_CACHE_MIN_CHARS else 0
+
+
+def update_prompt_cache(prompt):
+    """Cache the prefixes of a processed prompt."""
+    if len(prompt) >= PROMPT_CACHE_MIN_CHARS:
+        _prompt_cache.update(
+            prefix_hash for _, prefix_hash in get_prompt_prefixes(prompt)
+        )
+
+
+def get_tools_text(kwargs):
+    """Return the text of the tools bound to a chat call (empty without tools), sent before the messages."""
+    tools = kwargs.get("tools")
+    if not tools:
+        return ""
+    return json.dumps(tools, sort_keys=True) + "\n"
+
+
+def is_malformed(text):
+    """Draw whether the json response to the text is malformed, at the configured malformed_rate."""
+    return get_rng("malformed:" + text).random() < FAKE_MODELS_CONFIG["chat"].get(
+        "malformed_rate", 0.0
+    )
+
+
+def malform_json(content):
+    """Return the json content with a trailing comma, a common defect of free-text json responses."""
+    end = content.rfind("}")
+    if end == -1:
+        return content
+    return content[:end].rstrip() + ",\n}" + content[end + 1 :]
+
+
+def get_fake_response(prompt):
+    """Return a canned, well-formed response to the prompts of resume_analyzer."""
+    # 1. Extraction prompts: "...with the following keys: (key1, key2, ...)"
+    keys = re.search(r"json dictionary with the following keys: \(([^)]*)\)", prompt)
+    if keys is not None:
+        unknown_sections = FAKE_MODELS_CONFIG["chat"].get("unknown_sections", [])
+        response = {}
+        for key in keys.group(1).split(","):
+            key = key.strip()
+            if key in unknown_sections:
+                response[key] = ["unknown"]
+            else:
+                response[key] = FAKE_RESUME_SECTIONS.get(key, "unknown")
+        return json.dumps(response, indent=4)
+
+    if "evaluation__summary, score__summary, CV__summary_enhanced" in prompt:
+        response = {
+            "evaluation__summary": "The summary is short and clear.",
+            "score__summary": 70,
+            "CV__summary_enhanced": "Data scientist with 6 years of experience.",
+        }
+    elif "Score__WorkExperience" in prompt:
+        response = {
+            "Score__WorkExperience": 65,
+            "Comments__WorkExperience": "Quantify the results.",
+            "Improvement__WorkExperience": "- Built models that reduced churn by 15%.",
+        }
+    elif "Score__project, Comments__project, Improvement__project" in prompt:
+        response = {
+            "Score__project": 60,
+            "Comments__project": "Describe the tools used.",
+            "Improvement__project": "- Built a churn model with Python and SQL.",
+        }
+    elif "resume_cv_overview, top_3_strengths, top_3_weaknesses" in prompt:
+        response = {
+            "resume_cv_overview": "A data scientist resume.",
+            "top_3_strengths": "- Experience\n- Skills\n- Education",
+            "top_3_weaknesses": "- Few results\n- Long\n- No summary",
+        }
+    elif "(__duty_id__,__duty__)" in prompt:
+        response = {
+            "1": "Built machine learning models.",
+            "2": "Deployed models to production.",
+        }
+    elif "what is listed about the following project" in prompt:
+        return "- Built a model.\n- Deployed it to production."
+    else:
+        response = {}
+
+    return json.dumps(response, indent=4)
+
+
+class FakeChatModel(BaseChatModel):
+    """Fake chat model: canned responses (see get_fake_response), simulated latency, failures and prompt cache.
+    The token usage is reported like OpenAI (about 4 characters per token)."""
+
+    model: str = "fake-chat"
+    temperature: float = 0.0
+    top_p: float = 1.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _simulate_prompt(self, messages, **kwargs):
+        """Return the prompt of the messages, its simulated latency and its cached prefix length.
+        Like OpenAI, the bound tools come before the messages in the cached prefix (see get_tools_text).
+        """
+        prompt = "\n".join(str(message.content) for message in messages)
+        latency = simulate_call("chat", prompt + str(self.temperature))
+        full_prompt = get_tools_text(kwargs) + prompt
+        cached_chars = get_cached_prefix_chars(full_prompt)
+        latency *= 1 - FAKE_MODELS_CONFIG["chat"].get("prefill_share", 0.0) * (
+            cached_chars / len(full_prompt) if full_prompt else 0.0
+        )
+        return prompt, latency, cached_chars
+
+    def _create_chat_result(self, prompt, cached_chars=0, **kwargs):
+        content = get_fake_response(prompt)
+        if kwargs.get("tools"):
+            # Function calling: the response is the arguments of the (only) tool call.
+            message = AIMessage(
+                content="",
+                additional_kwargs={
+                    "tool_calls": [
+                        {
+                            "id": "call_fake",
+                            "type": "function",
+                            "function": {
+                                "name": kwargs["tools"][0]["function"]["name"],
+                                "arguments": content,
+                            },
+                        }
+                    ]
+                },
+            )
+        else:
+            if "response_format" not in kwargs and is_malformed(prompt):
+                content = malform_json(content)
+            message = AIMessage(content=content)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={
+                "token_usage": {
+                    "prompt_tokens": len(get_tools_text(kwargs) + prompt) // 4 + 1,
+                    "completion_tokens": len(content) // 4 + 1,
+                    "prompt_tokens_details": {"cached_tokens": cached_chars // 4},
+                },
+                "model_name": self.model,
+            },
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt, latency, cached_chars = self._simulate_prompt(messages, **kwargs)
+        time.sleep(latency)
+        update_prompt_cache(get_tools_text(kwargs) + prompt)
+        return self._create_chat_result(prompt, cached_chars, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt, latency, cached_chars = self._simulate_prompt(messages, **kwargs)
+        await asyncio.sleep(latency)
+        update_prompt_cache(get_tools_text(kwargs) + prompt)
+        return self._create_chat_result(prompt, cached_chars, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        """Stream the response in chunks of STREAM_CHUNK_CHARS characters, spread over the simulated latency.
+        Tool calls are streamed like OpenAI: the arguments come in deltas of the tool call.
+        """
+        prompt, latency, cached_chars = self._simulate_prompt(messages, **kwargs)
+        message = (
+            self._create_chat_result(prompt, cached_chars, **kwargs)
+            .generations[0]
+            .message
+        )
+        tool_calls = message.additional_kwargs.get("tool_calls")
+        text = tool_calls[0]["function"]["arguments"] if tool_calls else message.content
+        pieces = [
+            text[i : i + STREAM_CHUNK_CHARS]
+            for i in range(0, len(text), STREAM_CHUNK_CHARS)
+        ] or [""]
+        start = time.perf_counter()
+        for i, piece in enumerate(pieces):
+            # Sleep until the deadline of the chunk: the total latency does not drift with the number of chunks.
+            deadline = start + latency * (i + 1) / len(pieces)
+            await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+            if tool_calls:
+                delta = {"index": 0, "function": {"arguments": piece}}
+                if i == 0:
+                    delta.update(id=tool_calls[0]["id"], type="function")
+                    delta["function"]["name"] = tool_calls[0]["function"]["name"]
+                chunk = AIMessageChunk(
+                    content="", additional_kwargs={"tool_calls": [delta]}
+                )
+            else:
+                chunk = AIMessageChunk(content=piece)
+            yield ChatGenerationChunk(message=chunk)
+        update_prompt_cache(get_tools_text(kwargs) + prompt)
+
+
+class FakeEmbeddings(Embeddings):
+    """Fake embeddings: hashed bag of words, normalized (similar texts get similar vectors)."""
+
+    def __init__(self, model="fake-embeddings", size=256):
+        self.model = model
+        self.size = size
+
+    def _embed(self, text):
+        vector = [0.0] * self.size
+        for word in re.findall(r"\w+", text.lower()):
+            index = int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16)
+            vector[index % self.size] += 1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def embed_documents(self, texts):
+        time.sleep(simulate_call("embeddings", "".join(texts)))
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        time.sleep(simulate_call("embeddings", text))
+        return self._embed(text)
+
+    async def aembed_documents(self, texts):
+        await asyncio.sleep(simulate_call("embeddings", "".join(texts)))
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(simulate_call("embeddings", text))
+        return self._embed(text)
+
+
+class FakeReranker(BaseDocumentCompressor):
+    """Fake reranker: keeps the top_n documents sharing the most words with the query,
+    and adds their `relevance_score` (share of the query words found) to their metadata, like CohereRerank.
+    """
+
+    top_n: int = 3
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        time.sleep(simulate_call("rerank", query))
+        query_words = set(re.findall(r"\w+", query.lower()))
+        scored_documents = []
+        for document in documents:
+            document_words = set(re.findall(r"\w+", document.page_content.lower()))
+            score = len(query_words & document_words) / max(1, len(query_words))
+            scored_documents.append((score, document))
+        scored_documents.sort(key=lambda scored_document: -scored_document[0])
+
+        compressed_documents = []
+        for score, document in scored_documents[: self.top_n]:
+            document = Document(
+                page_content=document.page_content,
+                metadata=dict(document.metadata, relevance_score=score),
+            )
+            compressed_documents.append(document)
+        return compressed_documents
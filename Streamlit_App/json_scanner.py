@@ -0,0 +1,357 @@
+"""Tolerant single-pass JSON scanner for the LLM responses.
+
+The json value is read in one left-to-right pass (no backtracking, no recursion), skipping the text
+around it (markdown code fences, comments of the model) and repairing the usual defects of free-text
+json responses:
+ - trailing and missing commas,
+ - unescaped newlines and quotes inside strings, invalid escape sequences,
+ - single-quoted strings, unquoted keys and values, Python literals (True, False, None),
+ - missing colons, unterminated strings and missing closing braces or brackets (truncated responses).
+Valid json takes the fast path: json.loads.
+JSONStreamScanner scans a streamed response chunk by chunk and emits each field as soon as it is complete.
+"""
+
+import json, re
+
+# End of a double- or single-quoted string chunk: the quote or a backslash.
+STRING_END = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Unquoted key (until the colon) or value (until the next delimiter or the end of the line).
+BARE_KEY = re.compile(r"[^:,{}\[\]\n]*")
+BARE_VALUE = re.compile(r"[^,{}\[\]\n]*")
+NUMBER = re.compile(r"-?(0|[1-9]\d*)(\.\d+)?([eE][+-]?\d+)?$")
+LITERALS = {
+    "true": True,
+    "false": False,
+    "null": None,
+    "True": True,
+    "False": False,
+    "None": None,
+}
+ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "'": "'",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+HEX4 = re.compile(r"[0-9a-fA-F]{4}")
+CLOSING = {"{": "}", "[": "]"}
+
+
+class JSONScanError(ValueError):
+    """The text does not contain any json object or array."""
+
+
+def find_json_start(text, root=None):
+    """Index of the first '{' or '[' of the text, or -1.
+    root: '{' or '[' to only start at the expected root container (e.g. skip a bracket in the text
+    before a json object), None for either."""
+    if root is not None:
+        return text.find(root)
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    return min(starts, default=-1)
+
+
+def convert_bare_value(token):
+    """Convert an unquoted value: json and Python literals, numbers, or text."""
+    if token in LITERALS:
+        return LITERALS[token]
+    if NUMBER.match(token):
+        return float(token) if any(c in token for c in ".eE") else int(token)
+    return token
+
+
+def scan_string(text, pos, quote, repairs):
+    """Read the string starting after the quote at text[pos - 1].
+    A quote only ends the string if it is followed by a delimiter (',', ':', '}', ']'), the end of the text,
+    or a new line (missing comma); otherwise it is an unescaped quote of the value.
+    Return (string, position after the closing quote)."""
+    n = len(text)
+    chunks = []
+    string_end = STRING_END[quote]
+    while True:
+        match = string_end.search(text, pos)
+        if match is None:  # unterminated string
+            chunks.append(text[pos:])
+            repairs.add("unterminated string")
+            return "".join(chunks), n
+        index = match.start()
+        chunks.append(text[pos:index])
+        if text[index] == "\\":
+            escape = text[index + 1 : index + 2]
+            if escape in ESCAPES:
+                chunks.append(ESCAPES[escape])
+                pos = index + 2
+            elif escape == "u" and HEX4.match(text, index + 2):
+                chunks.append(chr(int(text[index + 2 : index + 6], 16)))
+                pos = index + 6
+            else:  # invalid escape: keep the backslash
+                chunks.append("\\")
+                pos = index + 1
+                repairs.add("invalid escape")
+            continue
+        # Quote: end of the string, or unescaped quote inside the value?
+        after = WHITESPACE.match(text, index + 1).end()
+        if after >= n or text[after] in ",:}]" or "\n" in text[index + 1 : after]:
+            return "".join(chunks), index + 1
+        chunks.append(quote)
+        pos = index + 1
+        repairs.add("unescaped quote")
+
+
+def check_following(text, pos, repairs):
+    """A comma or a closing bracket must follow a value ending at pos: otherwise a comma is missing."""
+    following = WHITESPACE.match(text, pos).end()
+    if following < len(text) and text[following] not in ",}]`":
+        repairs.add("missing comma")
+
+
+def scan_json(text, root=None):
+    """Scan the first json object or array of the text.
+    root: '{' to scan the first json object, '[' the first array, None the first of either.
+    Output:
+     - value: the parsed object or array (what could be recovered, for a truncated response).
+     - repairs (set): the defects repaired (empty for valid json).
+    Raise a JSONScanError if the text contains no '{' or '[' (or not the expected root).
+    """
+    start = find_json_start(text, root)
+    if start == -1:
+        raise JSONScanError("No json object found in the response.")
+
+    # Fast path: valid json (possibly surrounded by text or code fences).
+    end = text.rfind(CLOSING[text[start]])
+    if end > start:
+        try:
+            return json.loads(text[start : end + 1], strict=False), set()
+        except ValueError:
+            pass
+
+    repairs = set()
+    n = len(text)
+    pos = start
+    root = {} if text[start] == "{" else []
+    # Open containers: [container, pending key (dicts only)]
+    stack = [[root, None]]
+    pos += 1
+
+    while stack:
+        pos = WHITESPACE.match(text, pos).end()
+        if pos >= n or text[pos] == "`":  # truncated response, or closing code fence
+            repairs.add("missing closing brace")
+            if stack[-1][1] is not None:
+                stack[-1][0][stack[-1][1]] = None
+                repairs.add("missing value")
+            break
+
+        char = text[pos]
+        container, key = top = stack[-1]
+
+        if char == ",":
+            pos += 1
+            following = WHITESPACE.match(text, pos).end()
+            if following < n and text[following] in "}]":
+                repairs.add("trailing comma")
+            continue
+
+        if char in "}]":
+            pos += 1
+            if char != ("}" if isinstance(container, dict) else "]"):
+                repairs.add("mismatched bracket")
+            if key is not None:  # "key": }
+                container[key] = None
+                repairs.add("missing value")
+            stack.pop()
+            # The closed container is a value: a comma or a closing bracket must follow it.
+            if stack:
+                check_following(text, pos, repairs)
+            continue
+
+        if isinstance(container, dict) and key is None:
+            # Key
+            if char in "\"'":
+                key, pos = scan_string(text, pos + 1, char, repairs)
+                if char == "'":
+                    repairs.add("single quotes")
+            else:
+                match = BARE_KEY.match(text, pos)
+                key, pos = match.group().strip(), match.end()
+                if not key:  # stray colon
+                    pos += 1
+                    repairs.add("unexpected character")
+                    continue
+                repairs.add("unquoted key")
+            pos = WHITESPACE.match(text, pos).end()
+            if pos < n and text[pos] == ":":
+                pos += 1
+            else:
+                repairs.add("missing colon")
+            top[1] = key
+            continue
+
+        # Value
+        if char in "{[":
+            value = {} if char == "{" else []
+            pos += 1
+        elif char in "\"'":
+            value, pos = scan_string(text, pos + 1, char, repairs)
+            if char == "'":
+                repairs.add("single quotes")
+        elif char == ":":  # stray colon
+            pos += 1
+            repairs.add("unexpected character")
+            continue
+        else:
+            match = BARE_VALUE.match(text, pos)
+            token, pos = match.group().strip(), match.end()
+            value = convert_bare_value(token)
+            if token in ("True", "False", "None"):
+                repairs.add("python literal")
+            elif token not in LITERALS and not NUMBER.match(token):
+                repairs.add("unquoted value")
+
+        # Attach the value to its container
+        if isinstance(container, dict):
+            container[key] = value
+            top[1] = None
+        else:
+            container.append(value)
+        if char in "{[":
+            stack.append([value, None])
+            continue
+
+        check_following(text, pos, repairs)
+
+    return root, repairs
+
+
+def loads(text, root=None):
+    """Return the first json object or array of the text, repaired if needed (see scan_json)."""
+    return scan_json(text, root)[0]
+
+
+# Structural characters of the json value, outside the strings.
+STRUCTURE = re.compile(r"""[{}\[\],"']""")
+
+
+class JSONStreamScanner:
+    """Incremental scanner of a streamed json response: feed the chunks of the response as they arrive,
+    and get each field as soon as it is complete:
+     - the members of the root object: path (key,),
+     - the items of the arrays of the root object, before their array is complete: path (key, index),
+     - the items of a root array: path (index,).
+    Each field is parsed with scan_json (malformed json is repaired). The fields are emitted on a best-effort
+    basis: the whole response is still parsed and validated at the end (see structured_output.parse_response).
+    root: the expected root container ('{' or '['), None for either (see find_json_start).
+    """
+
+    def __init__(self, root=None):
+        self.root = root
+        self.text = ""
+        self.pos = 0  # next character to scan
+        self.stack = []  # open containers: "{" or "["
+        self.quote = None  # quote of the current string, if any
+        self.member_start = None  # start of the current member of the root container
+        self.member_index = 0
+        self.array_key = None  # key of the array of the root object being scanned
+        self.item_start = None  # start of the current item of this array
+        self.item_index = 0
+        self.done = False
+
+    def feed(self, chunk):
+        """Scan the next chunk of the response. Return the completed fields: [(path, value)]."""
+        self.text += chunk
+        text, n = self.text, len(self.text)
+        fields = []
+        while self.pos < n and not self.done:
+            if not self.stack:  # skip the text before the json value
+                start = find_json_start(text[self.pos :], self.root)
+                if start == -1:
+                    self.pos = n
+                    break
+                self.pos += start + 1
+                self.stack.append(text[self.pos - 1])
+                self.member_start = self.pos
+                continue
+
+            if self.quote is not None:
+                match = STRING_END[self.quote].search(text, self.pos)
+                if match is None:
+                    self.pos = n
+                elif text[match.start()] == "\\":
+                    self.pos = (
+                        match.start() + 2
+                    )  # may be past the end: the escaped character is in the next chunk
+                else:
+                    self.quote = None
+                    self.pos = match.start() + 1
+                continue
+
+            match = STRUCTURE.search(text, self.pos)
+            if match is None:
+                self.pos = n
+                break
+            char, index = match.group(), match.start()
+            self.pos = index + 1
+            depth = len(self.stack)
+            if char in "\"'":
+                self.quote = char
+            elif char in "{[":
+                self.stack.append(char)
+                if depth == 1 and char == "[" and self.stack[0] == "{":
+                    self.array_key = self.get_key(text[self.member_start : index])
+                    self.item_start = self.pos
+                    self.item_index = 0
+            elif char == ",":
+                if depth == 1:
+                    fields += self.emit_member(text[self.member_start : index])
+                    self.member_start = self.pos
+                elif depth == 2 and self.item_start is not None:
+                    fields += self.emit_item(text[self.item_start : index])
+                    self.item_start = self.pos
+            else:  # closing bracket
+                if depth == 2 and self.item_start is not None:
+                    fields += self.emit_item(text[self.item_start : index])
+                    self.item_start = None
+                if depth == 1:
+                    fields += self.emit_member(text[self.member_start : index])
+                    self.done = True
+                self.stack.pop()
+        return fields
+
+    @staticmethod
+    def get_key(member):
+        """Key of a member of the root object, from its text before the value."""
+        try:
+            return next(iter(scan_json("{" + member + "null}")[0]), None)
+        except JSONScanError:
+            return None
+
+    def emit_member(self, member):
+        """Parse a complete member of the root container."""
+        if not member.strip():
+            return []
+        try:
+            if self.stack[0] == "{":
+                value = scan_json("{" + member + "}")[0]
+                return list(((key,), value[key]) for key in value)
+            fields = [((self.member_index,), scan_json("[" + member + "]")[0][0])]
+            self.member_index += 1
+            return fields
+        except (JSONScanError, IndexError):
+            return []
+
+    def emit_item(self, item):
+        """Parse a complete item of an array of the root object."""
+        if not item.strip() or self.array_key is None:
+            return []
+        try:
+            value = scan_json("[" + item + "]")[0][0]
+        except (JSONScanError, IndexError):
+            return []
+        self.item_index += 1
+        return [((self.array_key, self.item_index - 1), value)]
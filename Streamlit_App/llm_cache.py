@@ -0,0 +1,153 @@
+import hashlib, json, sqlite3, threading, time
+
+from app_constants import (
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_SIZE_MB,
+    LLM_CACHE_TTL_SECONDS,
+)
+
+
+class LLMCache:
+    """Persistent cache of LLM responses, stored in a local SQLite database.
+    Entries are keyed by (provider, model, temperature, top_p, prompt hash[, response schema]).
+    Expired entries (older than `ttl_seconds`) are ignored and deleted; when the cache exceeds `max_size_mb`,
+    the least recently used entries are evicted.
+    Deterministic calls (temperature = 0) are cached; creative calls only if `cache_creative` is True.
+    Responses with a schema are cached only if they match it (see call_LLM), so a malformed response
+    is never served again.
+    Set `enabled` to False to bypass the cache (e.g. for benchmarks).
+    """
+
+    def __init__(
+        self,
+        db_path=LLM_CACHE_PATH,
+        max_size_mb=LLM_CACHE_MAX_SIZE_MB,
+        ttl_seconds=LLM_CACHE_TTL_SECONDS,
+        cache_creative=False,
+        enabled=True,
+    ):
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_seconds
+        self.cache_creative = cache_creative
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        self._connection.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )"""
+        )
+        self._connection.commit()
+
+    def is_cacheable(self, llm_params):
+        """Caching policy: always cache deterministic calls, cache creative calls only when opted in."""
+        return self.enabled and (llm_params["temperature"] == 0 or self.cache_creative)
+
+    @staticmethod
+    def make_key(llm_params, prompt):
+        """Create the cache key from the LLM parameters and the hash of the prompt."""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        key_params = [
+            llm_params["provider"],
+            llm_params["model"],
+            llm_params["temperature"],
+            llm_params["top_p"],
+            prompt_hash,
+        ]
+        # Structured output responses (see call_LLM) are cached separately.
+        if llm_params.get("response_schema") is not None:
+            key_params.append(llm_params["response_schema"])
+        key = json.dumps(key_params)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def lookup(self, key, is_valid=None):
+        """Return the cached response content, or None if not found (or expired).
+        is_valid: if not None, function of the content; invalid contents are deleted and not returned
+        (e.g. responses cached before they were validated against their schema)."""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (
+                now - row[1] > self.ttl_seconds
+                or (is_valid is not None and not is_valid(row[0]))
+            ):
+                self._connection.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                self._connection.commit()
+                return None
+
+            self.hits += 1
+            self._connection.execute(
+                "UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self._connection.commit()
+            return row[0]
+
+    def update(self, key, content):
+        """Store the response content, then evict expired and least recently used entries."""
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                (key, content, len(content.encode("utf-8")), now, now),
+            )
+            self._evict(now)
+            self._connection.commit()
+
+    def _evict(self, now):
+        # 1. TTL
+        self._connection.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        # 2. Size: keep the most recently used entries that fit in max_size_bytes.
+        self._connection.execute(
+            """DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_access DESC) AS total_size
+                    FROM llm_cache
+                ) WHERE total_size > ?
+            )""",
+            (self.max_size_bytes,),
+        )
+
+    def stats(self):
+        """Return the hit/miss counters and the number and size of stored entries."""
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+    def clear(self):
+        """Delete all the cached responses."""
+        with self._lock:
+            self._connection.execute("DELETE FROM llm_cache")
+            self._connection.commit()
+
+
+_llm_cache = None
+
+
+def get_llm_cache():
+    """Return the process-wide LLM cache (created on first use)."""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMCache()
+    return _llm_cache
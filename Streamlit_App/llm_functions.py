@@ -1,4 +1,5 @@
 import streamlit as st
+import functools
 
 # LLM: openai
 from langchain_openai import ChatOpenAI
@@ -6,6 +7,29 @@ from langchain_openai import ChatOpenAI
 # LLM: google_genai
 from langchain_google_genai import ChatGoogleGenerativeAI
 
+from langchain_core.messages import AIMessage
+
+# Fake LLM: offline benchmarks and tests
+from fake_models import FakeChatModel
+
+from app_constants import STRUCTURED_OUTPUT
+from llm_cache import get_llm_cache
+from rate_limiter import get_rate_limiter, estimate_tokens
+from token_accounting import UsageCallbackHandler, record_LLM_call
+from tracing import span
+from structured_output import (
+    is_structured_output_enabled,
+    get_schema_name,
+    bind_schema,
+    get_structured_response,
+    get_streamed_text,
+    get_json_root,
+    is_valid_response,
+)
+from json_scanner import JSONStreamScanner
+from prompt_templates import has_resume_prefix
+from client_registry import get_client, create_openai_client, bind_to_running_loop
+
 # dotenv and os
 from dotenv import load_dotenv, find_dotenv
 import os
@@ -35,34 +59,208 @@ def get_api_keys_from_local_env():
 
 
 def instantiate_LLM(
-    LLM_provider, api_key, temperature=0.5, top_p=0.95, model_name=None
+    LLM_provider,
+    api_key,
+    temperature=0.5,
+    top_p=0.95,
+    model_name=None,
+    structured_output=STRUCTURED_OUTPUT,
 ):
     """Instantiate LLM in Langchain.
+    The client is created once per process for the same parameters and reused (see client_registry.py).
     Parameters:
-        LLM_provider (str): the LLM provider; in ["OpenAI","Google"]
+        LLM_provider (str): the LLM provider; in ["OpenAI","Google","Fake"]
         model_name (str): in ["gpt-3.5-turbo", "gpt-3.5-turbo-0125", "gpt-4-turbo-preview","gemini-pro"].
         api_key (str): google_api_key or openai_api_key
         temperature (float): Range: 0.0 - 1.0; default = 0.5
         top_p (float): : Range: 0.0 - 1.0; default = 1.
+        structured_output (bool): request the json responses with the response schema
+            (function calling or JSON mode, see structured_output.py), when the provider supports it.
+    """
+    metadata = {"structured_output": structured_output}
+
+    def create_LLM():
+        if LLM_provider == "OpenAI":
+            llm = create_openai_client(
+                ChatOpenAI,
+                api_key,
+                model=model_name,
+                temperature=temperature,
+                model_kwargs={"top_p": top_p},
+                metadata=metadata,
+            )
+        if LLM_provider == "Google":
+            llm = ChatGoogleGenerativeAI(
+                google_api_key=api_key,
+                # model="gemini-pro",
+                model=model_name,
+                temperature=temperature,
+                top_p=top_p,
+                convert_system_message_to_human=True,
+                metadata=metadata,
+            )
+        if LLM_provider == "Fake":
+            llm = FakeChatModel(
+                model=model_name or "fake-chat",
+                temperature=temperature,
+                top_p=top_p,
+                metadata=metadata,
+            )
+        return llm
+
+    return get_client(
+        "chat",
+        LLM_provider,
+        model_name,
+        api_key,
+        create_LLM,
+        temperature=temperature,
+        top_p=top_p,
+        structured_output=structured_output,
+    )
+
+
+def get_LLM_provider(llm):
+    """Return the provider of a Langchain chat model: "OpenAI", "Google" or the class name."""
+    if isinstance(llm, ChatOpenAI):
+        return "OpenAI"
+    if isinstance(llm, ChatGoogleGenerativeAI):
+        return "Google"
+    if isinstance(llm, FakeChatModel):
+        return "Fake"
+    return type(llm).__name__
+
+
+def get_LLM_params(llm):
+    """Return the provider, model name, temperature and top_p of a Langchain chat model."""
+    if isinstance(llm, ChatOpenAI):
+        return {
+            "provider": "OpenAI",
+            "model": llm.model_name,
+            "temperature": llm.temperature,
+            "top_p": llm.model_kwargs.get("top_p"),
+        }
+    return {
+        "provider": get_LLM_provider(llm),
+        "model": getattr(llm, "model", None),
+        "temperature": getattr(llm, "temperature", None),
+        "top_p": getattr(llm, "top_p", None),
+    }
+
+
+def get_LLM_api_key(llm):
+    """Return the API key of a Langchain chat model (str, SecretStr or None)."""
+    if isinstance(llm, ChatOpenAI):
+        return llm.openai_api_key
+    if isinstance(llm, ChatGoogleGenerativeAI):
+        return llm.google_api_key
+    return None
+
+
+async def stream_LLM(runnable, prompt, config, on_field, root=None):
+    """Stream the LLM response: on_field(path, value) is called for each field of the json response
+    as soon as it is complete (see json_scanner.JSONStreamScanner, root: the expected root container).
+    Return the response message, with the streamed text (content or tool call arguments) as content.
+    """
+    scanner = JSONStreamScanner(root)
+    async for chunk in runnable.astream(prompt, config=config):
+        for path, value in scanner.feed(get_streamed_text(chunk)):
+            on_field(path, value)
+    return AIMessage(content=scanner.text)
+
+
+def emit_fields(response_content, on_field, root=None):
+    """Call on_field(path, value) for each field of a complete json response (e.g. a cached response)."""
+    for path, value in JSONStreamScanner(root).feed(response_content):
+        on_field(path, value)
+
+
+async def call_LLM(llm, prompt, schema=None, on_field=None):
+    """Invoke the LLM asynchronously, using the LLM response cache and the provider rate limit.
+    If the same prompt was already sent to the same model (with the same temperature and top_p),
+    the cached response is returned without calling the provider. With a schema, only the valid json
+    responses matching it are cached (see structured_output.is_valid_response).
+    The prompt and completion tokens (and the prompt tokens read from the prompt cache of the provider)
+    are recorded (see token_accounting) and the call is traced (see tracing).
+    If schema is not None and the LLM has structured output enabled, the response is requested with
+    the schema (see structured_output.bind_schema); the content of the returned message is the json response.
+    The prompts starting with the resume ("resume_first" layout) use JSON mode, so that they share
+    their prefix in the provider prompt cache.
+    If on_field is not None, the response is streamed: on_field(path, value) is called for each field
+    of the json response as soon as it is complete (see stream_LLM).
+    The OpenAI clients use the async connections of the running event loop (see client_registry.py).
     """
-    if LLM_provider == "OpenAI":
-        llm = ChatOpenAI(
-            api_key=api_key,
-            model=model_name,
-            temperature=temperature,
-            model_kwargs={"top_p": top_p},
+
+    llm = bind_to_running_loop(llm)
+    cache = get_llm_cache()
+    llm_params = get_LLM_params(llm)
+    cacheable = cache.is_cacheable(llm_params)
+    # Responses with a schema are cached (and served from the cache) only if they are valid.
+    is_valid = None
+    if schema is not None:
+        is_valid = functools.partial(is_valid_response, schema=schema)
+    runnable = llm
+    if schema is not None and is_structured_output_enabled(llm):
+        runnable = bind_schema(
+            llm, llm_params["provider"], schema, json_mode=has_resume_prefix(prompt)
         )
-    if LLM_provider == "Google":
-        llm = ChatGoogleGenerativeAI(
-            google_api_key=api_key,
-            # model="gemini-pro",
-            model=model_name,
-            temperature=temperature,
-            top_p=top_p,
-            convert_system_message_to_human=True,
+        if runnable is not llm:
+            llm_params["response_schema"] = get_schema_name(schema)
+
+    with span("llm_call", "llm", **llm_params) as attributes:
+        if cacheable:
+            key = cache.make_key(llm_params, prompt)
+            cached_content = cache.lookup(key, is_valid)
+            attributes["cache_hit"] = cached_content is not None
+            if cached_content is not None:
+                prompt_tokens, completion_tokens, _ = record_LLM_call(
+                    llm_params["provider"],
+                    llm_params["model"],
+                    prompt,
+                    cached_content,
+                    cached=True,
+                )
+                attributes.update(
+                    prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+                )
+                if on_field is not None:
+                    emit_fields(cached_content, on_field, get_json_root(schema))
+                return AIMessage(content=cached_content)
+
+        # Wait for the rate limit of the provider and API key, if any.
+        rate_limiter = get_rate_limiter(llm_params["provider"], get_LLM_api_key(llm))
+        if rate_limiter is not None:
+            attributes["rate_limit_wait_s"] = await rate_limiter.aacquire(
+                tokens=estimate_tokens(prompt)
+            )
+
+        usage_handler = UsageCallbackHandler()
+        config = {"callbacks": [usage_handler]}
+        if on_field is None:
+            response = await runnable.ainvoke(prompt, config=config)
+        else:
+            response = await stream_LLM(
+                runnable, prompt, config, on_field, get_json_root(schema)
+            )
+        response = get_structured_response(response)
+        prompt_tokens, completion_tokens, cached_prompt_tokens = record_LLM_call(
+            llm_params["provider"],
+            llm_params["model"],
+            prompt,
+            response.content,
+            usage=usage_handler.usage,
         )
+        attributes.update(
+            prompt_tokens=prompt_tokens,
+            cached_prompt_tokens=cached_prompt_tokens,
+            completion_tokens=completion_tokens,
+            provider_usage=usage_handler.usage is not None,
+            streamed=on_field is not None,
+        )
+        if cacheable and (is_valid is None or is_valid(response.content)):
+            cache.update(key, response.content)
 
-    return llm
+    return response
 
 
 def instantiate_LLM_main(temperature, top_p):
@@ -75,6 +273,7 @@ def instantiate_LLM_main(temperature, top_p):
                 temperature=temperature,
                 top_p=top_p,
                 model_name=st.session_state.selected_model,
+                structured_output=st.session_state.structured_output,
             )
         else:
             llm = instantiate_LLM(
@@ -83,6 +282,7 @@ def instantiate_LLM_main(temperature, top_p):
                 temperature=temperature,
                 top_p=top_p,
                 model_name=st.session_state.selected_model,
+                structured_output=st.session_state.structured_output,
             )
     except Exception as e:
         st.error(f"An error occured: {e}")
@@ -0,0 +1,129 @@
+"""Local hybrid reranker: BM25 over the resume chunks combined with the dense similarity of the vector store.
+
+It replaces the Cohere rerank round trip of each retrieval query (dozens per resume) with a few
+microseconds of local computation, and needs no Cohere API key.
+The dense scores are read from the `dense_score` metadata added by the ScoredVectorStoreRetriever
+(see retrieval.py); without them, the documents are ranked by BM25 only.
+"""
+
+import math, re
+from collections import Counter
+from typing import Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+
+
+def tokenize(text):
+    """Lowercase words of the text (unicode letters and digits, for all the assistant languages)."""
+    return re.findall(r"\w+", text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 statistics of a corpus of texts (the chunks of a resume)."""
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = {}  # {text: Counter of its words}
+        document_frequencies = Counter()
+        total_length = 0
+        for text in texts:
+            words = tokenize(text)
+            self.term_frequencies[text] = Counter(words)
+            document_frequencies.update(set(words))
+            total_length += len(words)
+        self.n_documents = len(self.term_frequencies)
+        self.average_length = total_length / max(1, self.n_documents)
+        # Non-negative idf (Lucene variant): words found in every chunk still count a little.
+        self.idf = {
+            word: math.log(1 + (self.n_documents - frequency + 0.5) / (frequency + 0.5))
+            for word, frequency in document_frequencies.items()
+        }
+
+    def get_score(self, query_words, text):
+        """BM25 score of a text for the query words. Texts missing from the corpus are tokenized on the fly."""
+        term_frequencies = self.term_frequencies.get(text)
+        if term_frequencies is None:
+            term_frequencies = Counter(tokenize(text))
+        length = sum(term_frequencies.values())
+        length_norm = self.k1 * (
+            1 - self.b + self.b * length / max(1.0, self.average_length)
+        )
+        score = 0.0
+        for word in query_words:
+            frequency = term_frequencies.get(word, 0)
+            if frequency:
+                score += (
+                    self.idf.get(word, 0.0)
+                    * frequency
+                    * (self.k1 + 1)
+                    / (frequency + length_norm)
+                )
+        return score
+
+
+class HybridReranker(BaseDocumentCompressor):
+    """Document compressor reranking the retrieved documents with a weighted sum of:
+     - their BM25 score, divided by the best BM25 score of the retrieved documents (in [0, 1]),
+     - their dense relevance score (`dense_score` metadata, in [0, 1]).
+    Keeps the top_n documents and adds their `relevance_score` (in [0, 1]) to their metadata, like CohereRerank.
+    """
+
+    bm25_index: BM25Index
+    top_n: int = 3
+    dense_weight: float = 0.5
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    @classmethod
+    def from_documents(cls, documents, **kwargs):
+        """Create the reranker with the BM25 statistics of the documents (all the chunks of the resume)."""
+        return cls(
+            bm25_index=BM25Index([document.page_content for document in documents]),
+            **kwargs,
+        )
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        query_words = tokenize(query)
+        bm25_scores = [
+            self.bm25_index.get_score(query_words, document.page_content)
+            for document in documents
+        ]
+        max_bm25_score = max(bm25_scores, default=0.0) or 1.0
+
+        scored_documents = []
+        for bm25_score, document in zip(bm25_scores, documents):
+            score = bm25_score / max_bm25_score
+            dense_score = document.metadata.get("dense_score")
+            if dense_score is not None:
+                score = (
+                    self.dense_weight * min(1.0, max(0.0, dense_score))
+                    + (1 - self.dense_weight) * score
+                )
+            scored_documents.append((score, document))
+        scored_documents.sort(key=lambda scored_document: -scored_document[0])
+
+        compressed_documents = []
+        for score, document in scored_documents[: self.top_n]:
+            document = Document(
+                page_content=document.page_content,
+                metadata=dict(document.metadata, relevance_score=score),
+            )
+            compressed_documents.append(document)
+        return compressed_documents
+
+    async def acompress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        # Pure CPU work of a few microseconds: no executor thread.
+        return self.compress_documents(documents, query, callbacks)
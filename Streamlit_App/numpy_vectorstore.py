@@ -0,0 +1,217 @@
+"""In-memory vector store with brute-force NumPy search, for the small corpora of a single resume.
+
+A resume is split into a handful of chunks: building a FAISS index for each upload costs more than
+computing the cosine similarities of the query with every chunk. The chunk embeddings are normalized
+and stored in one contiguous float32 matrix; a search is a single matrix-vector product.
+"""
+
+import uuid
+from typing import Any, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+
+def normalize(vectors):
+    """Return the float32 vectors (rows) scaled to unit norm (zero vectors are left unchanged)."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class NumpyVectorStore(VectorStore):
+    """Langchain vector store keeping the normalized embeddings in a contiguous float32 matrix.
+    The scores are cosine similarities (higher is more similar)."""
+
+    def __init__(self, embedding: Embeddings):
+        self.embedding = embedding
+        self.documents = []
+        self.ids = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """Add the texts and their embeddings. Return the ids of the added texts."""
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        if not texts:
+            return []
+        vectors = normalize(embeddings)
+        if len(self.documents) == 0:
+            self.matrix = np.ascontiguousarray(vectors)
+        else:
+            self.matrix = np.ascontiguousarray(np.vstack([self.matrix, vectors]))
+        self.documents += [
+            Document(page_content=text, metadata=dict(metadata))
+            for text, metadata in zip(texts, metadatas)
+        ]
+        self.ids += ids
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(
+            texts, self.embedding.embed_documents(texts), metadatas, ids
+        )
+
+    async def aadd_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        return self.add_embeddings(
+            texts, await self.embedding.aembed_documents(texts), metadatas, ids
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        vector_store = cls(embedding)
+        vector_store.add_texts(texts, metadatas, ids)
+        return vector_store
+
+    @classmethod
+    async def afrom_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        vector_store = cls(embedding)
+        await vector_store.aadd_texts(texts, metadatas, ids)
+        return vector_store
+
+    def get_scores(self, embedding):
+        """Cosine similarities of the query embedding with all the chunks."""
+        if len(self.documents) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return self.matrix @ normalize(embedding)
+
+    def get_top_k(self, scores, k):
+        """Indices of the k highest scores, sorted by decreasing score."""
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=int)
+        indices = np.argpartition(-scores, k - 1)[:k]
+        return indices[np.argsort(-scores[indices], kind="stable")]
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        scores = self.get_scores(embedding)
+        return [
+            (self.documents[i], float(scores[i])) for i in self.get_top_k(scores, k)
+        ]
+
+    def similarity_search_with_score_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Search several query embeddings at once (a single matrix product).
+        Return the (document, score) list of each query."""
+        if len(self.documents) == 0:
+            return [[] for _ in embeddings]
+        scores = normalize(embeddings) @ self.matrix.T
+        return [
+            [
+                (self.documents[i], float(query_scores[i]))
+                for i in self.get_top_k(query_scores, k)
+            ]
+            for query_scores in scores
+        ]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score_by_vector(embedding, k)
+        ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embedding.embed_query(query), k
+        )
+
+    def similarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding.embed_query(query), k)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            await self.embedding.aembed_query(query), k
+        )
+
+    async def asimilarity_search(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Document]:
+        return self.similarity_search_by_vector(
+            await self.embedding.aembed_query(query), k
+        )
+
+    def _select_relevance_score_fn(self):
+        # Cosine similarity in [-1, 1] -> relevance score in [0, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        scores = self.get_scores(embedding)
+        candidates = self.get_top_k(scores, fetch_k)
+        selected = maximal_marginal_relevance(
+            normalize(embedding),
+            self.matrix[candidates],
+            lambda_mult=lambda_mult,
+            k=k,
+        )
+        return [self.documents[candidates[i]] for i in selected]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding.embed_query(query), k, fetch_k, lambda_mult
+        )
+
+    def memory_usage(self):
+        """Memory used by the embeddings matrix, in bytes."""
+        return self.matrix.nbytes
@@ -0,0 +1,227 @@
+"""Page-level PDF text extraction: parallel parsing in a process pool, pluggable backends and a per-page text cache.
+
+The default "pdfminer" backend gives exactly the text of PDFMinerLoader (the pages are extracted separately,
+then concatenated). Faster optional backends are used when selected and installed:
+"pypdfium2" (pip install pypdfium2) or "pymupdf" (pip install pymupdf); their text differs slightly.
+"""
+
+import hashlib, io, multiprocessing, threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from app_constants import (
+    PDF_PARSER_BACKEND,
+    PDF_PARSER_WORKERS,
+    PDF_PARSER_PARALLEL_MIN_PAGES,
+    PDF_PAGE_CACHE_MAX_PAGES,
+)
+from tracing import span
+
+PDF_BACKENDS = ["pdfminer", "pypdfium2", "pymupdf"]
+
+
+def is_backend_available(backend):
+    """Return True if the Python package of the backend is installed."""
+    try:
+        if backend == "pdfminer":
+            import pdfminer
+        elif backend == "pypdfium2":
+            import pypdfium2
+        elif backend == "pymupdf":
+            import fitz
+        else:
+            return False
+    except ImportError:
+        return False
+    return True
+
+
+def count_pages(backend, pdf_bytes):
+    if backend == "pypdfium2":
+        import pypdfium2
+
+        return len(pypdfium2.PdfDocument(pdf_bytes))
+    if backend == "pymupdf":
+        import fitz
+
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+            return pdf.page_count
+
+    from pdfminer.pdfpage import PDFPage
+
+    return sum(1 for _ in PDFPage.get_pages(io.BytesIO(pdf_bytes)))
+
+
+def extract_pages(backend, pdf_bytes, page_numbers):
+    """Return the text of each page of page_numbers (run in the worker processes).
+    Each page text ends with a form feed, like pdfminer."""
+    if backend == "pypdfium2":
+        import pypdfium2
+
+        pdf = pypdfium2.PdfDocument(pdf_bytes)
+        return [pdf[i].get_textpage().get_text_range() + "\x0c" for i in page_numbers]
+    if backend == "pymupdf":
+        import fitz
+
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf:
+            return [pdf[i].get_text() + "\x0c" for i in page_numbers]
+
+    # Like pdfminer.high_level.extract_text, but the document is parsed once for all the pages of the batch
+    # and the text of each page is collected separately.
+    from pdfminer.converter import TextConverter
+    from pdfminer.layout import LAParams
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    if not page_numbers:
+        return []
+    texts = []
+    with io.StringIO() as output_string:
+        resource_manager = PDFResourceManager(caching=True)
+        device = TextConverter(resource_manager, output_string, laparams=LAParams())
+        interpreter = PDFPageInterpreter(resource_manager, device)
+        for page in PDFPage.get_pages(io.BytesIO(pdf_bytes), set(page_numbers)):
+            interpreter.process_page(page)
+            texts.append(output_string.getvalue())
+            output_string.seek(0)
+            output_string.truncate(0)
+    return texts
+
+
+class PageTextCache:
+    """In-memory LRU cache of page texts: {(PDF content hash, backend, page number): text}."""
+
+    def __init__(self, max_pages=PDF_PAGE_CACHE_MAX_PAGES):
+        self.max_pages = max_pages
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            text = self._pages.get(key)
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._pages.move_to_end(key)
+            return text
+
+    def set(self, key, text):
+        with self._lock:
+            self._pages[key] = text
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "pages": len(self._pages)}
+
+
+_page_cache = PageTextCache()
+
+
+def get_page_cache():
+    return _page_cache
+
+
+# Process pool shared by all the sessions, created on first use.
+# The workers are spawned (not forked): forking the multi-threaded Streamlit server is not safe.
+_process_pool = None
+_process_pool_workers = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool(max_workers):
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != max_workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _process_pool_workers = max_workers
+        return _process_pool
+
+
+def split_in_batches(page_numbers, n_batches):
+    """Split the page numbers in at most n_batches contiguous, non-empty batches."""
+    batch_size = -(-len(page_numbers) // max(1, n_batches))  # ceiling division
+    return [
+        page_numbers[i : i + batch_size]
+        for i in range(0, len(page_numbers), batch_size)
+    ]
+
+
+def parse_pdf(
+    pdf_bytes,
+    backend=PDF_PARSER_BACKEND,
+    max_workers=PDF_PARSER_WORKERS,
+    use_cache=True,
+):
+    """Extract the text of each page of a PDF.
+    Pages found in the page cache are not parsed again. When at least PDF_PARSER_PARALLEL_MIN_PAGES pages
+    must be parsed, they are split in contiguous batches parsed in parallel by a pool of max_workers processes.
+    Parameters:
+        - pdf_bytes (bytes): content of the PDF file.
+        - backend (str): in PDF_BACKENDS. If it is not installed, "pdfminer" is used.
+        - max_workers (int): number of worker processes (1: no process pool).
+        - use_cache (bool): read and save the page texts in the page cache.
+    Output:
+        - texts: list of page texts (each ending with a form feed).
+    """
+    if backend != "pdfminer" and not is_backend_available(backend):
+        print(f"[INFO] The PDF parser {backend} is not installed: pdfminer is used.")
+        backend = "pdfminer"
+
+    with span("pdf_parsing", "ingestion", backend=backend) as attributes:
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
+        n_pages = count_pages(backend, pdf_bytes)
+        texts = [None] * n_pages
+        if use_cache:
+            for i in range(n_pages):
+                texts[i] = _page_cache.get((pdf_hash, backend, i))
+        missing_pages = [i for i in range(n_pages) if texts[i] is None]
+
+        workers = 1
+        if missing_pages:
+            batches = [missing_pages]
+            batches_texts = None
+            if max_workers > 1 and len(missing_pages) >= PDF_PARSER_PARALLEL_MIN_PAGES:
+                batches = split_in_batches(missing_pages, max_workers)
+                try:
+                    pool = get_process_pool(max_workers)
+                    batches_texts = list(
+                        pool.map(
+                            extract_pages,
+                            [backend] * len(batches),
+                            [pdf_bytes] * len(batches),
+                            batches,
+                        )
+                    )
+                    workers = len(batches)
+                except Exception as e:
+                    print(f"[ERROR] Parallel PDF parsing failed, parsing serially: {e}")
+            if batches_texts is None:
+                batches_texts = [extract_pages(backend, pdf_bytes, missing_pages)]
+                batches = [missing_pages]
+
+            for batch, batch_texts in zip(batches, batches_texts):
+                for i, text in zip(batch, batch_texts):
+                    texts[i] = text
+                    if use_cache:
+                        _page_cache.set((pdf_hash, backend, i), text)
+
+        attributes.update(
+            pages=n_pages, cached_pages=n_pages - len(missing_pages), workers=workers
+        )
+
+    return texts
@@ -0,0 +1,147 @@
+"""Registry of the prompt templates: each PromptTemplate is compiled once per process and reused.
+
+The extraction template of each (resume sections, language) combination is built from `templates`
+(app_constants.py) on first use, with the language already filled in; the other prompts
+(summary, work duties, project details, improvements and resume evaluation) are compiled once each.
+PROMPT_TEMPLATES_VERSION is a hash of all the prompt texts: the caches and result stores key on it,
+so that a modified prompt is never answered with a response to its former version.
+
+The prompts on the whole resume have two layouts (see DEFAULT_PROMPT_LAYOUT): the instructions then the resume,
+or the same prefix with the resume (PROMPT_RESUME_PREFIX) then the instructions, so that the provider
+prompt cache is hit by every call of the analysis after the first ones.
+The layout of the current analysis is set in `current_prompt_layout` (see resume_analyzer_main).
+"""
+
+import contextvars, functools, hashlib, json
+
+from langchain.prompts import PromptTemplate
+
+from app_constants import (
+    templates,
+    PROMPT_IMPROVE_WORK_EXPERIENCE,
+    PROMPT_IMPROVE_PROJECT,
+    PROMPT_JOB_QUERY,
+    PROMPT_PROJECT_QUERY,
+    PROMPT_EXTRACT_WORK_DUTIES,
+    PROMPT_EXTRACT_PROJECT_DESCRIPTION,
+    PROMPT_EVALUATE_RESUME,
+    PROMPT_IMPROVE_SUMMARY,
+    PROMPT_RESUME_PREFIX,
+    PROMPT_IMPROVE_SUMMARY_RESUME_FIRST,
+    PROMPT_EVALUATE_RESUME_RESUME_FIRST,
+    DEFAULT_PROMPT_LAYOUT,
+)
+
+# Prompt layout of the current analysis. Context variables are copied to the asyncio tasks.
+current_prompt_layout = contextvars.ContextVar(
+    "current_prompt_layout", default=DEFAULT_PROMPT_LAYOUT
+)
+
+# Instructions of the extraction prompts, around the templates of the requested sections.
+EXTRACTION_HEADER = (
+    "For the following resume, output in {language} the following information:\n\n"
+)
+EXTRACTION_UNKNOWN = "For any requested information, if it is not found, output 'unknown' or ['unknown'] accordingly.\n\n"
+EXTRACTION_FORMAT = (
+    "Format the final output as a json dictionary with the following keys: ({keys})"
+)
+EXTRACTION_RESUME = "\n\nResume: {resume}"
+# Header of the extraction instructions after PROMPT_RESUME_PREFIX ("resume_first" layout).
+EXTRACTION_HEADER_RESUME_FIRST = (
+    "For the resume above, output in {language} the following information:\n\n"
+)
+
+# Instructions of the prompts on the whole resume in the "resume_first" layout: {prompt: instructions}
+RESUME_FIRST_INSTRUCTIONS = {
+    PROMPT_IMPROVE_SUMMARY: PROMPT_IMPROVE_SUMMARY_RESUME_FIRST,
+    PROMPT_EVALUATE_RESUME: PROMPT_EVALUATE_RESUME_RESUME_FIRST,
+}
+
+# Version of the prompt templates: stored results are not reused once a prompt is modified.
+PROMPT_TEMPLATES_VERSION = hashlib.sha256(
+    json.dumps(
+        [
+            templates,
+            PROMPT_IMPROVE_WORK_EXPERIENCE,
+            PROMPT_IMPROVE_PROJECT,
+            PROMPT_JOB_QUERY,
+            PROMPT_PROJECT_QUERY,
+            PROMPT_EXTRACT_WORK_DUTIES,
+            PROMPT_EXTRACT_PROJECT_DESCRIPTION,
+            PROMPT_EVALUATE_RESUME,
+            PROMPT_IMPROVE_SUMMARY,
+            PROMPT_RESUME_PREFIX,
+            PROMPT_IMPROVE_SUMMARY_RESUME_FIRST,
+            PROMPT_EVALUATE_RESUME_RESUME_FIRST,
+            [
+                EXTRACTION_HEADER,
+                EXTRACTION_UNKNOWN,
+                EXTRACTION_FORMAT,
+                EXTRACTION_RESUME,
+                EXTRACTION_HEADER_RESUME_FIRST,
+            ],
+        ],
+        sort_keys=True,
+    ).encode("utf-8")
+).hexdigest()[:12]
+
+
+def build_extraction_template(resume_sections, language, layout="instructions_first"):
+    """Build the text of the extraction prompt of the resume sections (with {resume} for the resume)."""
+    if layout == "resume_first":
+        template = PROMPT_RESUME_PREFIX
+        template += EXTRACTION_HEADER_RESUME_FIRST.format(language=language)
+    else:
+        template = EXTRACTION_HEADER.format(language=language)
+    for key in resume_sections:
+        template += key + ": " + templates[key] + "\n\n"
+    template += EXTRACTION_UNKNOWN
+    template += EXTRACTION_FORMAT.format(keys=", ".join(resume_sections))
+    if layout != "resume_first":
+        template += EXTRACTION_RESUME
+    return template
+
+
+@functools.lru_cache(maxsize=None)
+def get_extraction_template(
+    resume_sections, language="english", layout="instructions_first"
+):
+    """Return the PromptTemplate of the resume sections (tuple of `templates` keys) in the language and layout.
+    The template is compiled on the first call, with the language filled in: format it with resume=resume text.
+    """
+    prompt_template = PromptTemplate.from_template(
+        build_extraction_template(resume_sections, language, layout)
+    )
+    if "language" in prompt_template.input_variables:
+        prompt_template = prompt_template.partial(language=language)
+    return prompt_template
+
+
+@functools.lru_cache(maxsize=None)
+def get_prompt_template(template, layout="instructions_first"):
+    """Return the PromptTemplate of a prompt text (e.g. PROMPT_IMPROVE_SUMMARY), compiled on the first call.
+    In the "resume_first" layout, the prompts of RESUME_FIRST_INSTRUCTIONS start with PROMPT_RESUME_PREFIX.
+    """
+    if layout == "resume_first" and template in RESUME_FIRST_INSTRUCTIONS:
+        template = PROMPT_RESUME_PREFIX + RESUME_FIRST_INSTRUCTIONS[template]
+    return PromptTemplate.from_template(template)
+
+
+def has_resume_prefix(prompt):
+    """Return True if the prompt starts with PROMPT_RESUME_PREFIX (prompts on the whole resume
+    in the "resume_first" layout)."""
+    return prompt.startswith(PROMPT_RESUME_PREFIX.split("{resume}")[0])
+
+
+def get_registry_stats():
+    """Return the version of the templates, the number of compiled templates and the lookups served
+    by an already compiled template."""
+    cache_infos = [
+        get_extraction_template.cache_info(),
+        get_prompt_template.cache_info(),
+    ]
+    return {
+        "version": PROMPT_TEMPLATES_VERSION,
+        "compiled_templates": sum(cache_info.misses for cache_info in cache_infos),
+        "hits": sum(cache_info.hits for cache_info in cache_infos),
+    }
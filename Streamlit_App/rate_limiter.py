@@ -0,0 +1,157 @@
+import asyncio, hashlib, threading, time
+
+from app_constants import RATE_LIMITS
+
+
+def get_api_key_hash(api_key):
+    """Return a short hash of the API key (str or pydantic SecretStr), so that keys are never stored in clear."""
+    if api_key is None:
+        return None
+    if hasattr(api_key, "get_secret_value"):
+        api_key = api_key.get_secret_value()
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def estimate_tokens(text):
+    """Rough estimate of the token count of a text (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `per_minute` units per minute, with a capacity of `per_minute`.
+    Reservations may take the bucket below zero: the caller then waits until its units are refilled,
+    so callers are served in order (queue) instead of failing."""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0  # units per second
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount, now):
+        """Take `amount` units and return the time to wait (in seconds) until they are available."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+
+class RateLimiter:
+    """Rate limit (requests per minute and tokens per minute) of a provider and an API key.
+    The limiter is shared by all the threads and event loops of the process.
+    Calls over the limit are queued (delayed), never rejected. Queue depth and wait times are recorded.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens_bucket = (
+            TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+        self._lock = threading.Lock()
+
+        # Statistics
+        self.calls = 0
+        self.queue_depth = 0  # number of calls currently waiting
+        self.max_queue_depth = 0
+        self.delayed_calls = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def reserve(self, tokens=0):
+        """Reserve a request (and its tokens), return the time to wait (in seconds) before sending it."""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests_bucket is not None:
+                wait = max(wait, self.requests_bucket.reserve(1, now))
+            if self.tokens_bucket is not None and tokens:
+                wait = max(wait, self.tokens_bucket.reserve(tokens, now))
+
+            self.calls += 1
+            if wait > 0:
+                self.delayed_calls += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                self.queue_depth += 1
+                self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        return wait
+
+    def _release(self):
+        with self._lock:
+            self.queue_depth -= 1
+
+    def acquire(self, tokens=0):
+        """Wait (blocking) until the request can be sent. Return the wait time in seconds."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._release()
+        return wait
+
+    async def aacquire(self, tokens=0):
+        """Wait (asynchronously) until the request can be sent. Return the wait time in seconds."""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._release()
+        return wait
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "delayed_calls": self.delayed_calls,
+                "average_wait": self.total_wait / self.calls if self.calls else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+
+# Process-wide limiters: {(provider, api key hash): RateLimiter}
+_rate_limiters = {}
+# Limits set at runtime (e.g. by the batch analyzer), overriding RATE_LIMITS: {provider: limits}
+_rate_limits_overrides = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def set_rate_limit(provider, requests_per_minute=None, tokens_per_minute=None):
+    """Set the rate limits of a provider (for all API keys). None means no limit."""
+    with _rate_limiters_lock:
+        _rate_limits_overrides[provider] = {
+            "requests_per_minute": requests_per_minute,
+            "tokens_per_minute": tokens_per_minute,
+        }
+        for key in [key for key in _rate_limiters if key[0] == provider]:
+            del _rate_limiters[key]
+
+
+def get_rate_limiter(provider, api_key=None):
+    """Return the rate limiter shared by all the clients of the provider using this API key,
+    or None if the provider is not limited. Default limits are read from RATE_LIMITS."""
+    key = (provider, get_api_key_hash(api_key))
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            limits = _rate_limits_overrides.get(provider, RATE_LIMITS.get(provider, {}))
+            if limits.get("requests_per_minute") or limits.get("tokens_per_minute"):
+                _rate_limiters[key] = RateLimiter(**limits)
+            else:
+                _rate_limiters[key] = None
+        return _rate_limiters[key]
+
+
+def get_rate_limiters_stats():
+    """Return the statistics of all the rate limiters: {"provider (key hash)": stats}."""
+    with _rate_limiters_lock:
+        limiters = dict(_rate_limiters)
+    return {
+        f"{provider} ({key_hash})": limiter.stats()
+        for (provider, key_hash), limiter in limiters.items()
+        if limiter is not None
+    }
@@ -0,0 +1,72 @@
+import datetime, hashlib, json, os, threading
+
+from app_constants import RESULTS_DIR, RESULTS_INDEX_PATH
+from prompt_templates import PROMPT_TEMPLATES_VERSION
+
+_index_lock = threading.Lock()
+
+
+def get_result_key(file_bytes, LLM_provider, model_name, language, settings=None):
+    """Create the key of a resume analysis:
+    (SHA-256 of the PDF bytes, provider, model, assistant language, prompt-template version, settings).
+    settings (dict): the other settings that change the result: extraction mode, structured output,
+    prompt layout, temperature and top_p of the creative LLM, reranker and retrieval token budget.
+    """
+    pdf_hash = hashlib.sha256(file_bytes).hexdigest()
+    key = json.dumps(
+        [
+            pdf_hash,
+            LLM_provider,
+            model_name,
+            language,
+            PROMPT_TEMPLATES_VERSION,
+            settings or {},
+        ],
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def read_results_index():
+    """Read the results index: {result_key: results file name}."""
+    try:
+        with open(RESULTS_INDEX_PATH, "r") as fp:
+            return json.load(fp)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def load_result(result_key):
+    """Return the stored SCANNED_RESUME of the result_key, or None if this resume was not analyzed yet."""
+    file_name = read_results_index().get(result_key)
+    if file_name is None:
+        return None
+    try:
+        with open(RESULTS_DIR.joinpath(file_name), "r") as fp:
+            return json.load(fp)
+    except Exception as e:
+        print(f"[ERROR] Could not load {file_name}: {e}")
+        return None
+
+
+def save_result(SCANNED_RESUME, result_key=None):
+    """Save the SCANNED_RESUME to RESULTS_DIR/results_<timestamp>.json.
+    If result_key is not None, add the file to the results index."""
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    now = (datetime.datetime.now()).strftime("%Y%m%d_%H%M%S_%f")
+    file_name = f"results_{now}.json"
+    with open(RESULTS_DIR.joinpath(file_name), "w") as fp:
+        json.dump(SCANNED_RESUME, fp)
+
+    if result_key is not None:
+        with _index_lock:
+            results_index = read_results_index()
+            results_index[result_key] = file_name
+            # Write to a temporary file first, so that the index is never left half-written.
+            tmp_path = RESULTS_INDEX_PATH.with_suffix(".tmp")
+            with open(tmp_path, "w") as fp:
+                json.dump(results_index, fp, indent=1)
+            os.replace(tmp_path, RESULTS_INDEX_PATH)
+
+    return file_name
@@ -1,106 +1,90 @@
 import streamlit as st
-import json, warnings
+import asyncio, json, warnings
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 import datetime, json
 
-from langchain.prompts import PromptTemplate
-
 from app_constants import (
     templates,
     PROMPT_IMPROVE_WORK_EXPERIENCE,
     PROMPT_IMPROVE_PROJECT,
+    PROMPT_JOB_QUERY,
+    PROMPT_PROJECT_QUERY,
+    PROMPT_EXTRACT_WORK_DUTIES,
+    PROMPT_EXTRACT_PROJECT_DESCRIPTION,
     PROMPT_EVALUATE_RESUME,
     PROMPT_IMPROVE_SUMMARY,
+    MAX_CONCURRENT_STAGES,
+    DEFAULT_EXTRACTION_MODE,
+    STREAMING,
+    DEFAULT_PROMPT_LAYOUT,
 )
 import retrieval
+from llm_functions import get_LLM_provider, get_LLM_params, call_LLM
+from token_accounting import count_tokens, track_run
+from tracing import span
+from scheduler import run_stages, fan_out, EarlyStarts
+from results_store import save_result
+from client_registry import run_async
+from prompt_templates import (
+    get_extraction_template,
+    get_prompt_template,
+    current_prompt_layout,
+)
+from structured_output import (
+    get_sections_schema,
+    validate_response,
+    parse_response,
+    track_parsing,
+    WorkExperience,
+    Project,
+    SummaryEvaluation,
+    WorkDuties,
+    WorkExperienceImprovement,
+    ProjectImprovement,
+    ResumeEvaluation,
+)
 
 
 def create_prompt_template(resume_sections, language="english"):
-    """create the promptTemplate.
+    """Return the promptTemplate of the resume sections, compiled once per process (see prompt_templates.py).
+    The layout of the prompt is the layout of the current analysis (current_prompt_layout).
     Parameters:
        resume_sections (list): List of CV sections from which information will be extracted.
        language (str): the language of the assistant, default="english".
     """
+    with span("prompt_template", "prompt", sections=len(resume_sections)):
+        return get_extraction_template(
+            tuple(resume_sections), language, current_prompt_layout.get()
+        )
 
-    # Create the Template
-    template = f"""For the following resume, output in {language} the following information:\n\n"""
-
-    for key in resume_sections:
-        template += key + ": " + templates[key] + "\n\n"
-
-    template += "For any requested information, if it is not found, output 'unknown' or ['unknown'] accordingly.\n\n"
-    template += (
-        """Format the final output as a json dictionary with the following keys: ("""
-    )
-
-    for key in resume_sections:
-        template += "" + key + ", "
-    template = template[:-2] + ")"  # remove the last ", "
-
-    template += """\n\nResume: {text}"""
-
-    # Create the PromptTemplate
-    prompt_template = PromptTemplate.from_template(template)
-
-    return prompt_template
-
-
-def extract_from_text(text, start_tag, end_tag=None):
-    """Use start and end tags to extract a substring from text.
-    This helper function is used to parse the response content on the LLM in case 'json.loads' fails.
-    """
-    start_index = text.find(start_tag)
-    if end_tag is None:
-        extacted_txt = text[start_index + len(start_tag) :]
-    else:
-        end_index = text.find(end_tag)
-        extacted_txt = text[start_index + len(start_tag) : end_index]
-
-    return extacted_txt
-
-
-def convert_text_to_list_of_dicts(text, dict_keys):
-    """Convert text to a python list of dicts.
-    Parameters:
-     - text: string containing a list of dicts
-     - dict_keys (list): the keys of the dictionary which will be returned.
-    Output:
-     - list_of_dicts (list): the list of dicts to return.
-    """
-    list_of_dicts = []
-
-    if text != "":
-        text_splitted = text.split("},\n")
-        dict_keys.append(None)
 
-        for i in range(len(text_splitted)):
-            dict_i = {}
+def get_current_time():
+    current_time = (datetime.datetime.now()).strftime("%H:%M:%S")
+    return current_time
 
-            for j in range(len(dict_keys) - 1):
-                key_value = extract_from_text(
-                    text_splitted[i], f'"{dict_keys[j]}": ', f'"{dict_keys[j+1]}": '
-                )
-                key_value = key_value[: key_value.rfind(",\n")].strip()[1:-1]
-                dict_i[dict_keys[j]] = key_value
 
-            list_of_dicts.append(dict_i)  # add the dict to the list.
+def create_prompt(documents, resume_sections: list, language="english"):
+    """Create the prompt template of the resume sections and format it with the full documents."""
+    prompt_template = create_prompt_template(
+        resume_sections,
+        language=language,
+    )
 
-    return list_of_dicts
+    resume_text = retrieval.format_documents(documents)
+    prompt = prompt_template.format_prompt(resume=resume_text).text
 
-
-def get_current_time():
-    current_time = (datetime.datetime.now()).strftime("%H:%M:%S")
-    return current_time
+    return prompt
 
 
-def invoke_LLM(
+async def invoke_LLM(
     llm,
     documents,
     resume_sections: list,
     info_message="",
     language="english",
+    on_field=None,
 ):
     """Invoke LLM and get a response.
     Parameters:
@@ -109,6 +93,8 @@ def invoke_LLM(
      - resume_sections (list): List of resume sections to be parsed.
      - info_message (str): display an informational message.
      - language (str): Assistant language. Will be use to format the prompt_template.
+     - on_field: if not None, the response is streamed and on_field(path, value) is called
+        for each field of the response as soon as it is complete (see llm_functions.call_LLM).
 
      Output:
      - response_content (str): the content of the LLM response.
@@ -119,147 +105,46 @@ def invoke_LLM(
     st.info(f"**{get_current_time()}** \t{info_message}")
     print(f"**{get_current_time()}** \t{info_message}")
 
-    # 2. Create the promptTemplate.
-    prompt_template = create_prompt_template(
-        resume_sections,
-        language=st.session_state.assistant_language,
-    )
+    # 2. Create the prompt.
+    prompt = create_prompt(documents, resume_sections, language)
 
-    # 3. Format promptTemplate with the full documents
-    if language is not None:
-        prompt = prompt_template.format_prompt(text=documents, language=language).text
-    else:
-        prompt = prompt_template.format_prompt(text=documents).text
-
-    # 4. Invoke LLM
-    response = llm.invoke(prompt)
+    # 3. Invoke LLM (with the schema of the sections, see structured_output.py)
+    response = await call_LLM(
+        llm,
+        prompt,
+        schema=get_sections_schema(tuple(resume_sections)),
+        on_field=on_field,
+    )
 
-    response_content = response.content[
-        response.content.find("{") : response.content.rfind("}") + 1
-    ]
-    response_tokens_count = sum(retrieval.tiktoken_tokens([response_content]))
+    response_content = response.content
+    response_tokens_count = count_tokens(
+        [response_content], get_LLM_params(llm)["model"]
+    )[0]
 
     return response_content, response_tokens_count
 
 
-def ResponseContent_Parser(
-    response_content, list_fields, list_rfind, list_exclude_first_car
+async def Extract_contact_information(
+    llm, documents, language="english", on_field=None
 ):
-    """This is a function for parsing any response_content.
-    Parameters:
-    - response_content (str): the content of the LLM response we are going to parse.
-    - list_fields (list): List of dictionary fields returned by this function.
-        A field can be a dictionary. The key of the dict will not be parsed.
-        Example: [{'Contact__information':['candidate__location','candidate__email','candidate__phone','candidate__social_media']},
-                   'CV__summary']
-                   We will not parse the content for 'Contact__information'.
-    - list_rfind (list): To parse the content of a field, first we will extract the text between this field and the next field.
-        Then, extract text using `rfind` Python command, which returns the highest index in the text where the substring is found.
-    - list_exclude_first_car (list): Exclusion or not of the first and last characters.
-
-    Output:
-      - INFORMATION_dict: dictionary, where fields are the keys and parsed texts are the values.
-
-    """
-
-    list_fields_detailed = (
-        []
-    )  # list of tupples. tupple = (field,extract info (boolean), parent field)
-
-    for field in list_fields:
-        if type(field) is dict:
-            list_fields_detailed.append(
-                (list(field.keys())[0], False, None)
-            )  # We will not extract any value for the text between this tag and the next.
-            for val in list(field.values())[0]:
-                list_fields_detailed.append((val, True, list(field.keys())[0]))
-        else:
-            list_fields_detailed.append((field, True, None))
-
-    list_fields_detailed.append((None, False, None))
-
-    # Parse the response_content
-    INFORMATION_dict = {}
-
-    for i in range(len(list_fields_detailed) - 1):
-        if list_fields_detailed[i][1] is False:  # Extract info = False
-            INFORMATION_dict[list_fields_detailed[i][0]] = {}  # Initialize the dict
-        if list_fields_detailed[i][1]:
-            extracted_value = extract_from_text(
-                response_content,
-                f'"{list_fields_detailed[i][0]}": ',
-                f'"{list_fields_detailed[i+1][0]}":',
-            )
-            extracted_value = extracted_value[
-                : extracted_value.rfind(list_rfind[i])
-            ].strip()
-            if list_exclude_first_car[i]:
-                extracted_value = extracted_value[1:-1].strip()
-            if list_fields_detailed[i][2] is None:
-                INFORMATION_dict[list_fields_detailed[i][0]] = extracted_value
-            else:
-                INFORMATION_dict[list_fields_detailed[i][2]][
-                    list_fields_detailed[i][0]
-                ] = extracted_value
-
-    return INFORMATION_dict
-
-
-def Extract_contact_information(llm, documents):
     """Extract Contact Information: Name, Title, Location, Email, Phone number and Social media profiles."""
 
+    resume_sections = ["Contact__information"]
     try:
-        response_content, response_tokens_count = invoke_LLM(
+        response_content, response_tokens_count = await invoke_LLM(
             llm,
             documents,
-            resume_sections=["Contact__information"],
+            resume_sections=resume_sections,
             info_message="Extract and evaluate contact information...",
-            language=st.session_state.assistant_language,
+            language=language,
+            on_field=on_field,
         )
 
-        try:
-            # Load response_content to json dictionary
-            CONTACT_INFORMATION = json.loads(response_content, strict=False)
-        except Exception as e:
-            print("[ERROR] json.loads returns error:", e)
-            print("\n[INFO] Parse response content...\n")
-
-            list_fields = [
-                {
-                    "Contact__information": [
-                        "candidate__name",
-                        "candidate__title",
-                        "candidate__location",
-                        "candidate__email",
-                        "candidate__phone",
-                        "candidate__social_media",
-                        "evaluation__ContactInfo",
-                        "score__ContactInfo",
-                    ]
-                }
-            ]
-            list_rfind = [",\n", ",\n", ",\n", ",\n", ",\n", ",\n", ",\n", ",\n", "}\n"]
-            list_exclude_first_car = [
-                True,
-                True,
-                True,
-                True,
-                True,
-                True,
-                False,
-                True,
-                False,
-            ]
-            CONTACT_INFORMATION = ResponseContent_Parser(
-                response_content, list_fields, list_rfind, list_exclude_first_car
-            )
-            # convert score to int
-            try:
-                CONTACT_INFORMATION["Contact__information"]["score__ContactInfo"] = int(
-                    CONTACT_INFORMATION["Contact__information"]["score__ContactInfo"]
-                )
-            except:
-                CONTACT_INFORMATION["Contact__information"]["score__ContactInfo"] = -1
+        # Scan response_content (malformed json is repaired) and validate it
+        CONTACT_INFORMATION = parse_response(
+            response_content,
+            get_sections_schema(tuple(resume_sections)),
+        )
 
     except Exception as exception:
         print(f"[Error] {exception}")
@@ -279,84 +164,70 @@ def Extract_contact_information(llm, documents):
     return CONTACT_INFORMATION
 
 
-def Extract_Evaluate_Summary(llm, documents):
-    """Extract, evaluate and strengthen the summary."""
+async def Extract_Summary(llm, documents, language="english", on_field=None):
+    """Extract the summary."""
 
-    ######################################
-    # 1. Extract the summary
-    ######################################
+    resume_sections = ["CV__summary"]
     try:
-        response_content, response_tokens_count = invoke_LLM(
+        response_content, response_tokens_count = await invoke_LLM(
             llm,
             documents,
-            resume_sections=["CV__summary"],
+            resume_sections=resume_sections,
             info_message="Extract and evaluate the Summary....",
-            language=st.session_state.assistant_language,
+            language=language,
+            on_field=on_field,
         )
-        try:
-            # Load response_content to json dictionary
-            SUMMARY_SECTION = json.loads(response_content, strict=False)
-        except Exception as e:
-            print("[ERROR] json.loads returns error:", e)
-            print("\n[INFO] Parse response content...\n")
 
-            list_fields = ["CV__summary"]
-            list_rfind = ["}\n"]
-            list_exclude_first_car = [True]
-
-            SUMMARY_SECTION = ResponseContent_Parser(
-                response_content, list_fields, list_rfind, list_exclude_first_car
-            )
+        # Scan response_content (malformed json is repaired) and validate it
+        SUMMARY_SECTION = parse_response(
+            response_content,
+            get_sections_schema(tuple(resume_sections)),
+        )
 
     except Exception as exception:
         print(f"[Error] {exception}")
         SUMMARY_SECTION = {"CV__summary": "unknown"}
 
+    return SUMMARY_SECTION
+
+
+async def Extract_Evaluate_Summary(
+    llm, documents, language="english", SUMMARY_SECTION=None, on_field=None
+):
+    """Extract, evaluate and strengthen the summary.
+    If SUMMARY_SECTION ({"CV__summary": ...}) is not None, the summary is already extracted
+    (single-call extraction): it is only evaluated."""
+
+    ######################################
+    # 1. Extract the summary
+    ######################################
+    if SUMMARY_SECTION is None:
+        SUMMARY_SECTION = await Extract_Summary(llm, documents, language, on_field)
+
     ######################################
     # 2. Evaluate the summary
     ######################################
 
     try:
-        prompt_template = PromptTemplate.from_template(PROMPT_IMPROVE_SUMMARY)
+        with span("prompt_template", "prompt"):
+            prompt_template = get_prompt_template(
+                PROMPT_IMPROVE_SUMMARY, current_prompt_layout.get()
+            )
 
         prompt = prompt_template.format_prompt(
-            resume=documents,
-            language=st.session_state.assistant_language,
+            resume=retrieval.format_documents(documents),
+            language=language,
             summary=SUMMARY_SECTION["CV__summary"],
         ).text
 
         # Invoke LLM
-        response = llm.invoke(prompt)
-        response_content = response.content[
-            response.content.find("{") : response.content.rfind("}") + 1
-        ]
+        response = await call_LLM(llm, prompt, schema=SummaryEvaluation)
+        response_content = response.content
 
-        try:
-            SUMMARY_EVAL = {}
-            SUMMARY_EVAL["Summary__evaluation"] = json.loads(
-                response_content, strict=False
-            )
-        except Exception as e:
-            print("[ERROR] json.loads returns error:", e)
-            print("\n[INFO] Parse response content...\n")
-
-            list_fields = [
-                "evaluation__summary",
-                "score__summary",
-                "CV__summary_enhanced",
-            ]
-            list_rfind = [",\n", ",\n", "}\n"]
-            list_exclude_first_car = [True, False, True]
-            SUMMARY_EVAL["Summary__evaluation"] = ResponseContent_Parser(
-                response_content, list_fields, list_rfind, list_exclude_first_car
-            )
-            # convert score to int
-            try:
-                SUMMARY_EVAL["Summary__evaluation"]["score__summary"] = int(
-                    SUMMARY_EVAL["Summary__evaluation"]["score__summary"]
-                )
-            except:
-                SUMMARY_EVAL["Summary__evaluation"]["score__summary"] = -1
+        SUMMARY_EVAL = {}
+        SUMMARY_EVAL["Summary__evaluation"] = parse_response(
+            response_content, SummaryEvaluation
+        )
 
     except Exception as e:
         print(e)
@@ -373,93 +244,30 @@ def Extract_Evaluate_Summary(llm, documents):
     return SUMMARY_EVAL
 
 
-def Extract_Education_Language(llm, documents):
+async def Extract_Education_Language(llm, documents, language="english", on_field=None):
     """Extract and evaluate education and language sections."""
 
+    resume_sections = [
+        "CV__Education",
+        "Education__evaluation",
+        "CV__Languages",
+        "Languages__evaluation",
+    ]
     try:
-        response_content, response_tokens_count = invoke_LLM(
+        response_content, response_tokens_count = await invoke_LLM(
             llm,
             documents,
-            resume_sections=[
-                "CV__Education",
-                "Education__evaluation",
-                "CV__Languages",
-                "Languages__evaluation",
-            ],
+            resume_sections=resume_sections,
             info_message="Extract and evaluate education and language sections...",
-            language=st.session_state.assistant_language,
+            language=language,
+            on_field=on_field,
         )
 
-        try:
-            # Load response_content to json dictionary
-            Education_Language_sections = json.loads(response_content, strict=False)
-        except Exception as e:
-            print("[ERROR] json.loads returns error:", e)
-            print("\n[INFO] Parse response content...\n")
-
-            list_fields = [
-                "CV__Education",
-                {"Education__evaluation": ["score__edu", "evaluation__edu"]},
-                "CV__Languages",
-                {"Languages__evaluation": ["score__language", "evaluation__language"]},
-            ]
-
-            list_rfind = [",\n", ",\n", ",\n", ",\n", ",\n", ",\n", ",\n", "\n"]
-            list_exclude_first_car = [True, True, False, True, True, True, False, True]
-
-            Education_Language_sections = ResponseContent_Parser(
-                response_content, list_fields, list_rfind, list_exclude_first_car
-            )
-
-            # Convert scores to int
-            try:
-                Education_Language_sections["Education__evaluation"]["score__edu"] = (
-                    int(
-                        Education_Language_sections["Education__evaluation"][
-                            "score__edu"
-                        ]
-                    )
-                )
-            except:
-                Education_Language_sections["Education__evaluation"]["score__edu"] = -1
-
-            try:
-                Education_Language_sections["Languages__evaluation"][
-                    "score__language"
-                ] = int(
-                    Education_Language_sections["Languages__evaluation"][
-                        "score__language"
-                    ]
-                )
-            except:
-                Education_Language_sections["Languages__evaluation"][
-                    "score__language"
-                ] = -1
-
-            # Split languages and educational texts into a Python list of dict
-            languages = Education_Language_sections["CV__Languages"]
-            Education_Language_sections["CV__Languages"] = (
-                convert_text_to_list_of_dicts(
-                    text=languages[
-                        languages.find("[") + 1 : languages.rfind("]")
-                    ].strip(),
-                    dict_keys=["spoken__language", "language__fluency"],
-                )
-            )
-            education = Education_Language_sections["CV__Education"]
-            Education_Language_sections["CV__Education"] = (
-                convert_text_to_list_of_dicts(
-                    text=education[
-                        education.find("[") + 1 : education.rfind("]")
-                    ].strip(),
-                    dict_keys=[
-                        "edu__college",
-                        "edu__degree",
-                        "edu__start_date",
-                        "edu__end_date",
-                    ],
-                )
-            )
+        # Scan response_content (malformed json is repaired) and validate it
+        Education_Language_sections = parse_response(
+            response_content,
+            get_sections_schema(tuple(resume_sections)),
+        )
     except Exception as exception:
         print(exception)
         Education_Language_sections = {
@@ -475,91 +283,32 @@ def Extract_Education_Language(llm, documents):
     return Education_Language_sections
 
 
-def Extract_Skills_and_Certifications(llm, documents):
+async def Extract_Skills_and_Certifications(
+    llm, documents, language="english", on_field=None
+):
     """Extract skills and certifications and evaluate these sections."""
 
+    resume_sections = [
+        "candidate__skills",
+        "Skills__evaluation",
+        "CV__Certifications",
+        "Certif__evaluation",
+    ]
     try:
-        response_content, response_tokens_count = invoke_LLM(
+        response_content, response_tokens_count = await invoke_LLM(
             llm,
             documents,
-            resume_sections=[
-                "candidate__skills",
-                "Skills__evaluation",
-                "CV__Certifications",
-                "Certif__evaluation",
-            ],
+            resume_sections=resume_sections,
             info_message="Extract and evaluate the skills and certifications...",
-            language=st.session_state.assistant_language,
+            language=language,
+            on_field=on_field,
         )
 
-        try:
-            # Load response_content to json dictionary
-            SKILLS_and_CERTIF = json.loads(response_content, strict=False)
-        except Exception as e:
-            print("[ERROR] json.loads returns error:", e)
-            print("\n[INFO] Parse response content...\n")
-
-            skills = extract_from_text(
-                response_content, '"candidate__skills": ', '"Skills__evaluation":'
-            )
-            skills = skills.replace("\n  ", "\n").replace("],\n", "").replace("[\n", "")
-            score_skills = extract_from_text(
-                response_content, '"score__skills": ', '"evaluation__skills":'
-            )
-            evaluation_skills = extract_from_text(
-                response_content, '"evaluation__skills": ', '"CV__Certifications":'
-            )
-
-            certif_text = extract_from_text(
-                response_content, '"CV__Certifications": ', '"Certif__evaluation":'
-            )
-            certif_score = extract_from_text(
-                response_content, '"score__certif": ', '"evaluation__certif":'
-            )
-            certif_eval = extract_from_text(
-                response_content, '"evaluation__certif": ', None
-            )
-
-            # Create the dictionary
-            SKILLS_and_CERTIF = {}
-            SKILLS_and_CERTIF["candidate__skills"] = [
-                skill.strip()[1:-1] for skill in skills.split(",\n")
-            ]
-            try:
-                score_skills_int = int(score_skills[0 : score_skills.rfind(",\n")])
-            except:
-                score_skills_int = -1
-            SKILLS_and_CERTIF["Skills__evaluation"] = {
-                "score__skills": score_skills_int,
-                "evaluation__skills": evaluation_skills[
-                    : evaluation_skills.rfind("}\n")
-                ].strip()[1:-1],
-            }
-
-            # Convert certificate text to list of dictionaries
-            list_certifs = convert_text_to_list_of_dicts(
-                text=certif_text[
-                    certif_text.find("[") + 1 : certif_text.rfind("]")
-                ].strip(),  # .strip()[1:-1]
-                dict_keys=[
-                    "certif__title",
-                    "certif__organization",
-                    "certif__date",
-                    "certif__expiry_date",
-                    "certif__details",
-                ],
-            )
-            SKILLS_and_CERTIF["CV__Certifications"] = list_certifs
-            try:
-                certif_score_int = int(certif_score[0 : certif_score.rfind(",\n")])
-            except:
-                certif_score_int = -1
-            SKILLS_and_CERTIF["Certif__evaluation"] = {
-                "score__certif": certif_score_int,
-                "evaluation__certif": certif_eval[: certif_eval.rfind("}\n")].strip()[
-                    1:-1
-                ],
-            }
+        # Scan response_content (malformed json is repaired) and validate it
+        SKILLS_and_CERTIF = parse_response(
+            response_content,
+            get_sections_schema(tuple(resume_sections)),
+        )
 
     except Exception as exception:
         SKILLS_and_CERTIF = {
@@ -579,82 +328,141 @@ def Extract_Skills_and_Certifications(llm, documents):
     return SKILLS_and_CERTIF
 
 
-def Extract_PROFESSIONAL_EXPERIENCE(llm, documents):
+async def Extract_PROFESSIONAL_EXPERIENCE(
+    llm, documents, language="english", on_field=None
+):
     """Extract list of work experience and projects."""
 
+    resume_sections = ["Work__experience", "CV__Projects"]
     try:
-        response_content, response_tokens_count = invoke_LLM(
+        response_content, response_tokens_count = await invoke_LLM(
             llm,
             documents,
-            resume_sections=["Work__experience", "CV__Projects"],
+            resume_sections=resume_sections,
             info_message="Extract list of work experience and projects...",
-            language=st.session_state.assistant_language,
+            language=language,
+            on_field=on_field,
         )
 
-        try:
-            # Load response_content to json dictionary
-            PROFESSIONAL_EXPERIENCE = json.loads(response_content, strict=False)
-        except Exception as e:
-            print("[ERROR] json.loads returns error:", e)
-            print("\n[INFO] Parse response content...\n")
+        # Scan response_content (malformed json is repaired) and validate it
+        PROFESSIONAL_EXPERIENCE = parse_response(
+            response_content,
+            get_sections_schema(tuple(resume_sections)),
+        )
+        exclude_unknown_experiences(PROFESSIONAL_EXPERIENCE)
 
-            work_experiences = extract_from_text(
-                response_content, '"Work__experience": ', '"CV__Projects":'
-            )
-            projects = extract_from_text(response_content, '"CV__Projects": ', None)
-
-            # Create the dictionary
-            PROFESSIONAL_EXPERIENCE = {}
-            PROFESSIONAL_EXPERIENCE["Work__experience"] = convert_text_to_list_of_dicts(
-                text=work_experiences[
-                    work_experiences.find("[") + 1 : work_experiences.rfind("]")
-                ].strip()[1:-1],
-                dict_keys=[
-                    "job__title",
-                    "job__company",
-                    "job__start_date",
-                    "job__end_date",
-                ],
-            )
-            PROFESSIONAL_EXPERIENCE["CV__Projects"] = convert_text_to_list_of_dicts(
-                text=projects[projects.find("[") + 1 : projects.rfind("]")].strip()[
-                    1:-1
-                ],
-                dict_keys=[
-                    "project__title",
-                    "project__start_date",
-                    "project__end_date",
-                ],
-            )
-        # Exclude 'unknown' projects and work experiences
-        try:
-            for work_experience in PROFESSIONAL_EXPERIENCE["Work__experience"]:
-                if work_experience["job__title"] == "unknown":
-                    PROFESSIONAL_EXPERIENCE["Work__experience"].remove(work_experience)
-        except Exception as e:
-            print(e)
+    except Exception as exception:
+        PROFESSIONAL_EXPERIENCE = {"Work__experience": [], "CV__Projects": []}
+        print(exception)
+
+    return PROFESSIONAL_EXPERIENCE
+
+
+def exclude_unknown_experiences(PROFESSIONAL_EXPERIENCE):
+    """Exclude 'unknown' projects and work experiences (the lists are rebuilt, not modified while iterated)."""
+    for section, title_key in [
+        ("Work__experience", "job__title"),
+        ("CV__Projects", "project__title"),
+    ]:
         try:
-            for project in PROFESSIONAL_EXPERIENCE["CV__Projects"]:
-                if project["project__title"] == "unknown":
-                    PROFESSIONAL_EXPERIENCE["CV__Projects"].remove(project)
+            PROFESSIONAL_EXPERIENCE[section] = [
+                item
+                for item in PROFESSIONAL_EXPERIENCE[section]
+                if item[title_key] != "unknown"
+            ]
         except Exception as e:
             print(e)
 
+
+###############################################################################
+#               Single-call extraction of all the resume sections
+###############################################################################
+
+# Resume sections extracted by each stage of the multi-call extraction.
+# In single-call extraction, all these sections are requested in a single prompt,
+# then the response is split back into the same dictionaries.
+EXTRACTION_STAGES = {
+    "CONTACT_INFORMATION": ["Contact__information"],
+    "Summary_SECTION": ["CV__summary"],
+    "Education_Language_sections": [
+        "CV__Education",
+        "Education__evaluation",
+        "CV__Languages",
+        "Languages__evaluation",
+    ],
+    "SKILLS_and_CERTIF": [
+        "candidate__skills",
+        "Skills__evaluation",
+        "CV__Certifications",
+        "Certif__evaluation",
+    ],
+    "PROFESSIONAL_EXPERIENCE": ["Work__experience", "CV__Projects"],
+}
+
+
+async def Extract_All_Sections(llm, documents, language="english", on_field=None):
+    """Extract all the resume sections of EXTRACTION_STAGES with a single LLM call:
+    the resume is sent once instead of once per section group.
+    Output:
+     - ALL_SECTIONS (dict): the parsed LLM response, or an empty dict if the response is not valid json.
+        The sections are validated by split_all_sections.
+    """
+    try:
+        response_content, response_tokens_count = await invoke_LLM(
+            llm,
+            documents,
+            resume_sections=[
+                section
+                for sections in EXTRACTION_STAGES.values()
+                for section in sections
+            ],
+            info_message="Extract all the resume sections...",
+            language=language,
+            on_field=on_field,
+        )
+        ALL_SECTIONS = parse_response(response_content, dict)
     except Exception as exception:
-        PROFESSIONAL_EXPERIENCE = {"Work__experience": [], "CV__Projects": []}
-        print(exception)
+        print(f"[ERROR] Single-call extraction failed: {exception}")
+        ALL_SECTIONS = {}
 
-    return PROFESSIONAL_EXPERIENCE
+    return ALL_SECTIONS
+
+
+def split_all_sections(ALL_SECTIONS, stage_name):
+    """Return the dictionary of the stage (see EXTRACTION_STAGES) from the single-call response,
+    or None if no section of this stage is in the response or they do not match their schema
+    (see structured_output.py). The missing sections of the stage get their default.
+    """
+    sections = EXTRACTION_STAGES[stage_name]
+    if not any(section in ALL_SECTIONS for section in sections):
+        return None
+    try:
+        STAGE_SECTIONS = validate_response(
+            get_sections_schema(tuple(sections)),
+            {
+                section: ALL_SECTIONS[section]
+                for section in sections
+                if section in ALL_SECTIONS
+            },
+        )
+    except Exception:
+        return None
 
+    if stage_name == "PROFESSIONAL_EXPERIENCE":
+        exclude_unknown_experiences(STAGE_SECTIONS)
 
-def get_relevant_documents(query, documents):
-    """Retreieve most relevant documents from Langchain documents using the CoherRerank retriever."""
+    return STAGE_SECTIONS
 
-    # 1.1. Retrieve documents using the CohereRerank retriever
 
-    retrieved_docs = st.session_state.retriever.get_relevant_documents(query)
+def select_relevant_documents(retrieved_docs, documents):
+    """Select the relevant documents among the documents retrieved for a query:
+    the documents where relevance_score >= (max(relevance_scores) - 0.1), and the document following the most relevant one.
+    If no document was retrieved, all the documents are returned."""
 
-    # 1.2. Keep only relevant documents where relevance_score >= (max(relevance_scores) - 0.1)
+    if not retrieved_docs:
+        return documents
+
+    # 1. Keep only relevant documents where relevance_score >= (max(relevance_scores) - 0.1)
 
     relevance_scores = [
         retrieved_docs[j].metadata["relevance_score"]
@@ -673,7 +481,7 @@ def get_relevant_documents(query, documents):
             # Append the retrieved document
             relevant_doc_ids.append(retrieved_docs[j].metadata["doc_number"])
 
-    # Append the next document to the most relevant document, as relevant information may be split between two documents.
+    # 2. Append the next document to the most relevant document, as relevant information may be split between two documents.
     relevant_doc_ids.append(min(relevant_doc_ids[0] + 1, len(documents) - 1))
 
     # Sort document ids
@@ -685,122 +493,237 @@ def get_relevant_documents(query, documents):
     return relevant_documents
 
 
-def Extract_Job_Responsibilities(llm, documents, PROFESSIONAL_EXPERIENCE):
-    """Extract job responsibilities for each job in PROFESSIONAL_EXPERIENCE."""
+async def get_relevant_documents(query, documents, retriever):
+    """Retreieve most relevant documents from Langchain documents using the reranking retriever (local or CohereRerank)."""
 
-    st.info(f"**{get_current_time()}** \tExtract work experience responsibilities...")
-    print(f"**{get_current_time()}** \tExtract work experience responsibilities...")
+    with span("get_relevant_documents", "retrieval", query=query[:100]) as attributes:
+        retrieved_docs = await retriever.aget_relevant_documents(query)
+        attributes["retrieved_documents"] = len(retrieved_docs)
 
-    for i in range(len(PROFESSIONAL_EXPERIENCE["Work__experience"])):
-        try:
-            Work_experience_i = PROFESSIONAL_EXPERIENCE["Work__experience"][i]
-
-            # 1. Extract relevant documents
-            query = f"""Extract from the resume delimited by triple backticks \
-all the duties and responsibilities of the following work experience: \
-(title = '{Work_experience_i['job__title']}'"""
-            if str(Work_experience_i["job__company"]) != "unknown":
-                query += f" and company = '{Work_experience_i['job__company']}'"
-            if str(Work_experience_i["job__start_date"]) != "unknown":
-                query += f" and start date = '{Work_experience_i['job__start_date']}'"
-            if str(Work_experience_i["job__end_date"]) != "unknown":
-                query += f" and end date = '{Work_experience_i['job__end_date']}'"
-            query += ")\n"
+    return select_relevant_documents(retrieved_docs, documents)
 
-            try:
-                relevant_documents = get_relevant_documents(query, documents)
-            except Exception as err:
-                st.error(f"get_relevant_documents error: {err}")
-                relevant_documents = documents
-
-            # 2. Invoke LLM
-
-            prompt = (
-                query
-                + f"""Output the duties in a json dictionary with the following keys (__duty_id__,__duty__). \
-Use this format: "1":"duty","2":"another duty".
-Resume:\n\n ```{relevant_documents}```"""
+
+async def get_relevant_documents_batch(queries, documents, retriever):
+    """Retrieve the most relevant documents of several queries at once (see retrieval.abatch_retrieve):
+    the queries are embedded, searched and reranked together.
+    Without retriever (short resume, see retrieval.use_retrieval), all the documents are relevant to each query.
+    Output:
+        the list of relevant documents of each query."""
+
+    with span(
+        "get_relevant_documents_batch",
+        "retrieval",
+        queries=len(queries),
+        retrieval=retriever is not None,
+    ) as attributes:
+        if retriever is None:
+            attributes["retrieved_documents"] = 0
+            return [documents for _ in queries]
+        list_retrieved_docs = await retrieval.abatch_retrieve(retriever, queries)
+        attributes["retrieved_documents"] = sum(
+            len(retrieved_docs) for retrieved_docs in list_retrieved_docs
+        )
+
+    return [
+        select_relevant_documents(retrieved_docs, documents)
+        for retrieved_docs in list_retrieved_docs
+    ]
+
+
+def get_job_query(Work_experience_i):
+    """Retrieval query (and prompt header) of the duties of a work experience."""
+    fields = f"title = '{Work_experience_i.get('job__title', 'unknown')}'"
+    if str(Work_experience_i.get("job__company", "unknown")) != "unknown":
+        fields += f" and company = '{Work_experience_i['job__company']}'"
+    if str(Work_experience_i.get("job__start_date", "unknown")) != "unknown":
+        fields += f" and start date = '{Work_experience_i['job__start_date']}'"
+    if str(Work_experience_i.get("job__end_date", "unknown")) != "unknown":
+        fields += f" and end date = '{Work_experience_i['job__end_date']}'"
+    return get_prompt_template(PROMPT_JOB_QUERY).format_prompt(fields=fields).text
+
+
+def get_project_query(project_i):
+    """Retrieval query (and prompt header) of the details of a project."""
+    fields = f"project title = '{project_i.get('project__title', 'unknown')}'"
+    if str(project_i.get("project__start_date", "unknown")) != "unknown":
+        fields += f" and start date = '{project_i['project__start_date']}'"
+    if str(project_i.get("project__end_date", "unknown")) != "unknown":
+        fields += f" and end date = '{project_i['project__end_date']}'"
+    return get_prompt_template(PROMPT_PROJECT_QUERY).format_prompt(fields=fields).text
+
+
+async def get_items_relevant_documents(queries, documents, retriever):
+    """Retrieve the relevant documents of the queries of all the items (work experiences or projects) at once.
+    On error, all the documents are used for each item."""
+    if not queries:
+        return []
+    try:
+        return await get_relevant_documents_batch(queries, documents, retriever)
+    except Exception as err:
+        st.error(f"get_relevant_documents error: {err}")
+        return [documents for _ in queries]
+
+
+async def extract_work_duties(llm, query, relevant_documents):
+    """Extract the duties of a work experience (see get_job_query) from its relevant documents.
+    Output:
+     - work__duties (dict): {duty id: duty}, or an empty dict on error."""
+    try:
+        prompt = (
+            get_prompt_template(PROMPT_EXTRACT_WORK_DUTIES)
+            .format_prompt(
+                query=query, resume=retrieval.format_documents(relevant_documents)
             )
-            response = llm.invoke(prompt)
+            .text
+        )
+        response = await call_LLM(llm, prompt, schema=WorkDuties)
 
-            # 3. Convert the response content to json dict and update work_experience
-            response_content = response.content[
-                response.content.find("{") : response.content.rfind("}") + 1
-            ]
+        # Convert the response content to a json dict
+        return parse_response(response.content, WorkDuties)
 
-            try:
-                Work_experience_i["work__duties"] = json.loads(
-                    response_content, strict=False
-                )  # Convert the response content to a json dict
-            except Exception as e:
-                print("\njson.loads returns error:", e, "\n\n")
-                print("\n[INFO] Parse response content...\n")
-
-                Work_experience_i["work__duties"] = {}
-                list_duties = (
-                    response_content[
-                        response_content.find("{") + 1 : response_content.rfind("}")
-                    ]
-                    .strip()
-                    .split(",\n")
-                )
+    except Exception as exception:
+        print(exception)
+        return {}
 
-                for j in range(len(list_duties)):
-                    try:
-                        Work_experience_i["work__duties"][f"{j+1}"] = (
-                            list_duties[j].split('":')[1].strip()[1:-1]
-                        )
-                    except:
-                        Work_experience_i["work__duties"][f"{j+1}"] = "unknown"
 
-        except Exception as exception:
-            Work_experience_i["work__duties"] = {}
-            print(exception)
+async def extract_project_description(llm, query, relevant_documents):
+    """Extract the details of a project (see get_project_query) from its relevant documents.
+    Output:
+     - project__description (str): the details (with bullet points), or "unknown" on error.
+    """
+    try:
+        prompt = (
+            get_prompt_template(PROMPT_EXTRACT_PROJECT_DESCRIPTION)
+            .format_prompt(
+                query=query, resume=retrieval.format_documents(relevant_documents)
+            )
+            .text
+        )
+        response = await call_LLM(llm, prompt)
+        return response.content
 
-    return PROFESSIONAL_EXPERIENCE
+    except Exception as exception:
+        print(exception)
+        return "unknown"
 
 
-def Extract_Project_Details(llm, documents, PROFESSIONAL_EXPERIENCE):
-    """Extract project details for each project in PROFESSIONAL_EXPERIENCE."""
+async def extract_items_details(
+    items,
+    queries,
+    extract_item_details,
+    details_key,
+    default_details,
+    documents,
+    retriever,
+    provider,
+    label,
+    early_starts=None,
+):
+    """Extract the details of each item (work experiences or projects) in parallel and save them in the item.
+    Parameters:
+     - items (list) and queries (list): the items and their queries (see get_job_query and get_project_query).
+     - extract_item_details: async function called with (query, relevant_documents), returning the details.
+     - details_key (str) and default_details: the item key of the details, and their value on error.
+     - early_starts (EarlyStarts): if not None, the items started early (streaming, see resume_analyzer_main),
+        indexed by query. Their details are not extracted again.
+    """
+    # 1. Take the items started early. The other streamed items are not in the final response: cancel them.
+    early_tasks = [
+        early_starts.pop(query) if early_starts is not None else None
+        for query in queries
+    ]
+    if early_starts is not None:
+        early_starts.cancel()
+    pending = [i for i, task in enumerate(early_tasks) if task is None]
 
-    st.info(f"**{get_current_time()}** \tExtract project details...")
-    print(f"**{get_current_time()}** \tExtract project details...")
+    # 2. Retrieve the relevant documents of all the other items at once
+    list_relevant_documents = await get_items_relevant_documents(
+        [queries[i] for i in pending], documents, retriever
+    )
 
-    for i in range(len(PROFESSIONAL_EXPERIENCE["CV__Projects"])):
-        try:
-            project_i = PROFESSIONAL_EXPERIENCE["CV__Projects"][i]
+    async def extract_details(item):
+        item_i, query, relevant_documents = item
+        item_i[details_key] = await extract_item_details(query, relevant_documents)
 
-            # 1. Extract relevant documents
-            query = f"""Extract from the resume (delimited by triple backticks) what is listed about the following project: \
-(project title = '{project_i['project__title']}'"""
-            if str(project_i["project__start_date"]) != "unknown":
-                query += f" and start date = '{project_i['project__start_date']}'"
-            if str(project_i["project__end_date"]) != "unknown":
-                query += f" and end date = '{project_i['project__end_date']}'"
-            query += ")"
+    async def wait_early_start(item_i, task):
+        details = await task
+        item_i[details_key] = (
+            default_details if isinstance(details, Exception) else details
+        )
 
-            try:
-                relevant_documents = get_relevant_documents(query, documents)
-            except Exception as err:
-                st.error(f"get_relevant_documents error: {err}")
-                relevant_documents = documents
+    # 3. Call LLM for all the other items in parallel.
+    await asyncio.gather(
+        fan_out(
+            extract_details,
+            [
+                (items[i], queries[i], relevant_documents)
+                for i, relevant_documents in zip(pending, list_relevant_documents)
+            ],
+            provider=provider,
+            label=label,
+        ),
+        *[
+            wait_early_start(items[i], task)
+            for i, task in enumerate(early_tasks)
+            if task is not None
+        ],
+    )
 
-            # 2. Invoke LLM
 
-            prompt = (
-                query
-                + f"""Format the extracted text into a string (with bullet points).
-Resume:\n\n ```{relevant_documents}```"""
-            )
+async def Extract_Job_Responsibilities(
+    llm, documents, PROFESSIONAL_EXPERIENCE, retriever, early_starts=None
+):
+    """Extract job responsibilities for each job in PROFESSIONAL_EXPERIENCE.
+    early_starts: the work experiences whose duties are already being extracted (streaming), or None.
+    """
 
-            response = llm.invoke(prompt)
+    st.info(f"**{get_current_time()}** \tExtract work experience responsibilities...")
+    print(f"**{get_current_time()}** \tExtract work experience responsibilities...")
 
-            response_content = response.content
-            project_i["project__description"] = response_content
+    work_experiences = PROFESSIONAL_EXPERIENCE["Work__experience"]
+    await extract_items_details(
+        work_experiences,
+        [get_job_query(Work_experience_i) for Work_experience_i in work_experiences],
+        lambda query, relevant_documents: extract_work_duties(
+            llm, query, relevant_documents
+        ),
+        "work__duties",
+        {},
+        documents,
+        retriever,
+        provider=get_LLM_provider(llm),
+        label="work experience",
+        early_starts=early_starts,
+    )
 
-        except Exception as exception:
-            project_i["project__description"] = "unknown"
-            print(exception)
+    return PROFESSIONAL_EXPERIENCE
+
+
+async def Extract_Project_Details(
+    llm, documents, PROFESSIONAL_EXPERIENCE, retriever, early_starts=None
+):
+    """Extract project details for each project in PROFESSIONAL_EXPERIENCE.
+    early_starts: the projects whose details are already being extracted (streaming), or None.
+    """
+
+    st.info(f"**{get_current_time()}** \tExtract project details...")
+    print(f"**{get_current_time()}** \tExtract project details...")
+
+    projects = PROFESSIONAL_EXPERIENCE["CV__Projects"]
+    await extract_items_details(
+        projects,
+        [get_project_query(project_i) for project_i in projects],
+        lambda query, relevant_documents: extract_project_description(
+            llm, query, relevant_documents
+        ),
+        "project__description",
+        "unknown",
+        documents,
+        retriever,
+        provider=get_LLM_provider(llm),
+        label="project",
+        early_starts=early_starts,
+    )
 
     return PROFESSIONAL_EXPERIENCE
 
@@ -810,25 +733,23 @@ Resume:\n\n ```{relevant_documents}```"""
 ###############################################################################
 
 
-def improve_text_quality(PROMPT, text_to_imporve, llm, language):
-    """Invoke LLM to improve the text quality."""
+async def improve_text_quality(PROMPT, text_to_imporve, llm, language, schema=None):
+    """Invoke LLM to improve the text quality.
+    schema: the schema of the response (see structured_output.py), or None."""
     query = PROMPT.format(text=text_to_imporve, language=language)
-    response = llm.invoke(query)
+    response = await call_LLM(llm, query, schema=schema)
     return response
 
 
-def improve_work_experience(WORK_EXPERIENCE: list, llm):
+async def improve_work_experience(WORK_EXPERIENCE: list, llm, language="english"):
     """Improve each bullet point in the work experience responsibilities."""
 
     message = f"**{get_current_time()}** \tImprove the quality of the work experience section..."
     st.info(message)
     print(message)
 
-    # Call LLM for any work experience to get a better and stronger text.
-    for i in range(len(WORK_EXPERIENCE)):
+    async def improve_duties(WORK_EXPERIENCE_i):
         try:
-            WORK_EXPERIENCE_i = WORK_EXPERIENCE[i]
-
             # 1. Convert the responsibilities from dict to string
 
             text_duties = ""
@@ -836,38 +757,22 @@ def improve_work_experience(WORK_EXPERIENCE: list, llm):
                 text_duties += "- " + duty
             # 2. Call LLM
 
-            response = improve_text_quality(
+            response = await improve_text_quality(
                 PROMPT_IMPROVE_WORK_EXPERIENCE,
                 text_duties,
                 llm,
-                st.session_state.assistant_language,
+                language,
+                schema=WorkExperienceImprovement,
             )
             response_content = response.content
 
             # 3. Convert response content to json dict with keys:
             # ('Score__WorkExperience','Comments__WorkExperience','Improvement__WorkExperience')
 
-            response_content = response_content[
-                response_content.find("{") : response_content.rfind("}") + 1
-            ]
-
             try:
-                list_fields = [
-                    "Score__WorkExperience",
-                    "Comments__WorkExperience",
-                    "Improvement__WorkExperience",
-                ]
-                list_rfind = [",\n", ",\n", "\n"]
-                list_exclude_first_car = [False, True, True]
-                response_content_dict = ResponseContent_Parser(
-                    response_content, list_fields, list_rfind, list_exclude_first_car
+                response_content_dict = parse_response(
+                    response_content, WorkExperienceImprovement
                 )
-                try:
-                    response_content_dict["Score__WorkExperience"] = int(
-                        response_content_dict["Score__WorkExperience"]
-                    )
-                except:
-                    response_content_dict["Score__WorkExperience"] = -1
 
             except Exception as e:
                 response_content_dict = {
@@ -897,53 +802,42 @@ def improve_work_experience(WORK_EXPERIENCE: list, llm):
             WORK_EXPERIENCE_i["Comments__WorkExperience"] = ""
             WORK_EXPERIENCE_i["Improvement__WorkExperience"] = ""
 
+    # Call LLM for any work experience to get a better and stronger text.
+    await fan_out(
+        improve_duties,
+        WORK_EXPERIENCE,
+        provider=get_LLM_provider(llm),
+        label="work experience improvement",
+    )
+
     return WORK_EXPERIENCE
 
 
-def improve_projects(PROJECTS: list, llm):
+async def improve_projects(PROJECTS: list, llm, language="english"):
     """Improve project text with LLM."""
 
     st.info(f"**{get_current_time()}** \tImprove the quality of the project section...")
     print(f"**{get_current_time()}** \tImprove the quality of the project section...")
 
-    for i in range(len(PROJECTS)):
+    async def improve_project(PROJECT_i):
         try:
-            PROJECT_i = PROJECTS[i]  # the ith project.
-
             # 1. LLM call to improve the text quality of each duty
-            response = improve_text_quality(
+            response = await improve_text_quality(
                 PROMPT_IMPROVE_PROJECT,
                 PROJECT_i["project__title"] + "\n" + PROJECT_i["project__description"],
                 llm,
-                st.session_state.assistant_language,
+                language,
+                schema=ProjectImprovement,
             )
             response_content = response.content
 
             # 2. Convert response content to json dict with keys:
             # ('Score__project','Comments__project','Improvement__project')
 
-            response_content = response_content[
-                response_content.find("{") : response_content.rfind("}") + 1
-            ]
-
             try:
-                list_fields = [
-                    "Score__project",
-                    "Comments__project",
-                    "Improvement__project",
-                ]
-                list_rfind = [",\n", ",\n", "\n"]
-                list_exclude_first_car = [False, True, True]
-
-                response_content_dict = ResponseContent_Parser(
-                    response_content, list_fields, list_rfind, list_exclude_first_car
+                response_content_dict = parse_response(
+                    response_content, ProjectImprovement
                 )
-                try:
-                    response_content_dict["Score__project"] = int(
-                        response_content_dict["Score__project"]
-                    )
-                except:
-                    response_content_dict["Score__project"] = -1
 
             except Exception as e:
                 response_content_dict = {
@@ -967,6 +861,14 @@ def improve_projects(PROJECTS: list, llm):
             PROJECT_i["Comments__project"] = ""
             PROJECT_i["Improvement__project"] = ""
 
+    # Call LLM for all projects in parallel.
+    await fan_out(
+        improve_project,
+        PROJECTS,
+        provider=get_LLM_provider(llm),
+        label="project improvement",
+    )
+
     return PROJECTS
 
 
@@ -975,7 +877,7 @@ def improve_projects(PROJECTS: list, llm):
 ###############################################################################
 
 
-def Evaluate_the_Resume(llm, documents):
+async def Evaluate_the_Resume(llm, documents, language="english"):
     try:
         st.info(
             f"**{get_current_time()}** \tEvaluate, outline and analyse \
@@ -986,28 +888,19 @@ the resume's top 3 strengths and top 3 weaknesses..."
 the resume's top 3 strengths and top 3 weaknesses..."
         )
 
-        prompt_template = PromptTemplate.from_template(PROMPT_EVALUATE_RESUME)
+        with span("prompt_template", "prompt"):
+            prompt_template = get_prompt_template(
+                PROMPT_EVALUATE_RESUME, current_prompt_layout.get()
+            )
         prompt = prompt_template.format_prompt(
-            text=documents, language=st.session_state.assistant_language
+            resume=retrieval.format_documents(documents), language=language
         ).text
 
         # Invoke LLM
-        response = llm.invoke(prompt)
-        response_content = response.content[
-            response.content.find("{") : response.content.rfind("}") + 1
-        ]
-        try:
-            RESUME_EVALUATION = json.loads(response_content)
-        except Exception as e:
-            print("[ERROR] json.loads returns error:", e)
-            print("\n[INFO] Parse response content...\n")
-
-            list_fields = ["resume_cv_overview", "top_3_strengths", "top_3_weaknesses"]
-            list_rfind = [",\n", ",\n", "\n"]
-            list_exclude_first_car = [True, True, True]
-            RESUME_EVALUATION = ResponseContent_Parser(
-                response_content, list_fields, list_rfind, list_exclude_first_car
-            )
+        response = await call_LLM(llm, prompt, schema=ResumeEvaluation)
+        response_content = response.content
+
+        RESUME_EVALUATION = parse_response(response_content, ResumeEvaluation)
 
     except Exception as error:
         RESUME_EVALUATION = {
@@ -1020,6 +913,19 @@ the resume's top 3 strengths and top 3 weaknesses..."
     return RESUME_EVALUATION
 
 
+def get_average_score(items, score_key):
+    """Return the average of the valid scores (> -1) of a list of items (e.g. work experiences), or 0."""
+    scores = []
+    for item in items:
+        score = item[score_key]
+        if score > -1:
+            scores.append(score)
+    try:
+        return int(sum(scores) / len(scores))
+    except:
+        return 0
+
+
 def get_section_scores(SCANNED_RESUME):
     """Output in a dictionary the scores of all the sections of the resume (summary, skills...)"""
     dict_scores = {}
@@ -1046,26 +952,14 @@ def get_section_scores(SCANNED_RESUME):
     )
 
     # Work__experience: The score is the average of the scores of all the work experiences.
-    scores = []
-    for work_experience in SCANNED_RESUME["Work__experience"]:
-        score = work_experience["Score__WorkExperience"]
-        if score > -1:
-            scores.append(score)
-    try:
-        dict_scores["work_experience"] = int(sum(scores) / len(scores))
-    except:
-        dict_scores["work_experience"] = 0
+    dict_scores["work_experience"] = get_average_score(
+        SCANNED_RESUME["Work__experience"], "Score__WorkExperience"
+    )
 
     # Projects: The score is the average of the scores of all projects.
-    scores = []
-    for project in SCANNED_RESUME["CV__Projects"]:
-        score = project["Score__project"]
-        if score > -1:
-            scores.append(score)
-    try:
-        dict_scores["projects"] = int(sum(scores) / len(scores))
-    except:
-        dict_scores["projects"] = 0
+    dict_scores["projects"] = get_average_score(
+        SCANNED_RESUME["CV__Projects"], "Score__project"
+    )
 
     return dict_scores
 
@@ -1075,67 +969,281 @@ def get_section_scores(SCANNED_RESUME):
 ###############################################################################
 
 
-def resume_analyzer_main(llm, llm_creative, documents):
+def resume_analyzer_main(
+    llm,
+    llm_creative,
+    documents,
+    language="english",
+    retriever=None,
+    max_concurrency=MAX_CONCURRENT_STAGES,
+    result_key=None,
+    on_stage_done=None,
+    extraction_mode=DEFAULT_EXTRACTION_MODE,
+    save_results=True,
+    streaming=STREAMING,
+    on_field=None,
+    prompt_layout=DEFAULT_PROMPT_LAYOUT,
+):
     """Put it all together: Extract, evaluate and improve all resume sections.
+    Independent stages run concurrently; a stage starts as soon as its inputs are ready.
     Save the final results in a dictionary.
+    Parameters:
+     - llm, llm_creative: the deterministic and creative LLMs.
+     - documents: our Langchain Documents.
+     - language (str): the assistant language.
+     - retriever: the retriever used to find the documents relevant to each job and project
+        (None: the whole resume is used for each job and project).
+     - max_concurrency (int): maximum number of stages running at the same time.
+     - result_key (str): if not None, the results are indexed with this key (see results_store.get_result_key).
+     - on_stage_done: if not None, function called with (stage_name, result) as soon as a stage is done.
+        Used to display the results progressively.
+     - extraction_mode (str): "multi_call": one LLM call per section group (see EXTRACTION_STAGES);
+        "single_call": all the sections are extracted with a single LLM call.
+        Sections missing from the single-call response are extracted again with their own call.
+     - save_results (bool): save the results to RESULTS_DIR (see results_store.save_result).
+     - streaming (bool): stream the extraction responses. The duties of each work experience and the details
+        of each project are extracted as soon as the item is streamed, before the end of the extraction response.
+     - on_field: if not None (and streaming), function called with (path, value) for each field
+        of the extraction responses as soon as it is streamed (see json_scanner.JSONStreamScanner).
+        Used to display the extracted sections before their analysis is done.
+     - prompt_layout (str): layout of the prompts on the whole resume, in PROMPT_LAYOUTS.
+        "resume_first": all these prompts start with the same prefix (the resume), which the provider
+        prompt cache serves to the calls after the first ones (see prompt_templates.py).
     """
-    # 1. Extract Contact information: Name, Title, Location, Email,...
-    CONTACT_INFORMATION = Extract_contact_information(llm, documents)
+    provider = get_LLM_provider(llm)
 
-    # 2. Extract, evaluate and improve the Summary
-    Summary_SECTION = Extract_Evaluate_Summary(llm, documents)
+    async def extract_duties_early(Work_experience_i):
+        query = get_job_query(Work_experience_i)
+        relevant_documents = await get_items_relevant_documents(
+            [query], documents, retriever
+        )
+        return await extract_work_duties(llm, query, relevant_documents[0])
 
-    # 3. Extract and evaluate education and language sections.
-    Education_Language_sections = Extract_Education_Language(llm, documents)
+    async def extract_details_early(project_i):
+        query = get_project_query(project_i)
+        relevant_documents = await get_items_relevant_documents(
+            [query], documents, retriever
+        )
+        return await extract_project_description(llm, query, relevant_documents[0])
 
-    # 4. Extract and evaluate the SKILLS.
-    SKILLS_and_CERTIF = Extract_Skills_and_Certifications(llm, documents)
+    # Streaming: the work experiences and projects are processed as soon as they are streamed (early starts).
+    job_early_starts = project_early_starts = None
+    if streaming:
+        job_early_starts = EarlyStarts(
+            extract_duties_early, provider, "Job_Responsibilities", "work experience"
+        )
+        project_early_starts = EarlyStarts(
+            extract_details_early, provider, "Project_Details", "project"
+        )
+    early_start_items = {
+        "Work__experience": (job_early_starts, WorkExperience, "job__title"),
+        "CV__Projects": (project_early_starts, Project, "project__title"),
+    }
+
+    def on_extracted_field(path, value):
+        """Called with each field of the streamed extraction responses."""
+        if on_field is not None:
+            try:
+                on_field(path, value)
+            except Exception as e:
+                print(f"[ERROR] on_field {path}: {e}")
+        if len(path) == 2 and path[0] in early_start_items:
+            early_starts, schema, title_key = early_start_items[path[0]]
+            try:
+                item = validate_response(schema, value)
+            except Exception:
+                return
+            if item[title_key] != "unknown":
+                query_function = (
+                    get_job_query
+                    if path[0] == "Work__experience"
+                    else get_project_query
+                )
+                early_starts.start(query_function(item), item)
 
-    # 5. Extract Work Experience and Projects.
-    PROFESSIONAL_EXPERIENCE = Extract_PROFESSIONAL_EXPERIENCE(llm, documents)
+    field_callback = on_extracted_field if streaming else None
 
-    # 6. EXTRACT WORK EXPERIENCE RESPONSIBILITIES.
-    PROFESSIONAL_EXPERIENCE = Extract_Job_Responsibilities(
-        llm, documents, PROFESSIONAL_EXPERIENCE
-    )
+    async def extract_job_responsibilities(PROFESSIONAL_EXPERIENCE):
+        return await Extract_Job_Responsibilities(
+            llm, documents, PROFESSIONAL_EXPERIENCE, retriever, job_early_starts
+        )
 
-    # 7. EXTRACT PROJECT DETAILS.
-    PROFESSIONAL_EXPERIENCE = Extract_Project_Details(
-        llm, documents, PROFESSIONAL_EXPERIENCE
-    )
+    async def extract_project_details(PROFESSIONAL_EXPERIENCE):
+        return await Extract_Project_Details(
+            llm, documents, PROFESSIONAL_EXPERIENCE, retriever, project_early_starts
+        )
 
-    # 8. Improve the quality of the work experience section.
-    PROFESSIONAL_EXPERIENCE["Work__experience"] = improve_work_experience(
-        WORK_EXPERIENCE=PROFESSIONAL_EXPERIENCE["Work__experience"], llm=llm_creative
-    )
+    async def improve_work_experience_stage(PROFESSIONAL_EXPERIENCE):
+        return await improve_work_experience(
+            WORK_EXPERIENCE=PROFESSIONAL_EXPERIENCE["Work__experience"],
+            llm=llm_creative,
+            language=language,
+        )
+
+    async def improve_projects_stage(PROFESSIONAL_EXPERIENCE):
+        return await improve_projects(
+            PROJECTS=PROFESSIONAL_EXPERIENCE["CV__Projects"],
+            llm=llm_creative,
+            language=language,
+        )
+
+    # The analysis DAG: {stage: (coroutine function, [dependencies])}
+    stages = {
+        # 1. Extract Contact information: Name, Title, Location, Email,...
+        "CONTACT_INFORMATION": (
+            lambda: Extract_contact_information(
+                llm, documents, language, on_field=field_callback
+            ),
+            [],
+        ),
+        # 2. Extract, evaluate and improve the Summary
+        "Summary_SECTION": (
+            lambda: Extract_Evaluate_Summary(
+                llm, documents, language, on_field=field_callback
+            ),
+            [],
+        ),
+        # 3. Extract and evaluate education and language sections.
+        "Education_Language_sections": (
+            lambda: Extract_Education_Language(
+                llm, documents, language, on_field=field_callback
+            ),
+            [],
+        ),
+        # 4. Extract and evaluate the SKILLS.
+        "SKILLS_and_CERTIF": (
+            lambda: Extract_Skills_and_Certifications(
+                llm, documents, language, on_field=field_callback
+            ),
+            [],
+        ),
+        # 5. Extract Work Experience and Projects.
+        "PROFESSIONAL_EXPERIENCE": (
+            lambda: Extract_PROFESSIONAL_EXPERIENCE(
+                llm, documents, language, on_field=field_callback
+            ),
+            [],
+        ),
+        # 6. EXTRACT WORK EXPERIENCE RESPONSIBILITIES.
+        "Job_Responsibilities": (
+            extract_job_responsibilities,
+            ["PROFESSIONAL_EXPERIENCE"],
+        ),
+        # 7. EXTRACT PROJECT DETAILS.
+        "Project_Details": (extract_project_details, ["PROFESSIONAL_EXPERIENCE"]),
+        # 8. Improve the quality of the work experience section.
+        "Work__experience": (
+            improve_work_experience_stage,
+            ["Job_Responsibilities"],
+        ),
+        # 9. Improve the quality of the project section.
+        "CV__Projects": (improve_projects_stage, ["Project_Details"]),
+        # 10. Evaluate the Resume
+        "RESUME_EVALUATION": (
+            lambda: Evaluate_the_Resume(llm_creative, documents, language),
+            [],
+        ),
+    }
+
+    if extraction_mode == "single_call":
+        # One LLM call extracts all the sections; each extraction stage splits its sections from the response.
+        extraction_functions = {
+            "CONTACT_INFORMATION": Extract_contact_information,
+            "Summary_SECTION": Extract_Summary,
+            "Education_Language_sections": Extract_Education_Language,
+            "SKILLS_and_CERTIF": Extract_Skills_and_Certifications,
+            "PROFESSIONAL_EXPERIENCE": Extract_PROFESSIONAL_EXPERIENCE,
+        }
+
+        def split_stage(stage_name):
+            async def stage_function(ALL_SECTIONS):
+                STAGE_SECTIONS = split_all_sections(ALL_SECTIONS, stage_name)
+                if STAGE_SECTIONS is None:
+                    print(
+                        f"[INFO] '{stage_name}' not found in the single-call response, extract it again."
+                    )
+                    STAGE_SECTIONS = await extraction_functions[stage_name](
+                        llm, documents, language, on_field=field_callback
+                    )
+                return STAGE_SECTIONS
+
+            return stage_function
+
+        async def evaluate_summary(SUMMARY_SECTION):
+            return await Extract_Evaluate_Summary(
+                llm, documents, language, SUMMARY_SECTION=SUMMARY_SECTION
+            )
 
-    # 9. Improve the quality of the project section.
-    PROFESSIONAL_EXPERIENCE["CV__Projects"] = improve_projects(
-        PROJECTS=PROFESSIONAL_EXPERIENCE["CV__Projects"], llm=llm_creative
+        stages["ALL_SECTIONS"] = (
+            lambda: Extract_All_Sections(
+                llm, documents, language, on_field=field_callback
+            ),
+            [],
+        )
+        for stage_name in extraction_functions:
+            stages[stage_name] = (split_stage(stage_name), ["ALL_SECTIONS"])
+        # The summary is extracted by the single call, then evaluated.
+        stages["Summary_EXTRACTION"] = stages.pop("Summary_SECTION")
+        stages["Summary_SECTION"] = (evaluate_summary, ["Summary_EXTRACTION"])
+
+    # Token count of the resume in the prompts
+    try:
+        tokens = retrieval.compare_prompt_tokens(documents)
+        print(
+            f"[INFO] resume in prompts: {tokens['compact_tokens']} tokens "
+            f"(instead of {tokens['repr_tokens']} tokens with the Document repr)"
+        )
+    except Exception as e:
+        print(f"[ERROR] Could not count the resume tokens: {e}")
+
+    run_usage = track_run()
+    parse_stats = track_parsing()
+    current_prompt_layout.set(prompt_layout)
+    # The stages run on a pooled event loop: its async clients keep their connections for the next analyses.
+    results = run_async(
+        run_stages(stages, max_concurrency=max_concurrency, on_stage_done=on_stage_done)
     )
 
-    # 10. Evaluate the Resume
-    RESUME_EVALUATION = Evaluate_the_Resume(llm_creative, documents)
+    PROFESSIONAL_EXPERIENCE = results["PROFESSIONAL_EXPERIENCE"]
+    PROFESSIONAL_EXPERIENCE["Work__experience"] = results["Work__experience"]
+    PROFESSIONAL_EXPERIENCE["CV__Projects"] = results["CV__Projects"]
 
     # 11. Put it all together: create the SCANNED_RESUME dictionary
     SCANNED_RESUME = {}
     for dictionary in [
-        CONTACT_INFORMATION,
-        Summary_SECTION,
-        Education_Language_sections,
-        SKILLS_and_CERTIF,
+        results["CONTACT_INFORMATION"],
+        results["Summary_SECTION"],
+        results["Education_Language_sections"],
+        results["SKILLS_and_CERTIF"],
         PROFESSIONAL_EXPERIENCE,
-        RESUME_EVALUATION,
+        results["RESUME_EVALUATION"],
     ]:
         SCANNED_RESUME.update(dictionary)
 
+    # Tokens and estimated cost of the analysis
+    SCANNED_RESUME["Token__usage"] = run_usage.as_dict()
+    totals = SCANNED_RESUME["Token__usage"]["total"]
+    print(
+        f"[INFO] {totals['calls']} LLM calls ({totals['cached_calls']} cached): "
+        f"{totals['prompt_tokens']} prompt tokens ({totals['cached_prompt_tokens']} from the prompt cache), "
+        f"{totals['completion_tokens']} completion tokens, "
+        f"estimated cost ${totals['cost_usd']:.4f}"
+    )
+
+    # Parse outcomes of the LLM responses (see structured_output.py)
+    SCANNED_RESUME["Parse__stats"] = parse_stats.as_dict()
+    parse_totals = SCANNED_RESUME["Parse__stats"]["total"]
+    print(
+        f"[INFO] LLM responses: {parse_totals['valid']} valid, "
+        f"{parse_totals['repaired']} repaired, {parse_totals['failed']} failed "
+        f"(failure rate {100 * parse_totals['failure_rate']:.1f}%)"
+    )
+
     # 12. Save the Scanned resume
-    try:
-        now = (datetime.datetime.now()).strftime("%Y%m%d_%H%M%S")
-        file_name = "results_" + now
-        with open(f"./data/{file_name}.json", "w") as fp:
-            json.dump(SCANNED_RESUME, fp)
-    except:
-        pass
+    if save_results:
+        try:
+            save_result(SCANNED_RESUME, result_key)
+        except Exception as e:
+            print(f"[ERROR] Could not save the results: {e}")
 
     return SCANNED_RESUME
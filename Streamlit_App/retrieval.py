@@ -2,7 +2,7 @@
 import streamlit as st
 
 # document loader
-from langchain_community.document_loaders import PDFMinerLoader
+from pdf_parser import parse_pdf
 
 # text_splitter
 from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -16,36 +16,75 @@ from langchain_community.llms import Cohere
 from langchain_openai import OpenAIEmbeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+from langchain_core.embeddings import Embeddings
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStoreRetriever
+
+# Embeddings cache
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+
 # FAISS vector database
 from langchain_community.vectorstores import FAISS
+from numpy_vectorstore import NumpyVectorStore
 
 # Other libraries
-import os, glob, datetime
+import asyncio, os, datetime, re
 from pathlib import Path
-import tiktoken
 import warnings
 
 warnings.filterwarnings("ignore", category=FutureWarning)
 
 
-# Data Directories: where temp files and vectorstores will be saved
-from app_constants import TMP_DIR
-
-
-def langchain_document_loader(file_path):
+# Data Directories: where the embeddings cache is saved
+from app_constants import (
+    EMBEDDINGS_CACHE_DIR,
+    NUMPY_VECTORSTORE_MAX_CHUNKS,
+    DEFAULT_RERANKER,
+    LOCAL_RERANKER_DENSE_WEIGHT,
+    RETRIEVAL_TOKEN_BUDGET,
+)
+from local_reranker import HybridReranker
+from rate_limiter import get_rate_limiter, estimate_tokens
+from token_accounting import count_tokens
+from fake_models import FakeEmbeddings, FakeReranker
+from tracing import span
+from client_registry import (
+    get_client,
+    create_openai_client,
+    get_cohere_client,
+    bind_to_running_loop,
+)
+
+
+def langchain_document_loader(file_path, file_bytes=None, use_cache=True):
     """Load and split a PDF file in Langchain.
     Parameters:
-        - file_path (str): path of the file.
+        - file_path (str): path of the file, or name of the uploaded file when file_bytes is given.
+        - file_bytes (bytes): content of the uploaded file. The PDF is parsed in memory: nothing is written to disk.
+        - use_cache (bool): read and save the page texts in the page cache (see pdf_parser.parse_pdf).
     Output:
         - documents: list of Langchain Documents."""
 
-    if file_path.endswith(".pdf"):
-        loader = PDFMinerLoader(file_path=file_path)
-    else:
+    if not file_path.endswith(".pdf"):
         st.error("You can only upload .pdf files!")
 
     # 1. Load and split documents
-    documents = loader.load_and_split()
+    with span(
+        "pdf_loading",
+        "ingestion",
+        file=os.path.basename(file_path),
+        in_memory=file_bytes is not None,
+    ) as attributes:
+        if file_bytes is None:
+            with open(file_path, "rb") as f:
+                file_bytes = f.read()
+        # The pages are parsed in parallel (see pdf_parser), then concatenated like PDFMinerLoader does.
+        text = "".join(parse_pdf(file_bytes, use_cache=use_cache))
+        documents = RecursiveCharacterTextSplitter().split_documents(
+            [Document(page_content=text, metadata={"source": file_path})]
+        )
+        attributes["chunks"] = len(documents)
 
     # 2. Update the metadata: add document number to metadata
     for i in range(len(documents)):
@@ -57,64 +96,284 @@ def langchain_document_loader(file_path):
     return documents
 
 
-def delte_temp_files():
-    """delete temp files from TMP_DIR"""
-    files = glob.glob(TMP_DIR.as_posix() + "/*")
-    for f in files:
-        try:
-            os.remove(f)
-        except:
-            pass
+def tiktoken_tokens(documents, model="gpt-3.5-turbo-0125"):
+    """Use tiktoken (tokeniser for OpenAI models) to return a list of token length per document."""
 
+    return count_tokens(documents, model)
+
+
+def remove_overlap(previous_text, text, min_overlap=10):
+    """Remove from `text` its beginning if it repeats the end of `previous_text` (text splitters add an overlap).
+    Overlaps shorter than `min_overlap` characters are kept: they may be a coincidence.
+    """
+    for overlap in range(min(len(previous_text), len(text)), min_overlap - 1, -1):
+        if previous_text.endswith(text[:overlap]):
+            return text[overlap:]
+    return text
 
-def save_uploaded_file(uploaded_file):
-    """Save the uploaded file (output of the Streamlit File Uploader widget) to TMP_DIR."""
 
-    temp_file_path = ""
-    try:
-        temp_file_path = os.path.join(TMP_DIR.as_posix(), uploaded_file.name)
-        with open(temp_file_path, "wb") as temp_file:
-            temp_file.write(uploaded_file.read())
-        return temp_file_path
-    except Exception as error:
-        st.error(f"An error occured: {error}")
+def format_documents(documents):
+    """Render Langchain Documents as compact plain text to be inserted in prompts.
+    Unlike the Python repr of the Documents, there is no `page_content=`, no metadata and no escaped newlines.
+    The overlap between consecutive chunks is removed, and whitespace is collapsed.
+    """
+    texts = []
+    previous = None
+    for doc in documents:
+        text = doc.page_content
+        if (
+            previous is not None
+            and doc.metadata.get("doc_number") is not None
+            and doc.metadata.get("doc_number")
+            == previous.metadata.get("doc_number", -2) + 1
+        ):
+            text = remove_overlap(previous.page_content, text)
+        texts.append(text)
+        previous = doc
+
+    text = "\n".join(texts).replace("\x0c", "\n")
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)  # at most one blank line
+
+    return text.strip()
+
+
+def compare_prompt_tokens(documents):
+    """Compare the token count of the documents rendered with their Python repr and with format_documents."""
+    repr_tokens, compact_tokens = tiktoken_tokens(
+        [str(documents), format_documents(documents)]
+    )
+    return {"repr_tokens": repr_tokens, "compact_tokens": compact_tokens}
 
-    return temp_file_path
 
+def select_embeddings_model(LLM_service="OpenAI", api_key=None, use_cache=True):
+    """Select the Embeddings model: OpenAIEmbeddings or GoogleGenerativeAIEmbeddings.
+    The model is wrapped in a local disk cache (see `cache_embeddings`).
+    The model is created once per process for the same parameters and reused (see client_registry.py).
+    Parameters:
+        LLM_service (str): in ["OpenAI","Google","Fake"]
+        api_key (str): openai_api_key or google_api_key
+        use_cache (bool): if False, the embeddings are not cached.
+    """
 
-def tiktoken_tokens(documents, model="gpt-3.5-turbo-0125"):
-    """Use tiktoken (tokeniser for OpenAI models) to return a list of token length per document."""
+    def create_embeddings():
+        if LLM_service == "OpenAI":
+            embeddings = create_openai_client(OpenAIEmbeddings, api_key)
 
-    # Get the encoding used by the model.
-    encoding = tiktoken.encoding_for_model(model)
+        if LLM_service == "Google":
+            embeddings = GoogleGenerativeAIEmbeddings(
+                model="models/embedding-001", google_api_key=api_key
+            )
 
-    # Calculate the token length of documents
-    tokens_length = [len(encoding.encode(doc)) for doc in documents]
+        if LLM_service == "Fake":
+            embeddings = FakeEmbeddings()
 
-    return tokens_length
+        # The rate limiter is applied before the cache: embeddings read from the cache are not counted.
+        rate_limited_embeddings = RateLimitedEmbeddings(
+            embeddings, LLM_service, api_key
+        )
+        if not use_cache:
+            return rate_limited_embeddings
+        return cache_embeddings(
+            rate_limited_embeddings, namespace=f"{LLM_service}_{embeddings.model}"
+        )
 
+    return get_client(
+        "embeddings", LLM_service, None, api_key, create_embeddings, use_cache=use_cache
+    )
 
-def select_embeddings_model(LLM_service="OpenAI"):
-    """Select the Embeddings model: OpenAIEmbeddings or GoogleGenerativeAIEmbeddings."""
 
-    if LLM_service == "OpenAI":
-        embeddings = OpenAIEmbeddings(api_key=st.session_state.openai_api_key)
+class RateLimitedEmbeddings(Embeddings):
+    """Wrap an embeddings model: each call waits for the rate limit of the provider and API key.
+    The async calls use the connections of the running event loop (see client_registry.py).
+    """
 
-    if LLM_service == "Google":
-        embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001", google_api_key=st.session_state.google_api_key
-        )
+    def __init__(self, embeddings, provider, api_key=None):
+        self.embeddings = embeddings
+        self.provider = provider
+        self.api_key = api_key
+
+    def _get_rate_limiter(self):
+        return get_rate_limiter(self.provider, self.api_key)
+
+    def embed_documents(self, texts):
+        rate_limiter = self._get_rate_limiter()
+        if rate_limiter is not None:
+            rate_limiter.acquire(tokens=sum(estimate_tokens(text) for text in texts))
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        rate_limiter = self._get_rate_limiter()
+        if rate_limiter is not None:
+            rate_limiter.acquire(tokens=estimate_tokens(text))
+        return self.embeddings.embed_query(text)
+
+    async def aembed_documents(self, texts):
+        rate_limiter = self._get_rate_limiter()
+        if rate_limiter is not None:
+            await rate_limiter.aacquire(
+                tokens=sum(estimate_tokens(text) for text in texts)
+            )
+        return await bind_to_running_loop(self.embeddings).aembed_documents(texts)
+
+    async def aembed_query(self, text):
+        rate_limiter = self._get_rate_limiter()
+        if rate_limiter is not None:
+            await rate_limiter.aacquire(tokens=estimate_tokens(text))
+        return await bind_to_running_loop(self.embeddings).aembed_query(text)
+
+    async def aembed_queries(self, texts):
+        """Embed several queries in one request (one rate limit reservation)."""
+        if isinstance(self.embeddings, GoogleGenerativeAIEmbeddings):
+            # Google embeds queries and documents with different task types: one request per query.
+            return await asyncio.gather(*[self.aembed_query(text) for text in texts])
+        rate_limiter = self._get_rate_limiter()
+        if rate_limiter is not None:
+            await rate_limiter.aacquire(
+                tokens=sum(estimate_tokens(text) for text in texts)
+            )
+        return await bind_to_running_loop(self.embeddings).aembed_documents(texts)
+
+
+def cache_embeddings(embeddings, namespace):
+    """Wrap the embeddings model in a CacheBackedEmbeddings stored in EMBEDDINGS_CACHE_DIR.
+    Chunk embeddings are keyed by (namespace, hash of the chunk text): unchanged chunks are read from disk,
+    and all the missing chunks are embedded in a single batched call.
+    Parameters:
+        - embeddings: the underlying Langchain embeddings model.
+        - namespace (str): identifies the embeddings model, to avoid collisions between models.
+    """
+    store = LocalFileStore(EMBEDDINGS_CACHE_DIR.as_posix())
 
-    return embeddings
+    cached_embeddings = CacheBackedEmbeddings.from_bytes_store(
+        underlying_embeddings=embeddings,
+        document_embedding_cache=store,
+        namespace=namespace.replace("/", "_") + "_",
+    )
+    return cached_embeddings
 
 
-def create_vectorstore(embeddings, documents):
-    """Create a Faiss vector database."""
-    vector_store = FAISS.from_documents(documents=documents, embedding=embeddings)
+def create_vectorstore(embeddings, documents, vectorstore_type=None):
+    """Create the vector database of the documents.
+    Parameters:
+        vectorstore_type (str): "numpy" (brute-force NumPy search) or "faiss".
+            Default: "numpy" below NUMPY_VECTORSTORE_MAX_CHUNKS chunks, "faiss" otherwise.
+    """
+    if vectorstore_type is None:
+        if len(documents) < NUMPY_VECTORSTORE_MAX_CHUNKS:
+            vectorstore_type = "numpy"
+        else:
+            vectorstore_type = "faiss"
+    vectorstore_class = NumpyVectorStore if vectorstore_type == "numpy" else FAISS
+
+    with span(
+        "vectorstore_creation",
+        "retrieval",
+        chunks=len(documents),
+        vectorstore_type=vectorstore_type,
+    ):
+        vector_store = vectorstore_class.from_documents(
+            documents=documents, embedding=embeddings
+        )
 
     return vector_store
 
 
+class ScoredVectorStoreRetriever(VectorStoreRetriever):
+    """Vectorstore-backed retriever adding the relevance score of the similarity search
+    to the metadata of the retrieved documents (`dense_score`, in [0, 1]), for the local reranker.
+    """
+
+    def _add_scores(self, docs_and_scores):
+        return [
+            Document(
+                page_content=doc.page_content,
+                metadata=dict(doc.metadata, dense_score=score),
+            )
+            for doc, score in docs_and_scores
+        ]
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        if self.search_type not in ["similarity", "similarity_score_threshold"]:
+            return super()._get_relevant_documents(query, run_manager=run_manager)
+        return self._add_scores(
+            self.vectorstore.similarity_search_with_relevance_scores(
+                query, **self.search_kwargs
+            )
+        )
+
+    async def _aget_relevant_documents(self, query, *, run_manager):
+        if self.search_type not in ["similarity", "similarity_score_threshold"]:
+            return await super()._aget_relevant_documents(
+                query, run_manager=run_manager
+            )
+        return self._add_scores(
+            await self.vectorstore.asimilarity_search_with_relevance_scores(
+                query, **self.search_kwargs
+            )
+        )
+
+    async def abatch_get_relevant_documents(self, queries):
+        """Retrieve the documents of several queries: the queries are embedded with one embeddings call,
+        then searched together (a single matrix product with the NumPy vector store).
+        Output:
+            the list of retrieved documents of each query (with their `dense_score`).
+        """
+        embeddings = self.vectorstore.embeddings
+        if (
+            self.search_type not in ["similarity", "similarity_score_threshold"]
+            or embeddings is None
+        ):
+            return await asyncio.gather(
+                *[self.aget_relevant_documents(query) for query in queries]
+            )
+
+        query_embeddings = await aembed_queries(embeddings, queries)
+        k = self.search_kwargs.get("k", 4)
+        if isinstance(self.vectorstore, NumpyVectorStore):
+            results = self.vectorstore.similarity_search_with_score_by_vectors(
+                query_embeddings, k
+            )
+        else:
+            results = [
+                self.vectorstore.similarity_search_with_score_by_vector(
+                    query_embedding, k
+                )
+                for query_embedding in query_embeddings
+            ]
+
+        relevance_score_fn = self.vectorstore._select_relevance_score_fn()
+        score_threshold = self.search_kwargs.get("score_threshold")
+        retrieved_docs = []
+        for docs_and_scores in results:
+            docs_and_scores = [
+                (doc, relevance_score_fn(score)) for doc, score in docs_and_scores
+            ]
+            if score_threshold is not None:
+                docs_and_scores = [
+                    (doc, score)
+                    for doc, score in docs_and_scores
+                    if score >= score_threshold
+                ]
+            retrieved_docs.append(self._add_scores(docs_and_scores))
+        return retrieved_docs
+
+
+async def aembed_queries(embeddings, queries):
+    """Embed the queries with a single embeddings call when the model allows it.
+    The query embeddings are not saved in the embeddings cache."""
+    if isinstance(embeddings, CacheBackedEmbeddings):
+        embeddings = embeddings.underlying_embeddings
+    if isinstance(embeddings, RateLimitedEmbeddings):
+        return await embeddings.aembed_queries(queries)
+    if isinstance(embeddings, GoogleGenerativeAIEmbeddings):
+        return await asyncio.gather(
+            *[embeddings.aembed_query(query) for query in queries]
+        )
+    return await embeddings.aembed_documents(queries)
+
+
 def Vectorstore_backed_retriever(
     vectorstore, search_type="similarity", k=4, score_threshold=None
 ):
@@ -131,12 +390,22 @@ def Vectorstore_backed_retriever(
     if score_threshold is not None:
         search_kwargs["score_threshold"] = score_threshold
 
-    retriever = vectorstore.as_retriever(
-        search_type=search_type, search_kwargs=search_kwargs
+    retriever = ScoredVectorStoreRetriever(
+        vectorstore=vectorstore, search_type=search_type, search_kwargs=search_kwargs
     )
     return retriever
 
 
+class RateLimitedCohereRerank(CohereRerank):
+    """CohereRerank compressor waiting for the Cohere rate limit (of its API key) before each rerank call."""
+
+    def compress_documents(self, documents, query, callbacks=None):
+        rate_limiter = get_rate_limiter("Cohere", self.cohere_api_key)
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        return super().compress_documents(documents, query, callbacks=callbacks)
+
+
 def CohereRerank_retriever(
     base_retriever, cohere_api_key, cohere_model="rerank-multilingual-v2.0", top_n=4
 ):
@@ -146,11 +415,26 @@ def CohereRerank_retriever(
        cohere_api_key: the Cohere API key
        cohere_model: The Cohere model can be either 'rerank-english-v2.0' or 'rerank-multilingual-v2.0', with the latter being the default.
        top_n: top n results returned by Cohere rerank, default = 4.
+    If cohere_model is "fake", the fake reranker is used (see fake_models).
+    The Cohere compressor is created once per process for the same parameters and reused (see client_registry.py).
     """
 
-    compressor = CohereRerank(
-        cohere_api_key=cohere_api_key, model=cohere_model, top_n=top_n
-    )
+    if cohere_model == "fake":
+        compressor = FakeReranker(top_n=top_n)
+    else:
+        compressor = get_client(
+            "rerank",
+            "Cohere",
+            cohere_model,
+            cohere_api_key,
+            lambda: RateLimitedCohereRerank(
+                client=get_cohere_client(cohere_api_key),
+                cohere_api_key=cohere_api_key,
+                model=cohere_model,
+                top_n=top_n,
+            ),
+            top_n=top_n,
+        )
 
     retriever_Cohere = ContextualCompressionRetriever(
         base_compressor=compressor, base_retriever=base_retriever
@@ -158,43 +442,159 @@ def CohereRerank_retriever(
     return retriever_Cohere
 
 
+def Hybrid_reranker_retriever(
+    base_retriever, documents, top_n=4, dense_weight=LOCAL_RERANKER_DENSE_WEIGHT
+):
+    """Build a ContextualCompressionRetriever using the local hybrid reranker (BM25 + dense similarity).
+    Parameters:
+       base_retriever: a Vectorstore-backed retriever (ScoredVectorStoreRetriever, for the dense scores)
+       documents: all the Langchain Documents of the resume (BM25 statistics)
+       top_n: top n results returned by the reranker, default = 4.
+       dense_weight: weight of the dense similarity in the relevance score.
+    """
+    compressor = HybridReranker.from_documents(
+        documents, top_n=top_n, dense_weight=dense_weight
+    )
+    return ContextualCompressionRetriever(
+        base_compressor=compressor, base_retriever=base_retriever
+    )
+
+
+async def abatch_retrieve(retriever, queries):
+    """Retrieve the documents of several queries at once.
+    With a reranking retriever over a ScoredVectorStoreRetriever, the queries are embedded and searched together,
+    then reranked: in bulk with the local reranker, or with concurrent requests with Cohere
+    (the Cohere rerank API takes one query per request).
+    Other retrievers are called once per query, concurrently.
+    Output:
+        the list of retrieved documents of each query (with their `relevance_score` after reranking).
+    """
+    if not queries:
+        return []
+    if not (
+        isinstance(retriever, ContextualCompressionRetriever)
+        and isinstance(retriever.base_retriever, ScoredVectorStoreRetriever)
+    ):
+        return await asyncio.gather(
+            *[retriever.aget_relevant_documents(query) for query in queries]
+        )
+
+    retrieved_docs = await retriever.base_retriever.abatch_get_relevant_documents(
+        queries
+    )
+    return await asyncio.gather(
+        *[
+            retriever.base_compressor.acompress_documents(docs, query)
+            for docs, query in zip(retrieved_docs, queries)
+        ]
+    )
+
+
+def use_retrieval(documents, token_budget=RETRIEVAL_TOKEN_BUDGET):
+    """Return True if the resume is long enough for the retrieval to shorten the prompts:
+    its text (as inserted in the prompts) is over token_budget tokens."""
+    with span(
+        "retrieval_decision", "retrieval", token_budget=token_budget
+    ) as attributes:
+        resume_tokens = tiktoken_tokens([format_documents(documents)])[0]
+        attributes["resume_tokens"] = resume_tokens
+        attributes["use_retrieval"] = resume_tokens > token_budget
+    return attributes["use_retrieval"]
+
+
+def create_retriever(
+    documents,
+    LLM_provider,
+    api_key,
+    cohere_api_key,
+    use_embeddings_cache=True,
+    reranker=DEFAULT_RERANKER,
+    retrieval_token_budget=RETRIEVAL_TOKEN_BUDGET,
+):
+    """Create the vector database of the documents (NumPy or FAISS, see create_vectorstore) and the reranking retriever.
+    If the resume is under retrieval_token_budget tokens, the retrieval is skipped (see use_retrieval):
+    None, None is returned and the whole resume is sent in the prompts.
+    Parameters:
+        documents: our Langchain Documents.
+        LLM_provider (str): in ["OpenAI","Google","Fake"]; selects the embeddings model.
+            With "Fake", the fake embeddings (and the fake Cohere reranker) are used.
+        api_key (str): openai_api_key or google_api_key
+        cohere_api_key (str): the Cohere API key (only used by the "cohere" reranker)
+        use_embeddings_cache (bool): read and save the chunk embeddings in the local disk cache.
+        reranker (str): in RERANKERS: "local" (BM25 + dense similarity) or "cohere" (Cohere rerank API).
+        retrieval_token_budget (int): resume length (tokens) under which the retrieval is skipped.
+    Output:
+        vector_store, retriever
+    """
+
+    # 0. Short resume: no retrieval
+    if not use_retrieval(documents, retrieval_token_budget):
+        print(
+            f"[INFO] The resume is under {retrieval_token_budget} tokens: retrieval skipped."
+        )
+        return None, None
+
+    # 1. Embeddings
+    embeddings = select_embeddings_model(LLM_provider, api_key, use_embeddings_cache)
+
+    # 2. Create a vector database
+    vector_store = create_vectorstore(embeddings=embeddings, documents=documents)
+
+    # 3. Create the reranking retriever
+    base_retriever = Vectorstore_backed_retriever(
+        vector_store, "similarity", k=min(4, len(documents))
+    )
+    if reranker == "local":
+        retriever = Hybrid_reranker_retriever(
+            base_retriever=base_retriever,
+            documents=documents,
+            top_n=min(2, len(documents)),
+        )
+    else:
+        retriever = CohereRerank_retriever(
+            base_retriever=base_retriever,
+            cohere_api_key=cohere_api_key,
+            cohere_model=(
+                "fake" if LLM_provider == "Fake" else "rerank-multilingual-v2.0"
+            ),
+            top_n=min(2, len(documents)),
+        )
+
+    return vector_store, retriever
+
+
 def retrieval_main():
     """Create a Langchain retrieval, which includes document loaders to upload the resume,
-    embeddings to create a numerical representation of the text, FAISS vector database to store the embeddings,
-    and CohereRerank retriever to find the most relevant documents.
+    embeddings to create a numerical representation of the text, a vector database (NumPy or FAISS) to store the embeddings,
+    and a reranking retriever (local or CohereRerank) to find the most relevant documents.
     """
 
-    # 1. Delete old temp files from TMP directory.
-    delte_temp_files()
-
     if st.session_state.uploaded_file is not None:
-        # 2. Save uploaded_file to TMP directory.
-        saved_file_path = save_uploaded_file(st.session_state.uploaded_file)
-
-        # 3. Load documents with Langchain loaders
-        documents = langchain_document_loader(saved_file_path)
+        # 1. Load documents from the uploaded file, in memory (no temp file shared between sessions)
+        documents = langchain_document_loader(
+            st.session_state.uploaded_file.name,
+            file_bytes=st.session_state.uploaded_file.getvalue(),
+        )
         st.session_state.documents = documents
 
-        # 4. Embeddings
-        embeddings = select_embeddings_model(st.session_state.LLM_provider)
-
-        # 5. Create a Faiss vector database
+        # 2. Create the vector database and the reranking retriever
+        if st.session_state.LLM_provider == "OpenAI":
+            api_key = st.session_state.openai_api_key
+        else:
+            api_key = st.session_state.google_api_key
         try:
-            st.session_state.vector_store = create_vectorstore(
-                embeddings=embeddings, documents=documents
-            )
-
-            # 6. Create CohereRerank retriever
-            base_retriever = Vectorstore_backed_retriever(
-                st.session_state.vector_store, "similarity", k=min(4, len(documents))
-            )
-            st.session_state.retriever = CohereRerank_retriever(
-                base_retriever=base_retriever,
-                cohere_api_key=st.session_state.cohere_api_key,
-                cohere_model="rerank-multilingual-v2.0",
-                top_n=min(2, len(documents)),
+            st.session_state.vector_store, st.session_state.retriever = (
+                create_retriever(
+                    documents,
+                    LLM_provider=st.session_state.LLM_provider,
+                    api_key=api_key,
+                    cohere_api_key=st.session_state.cohere_api_key,
+                    reranker=st.session_state.reranker,
+                    retrieval_token_budget=st.session_state.retrieval_token_budget,
+                )
             )
         except Exception as error:
+            st.session_state.retriever = None
             st.error(f"An error occured:\n {error}")
 
     else:
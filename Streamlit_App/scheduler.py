@@ -0,0 +1,174 @@
+import asyncio
+import time
+import weakref
+
+from app_constants import PROVIDER_CONCURRENCY, DEFAULT_PROVIDER_CONCURRENCY
+from token_accounting import current_stage
+from tracing import span
+
+# Per-provider semaphores of each event loop: {loop: {provider: asyncio.Semaphore}}
+_provider_semaphores = weakref.WeakKeyDictionary()
+
+
+def check_stages(stages):
+    """Check that every dependency is a known stage and that the stages form a DAG (no cycle).
+    Raise a ValueError otherwise."""
+
+    for name, (_, dependencies) in stages.items():
+        for dependency in dependencies:
+            if dependency not in stages:
+                raise ValueError(
+                    f"Stage '{name}' depends on unknown stage '{dependency}'."
+                )
+
+    # Kahn's algorithm: remove stages whose dependencies are all resolved.
+    resolved = set()
+    remaining = dict(stages)
+    while remaining:
+        ready = [
+            name
+            for name, (_, dependencies) in remaining.items()
+            if set(dependencies) <= resolved
+        ]
+        if not ready:
+            raise ValueError(f"Cyclic dependencies between stages: {list(remaining)}")
+        for name in ready:
+            resolved.add(name)
+            del remaining[name]
+
+
+async def run_stages(stages, max_concurrency=4, on_stage_done=None):
+    """Run a DAG of async stages. Each stage starts as soon as all its dependencies are done,
+    independent stages run concurrently.
+    Parameters:
+     - stages (dict): {stage_name: (coroutine_function, [dependency stage names])}.
+        The coroutine function is called with the results of its dependencies (in the same order).
+     - max_concurrency (int): maximum number of stages running at the same time.
+     - on_stage_done: if not None, function called with (stage_name, result) as soon as a stage is done.
+    Output:
+     - results (dict): {stage_name: result}
+    """
+    check_stages(stages)
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = {}
+
+    async def run_stage(name):
+        stage_function, dependencies = stages[name]
+        inputs = [await tasks[dependency] for dependency in dependencies]
+        current_stage.set(name)  # tokens are counted per stage (in this task only)
+        async with semaphore:
+            start = time.perf_counter()
+            with span(name, "stage", dependencies=dependencies):
+                result = await stage_function(*inputs)
+            print(f"[INFO] stage '{name}' done in {time.perf_counter() - start:.2f}s")
+        if on_stage_done is not None:
+            on_stage_done(name, result)
+        return result
+
+    # All tasks are created before any of them runs, so `tasks` is complete when a stage awaits its dependencies.
+    for name in stages:
+        tasks[name] = asyncio.create_task(run_stage(name))
+
+    results = await asyncio.gather(*tasks.values())
+
+    return dict(zip(tasks.keys(), results))
+
+
+def get_provider_semaphore(provider):
+    """Return the semaphore limiting the concurrent calls to the LLM provider.
+    The semaphore is shared by all the fan-outs running in the current event loop."""
+
+    semaphores = _provider_semaphores.setdefault(asyncio.get_running_loop(), {})
+    if provider not in semaphores:
+        semaphores[provider] = asyncio.Semaphore(
+            PROVIDER_CONCURRENCY.get(provider, DEFAULT_PROVIDER_CONCURRENCY)
+        )
+    return semaphores[provider]
+
+
+async def fan_out(coroutine_function, items, provider, label="item"):
+    """Call `coroutine_function(item)` for each item in parallel,
+    with at most PROVIDER_CONCURRENCY[provider] calls in flight.
+    Parameters:
+     - coroutine_function: async function called with each item.
+     - items (list): the items (for example, work experiences or projects).
+     - provider (str): the LLM provider, used to select the concurrency limit.
+     - label (str): used to report the latency of each item.
+    Output:
+     - results (list): the results in the same order as `items`.
+        If the call fails for an item, the exception is returned in its place; the other items are not affected.
+     - latencies (list): the latency of each item in seconds.
+    """
+    semaphore = get_provider_semaphore(provider)
+
+    async def run_item(i, item):
+        async with semaphore:
+            start = time.perf_counter()
+            with span(f"{label} {i+1}", "fan_out") as attributes:
+                try:
+                    result = await coroutine_function(item)
+                except Exception as exception:
+                    print(f"[ERROR] {label} {i+1}: {exception}")
+                    attributes["error"] = repr(exception)
+                    result = exception
+            latency = time.perf_counter() - start
+        print(f"[INFO] {label} {i+1}/{len(items)} done in {latency:.2f}s")
+        return result, latency
+
+    outputs = await asyncio.gather(*[run_item(i, item) for i, item in enumerate(items)])
+
+    results = [result for result, _ in outputs]
+    latencies = [latency for _, latency in outputs]
+
+    return results, latencies
+
+
+class EarlyStarts:
+    """Items of a stage started before the stage itself, as soon as an upstream stage streams them
+    (e.g. the work experiences of a streamed LLM response, see llm_functions.call_LLM).
+    Each item started early runs `coroutine_function(item)` with the provider concurrency limit of fan_out;
+    the stage then takes the task of each of its items by key (see `pop`) and runs the other items itself.
+    """
+
+    def __init__(self, coroutine_function, provider, stage_name, label="item"):
+        self.coroutine_function = coroutine_function
+        self.provider = provider
+        self.stage_name = stage_name
+        self.label = label
+        self.tasks = {}
+        self.started = 0
+
+    def start(self, key, item):
+        """Start the item in a task of the running event loop, unless an item with the same key was started."""
+        if key not in self.tasks:
+            self.started += 1
+            self.tasks[key] = asyncio.create_task(self.run_item(self.started, item))
+
+    async def run_item(self, number, item):
+        current_stage.set(
+            self.stage_name
+        )  # tokens are counted in the stage of the item
+        async with get_provider_semaphore(self.provider):
+            start = time.perf_counter()
+            with span(f"{self.label} {number} (early start)", "fan_out") as attributes:
+                try:
+                    result = await self.coroutine_function(item)
+                except Exception as exception:
+                    print(f"[ERROR] {self.label} {number}: {exception}")
+                    attributes["error"] = repr(exception)
+                    result = exception
+        print(
+            f"[INFO] {self.label} {number} (early start) done in {time.perf_counter() - start:.2f}s"
+        )
+        return result
+
+    def pop(self, key):
+        """Return the task of the item started with this key, or None."""
+        return self.tasks.pop(key, None)
+
+    def cancel(self):
+        """Cancel the items that were started but not used by the stage."""
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
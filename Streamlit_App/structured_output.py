@@ -0,0 +1,413 @@
+"""Typed schemas of the LLM responses, provider structured output and parse statistics.
+
+Each resume section of `templates` (app_constants.py) has a typed schema. With structured output,
+the schema of the expected response is sent to the provider:
+ - OpenAI: function calling, with the response schema as the only tool (the arguments are the response),
+   or JSON mode for free-form dictionaries (e.g. the work duties) and for the prompts starting with the resume
+   in the "resume_first" layout (the tools come before the messages in the provider prompt cache:
+   a different tool per stage would break their shared prefix),
+ - Google: not supported by langchain-google-genai; the response is requested by the prompt only.
+In all cases, the response is validated (and coerced: scores to integers...) against the schema.
+The outcome of each response parsing is counted per stage (see ParseStats).
+"""
+
+import contextvars, functools, threading
+from typing import Dict, List, Union, get_origin
+
+from langchain_core.messages import AIMessage
+from langchain_core.pydantic_v1 import (
+    BaseModel,
+    Field,
+    create_model,
+    parse_obj_as,
+    validator,
+)
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from json_scanner import scan_json
+from token_accounting import current_stage
+
+###############################################################################
+#                           Response schemas
+###############################################################################
+
+
+# Types of the text fields: dictionaries and lists answered for these fields are converted to text (see to_text).
+TEXT_TYPES = [str, List[str], Union[List[str], str]]
+
+
+def to_text(value):
+    """Convert a nested value to text, e.g. {"platform": "GitHub", "url": "..."} to "platform: GitHub, url: ..."."""
+    if isinstance(value, dict):
+        return ", ".join(f"{key}: {to_text(item)}" for key, item in value.items())
+    if isinstance(value, list):
+        return ", ".join(to_text(item) for item in value)
+    return str(value)
+
+
+# Base schema of the responses: missing or null texts are "unknown", scores are integers (-1 if not a number),
+# lists answered as unknown (see EXTRACTION_UNKNOWN in prompt_templates.py) are empty,
+# nested values of text fields are converted to text.
+# The docstrings of the schemas are their descriptions in the provider function calling.
+class ResponseModel(BaseModel):
+    @validator("*", pre=True)
+    def replace_null(cls, value, field):
+        if value is None and field.outer_type_ is not int:
+            return "unknown"
+        return value
+
+    @validator("*", pre=True)
+    def convert_score(cls, value, field):
+        if field.outer_type_ is not int:
+            return value
+        try:
+            return int(float(str(value).strip()))
+        except (TypeError, ValueError):
+            return -1
+
+    @validator("*", pre=True)
+    def replace_unknown_list(cls, value, field):
+        """Lists: "unknown", ["unknown"] and null are empty lists; the items of a list of models
+        that are not dictionaries are dropped."""
+        if get_origin(field.outer_type_) is not list:
+            return value
+        if value is None or value == "unknown" or value == ["unknown"]:
+            return []
+        if (
+            isinstance(value, list)
+            and isinstance(field.type_, type)
+            and issubclass(field.type_, BaseModel)
+        ):
+            return [item for item in value if isinstance(item, dict)]
+        return value
+
+    @validator("*", pre=True)
+    def convert_to_text(cls, value, field):
+        if field.outer_type_ not in TEXT_TYPES or not isinstance(value, (dict, list)):
+            return value
+        if field.outer_type_ is str or isinstance(value, dict):
+            return to_text(value)
+        return [item if isinstance(item, str) else to_text(item) for item in value]
+
+
+class ContactInformation(ResponseModel):
+    candidate__name: str = "unknown"
+    candidate__title: str = "unknown"
+    candidate__location: str = "unknown"
+    candidate__email: str = "unknown"
+    candidate__phone: str = "unknown"
+    candidate__social_media: Union[List[str], str] = "unknown"
+    evaluation__ContactInfo: str = "unknown"
+    score__ContactInfo: int = -1
+
+
+class WorkExperience(ResponseModel):
+    job__title: str = "unknown"
+    job__company: str = "unknown"
+    job__start_date: str = "unknown"
+    job__end_date: str = "unknown"
+
+
+class Project(ResponseModel):
+    project__title: str = "unknown"
+    project__start_date: str = "unknown"
+    project__end_date: str = "unknown"
+
+
+class Education(ResponseModel):
+    edu__college: str = "unknown"
+    edu__degree: str = "unknown"
+    edu__start_date: str = "unknown"
+    edu__end_date: str = "unknown"
+
+
+class EducationEvaluation(ResponseModel):
+    score__edu: int = -1
+    evaluation__edu: str = "unknown"
+
+
+class SkillsEvaluation(ResponseModel):
+    score__skills: int = -1
+    evaluation__skills: str = "unknown"
+
+
+class Language(ResponseModel):
+    spoken__language: str = "unknown"
+    language__fluency: str = "unknown"
+
+
+class LanguagesEvaluation(ResponseModel):
+    score__language: int = -1
+    evaluation__language: str = "unknown"
+
+
+class Certification(ResponseModel):
+    certif__title: str = "unknown"
+    certif__organization: str = "unknown"
+    certif__date: str = "unknown"
+    certif__expiry_date: str = "unknown"
+    certif__details: str = "unknown"
+
+
+class CertificationsEvaluation(ResponseModel):
+    score__certif: int = -1
+    evaluation__certif: str = "unknown"
+
+
+# Type of each resume section of `templates`.
+SECTION_SCHEMAS = {
+    "Contact__information": ContactInformation,
+    "CV__summary": str,
+    "Work__experience": List[WorkExperience],
+    "CV__Projects": List[Project],
+    "CV__Education": List[Education],
+    "Education__evaluation": EducationEvaluation,
+    "candidate__skills": List[str],
+    "Skills__evaluation": SkillsEvaluation,
+    "CV__Languages": List[Language],
+    "Languages__evaluation": LanguagesEvaluation,
+    "CV__Certifications": List[Certification],
+    "Certif__evaluation": CertificationsEvaluation,
+}
+
+
+class SummaryEvaluation(ResponseModel):
+    """Evaluation and enhanced version of the resume summary."""
+
+    evaluation__summary: str = "unknown"
+    score__summary: int = -1
+    CV__summary_enhanced: str = "unknown"
+
+
+class WorkExperienceImprovement(ResponseModel):
+    """Evaluation and improved text of a work experience."""
+
+    Score__WorkExperience: int = -1
+    Comments__WorkExperience: str = ""
+    Improvement__WorkExperience: str = ""
+
+
+class ProjectImprovement(ResponseModel):
+    """Evaluation and improved text of a project."""
+
+    Score__project: int = -1
+    Comments__project: str = ""
+    Improvement__project: str = ""
+
+
+class ResumeEvaluation(ResponseModel):
+    """Overview, top 3 strengths and top 3 weaknesses of the resume."""
+
+    resume_cv_overview: str = "unknown"
+    top_3_strengths: str = "unknown"
+    top_3_weaknesses: str = "unknown"
+
+
+# Work duties: {duty id: duty}. Free-form keys: requested with JSON mode instead of function calling.
+WorkDuties = Dict[str, str]
+
+
+def get_section_default(section_schema):
+    """Default of a missing section: "unknown" texts, empty lists, or the defaults of the model."""
+    if get_origin(section_schema) is list:
+        return Field(default_factory=list)
+    if isinstance(section_schema, type) and issubclass(section_schema, BaseModel):
+        return Field(default_factory=section_schema)
+    return "unknown"
+
+
+@functools.lru_cache(maxsize=None)
+def get_sections_schema(resume_sections):
+    """Return the schema of a response made of the resume sections (tuple of `templates` keys).
+    A missing section gets its default (see get_section_default): the other sections are kept.
+    """
+    schema = create_model(
+        "Resume_sections",
+        __base__=ResponseModel,
+        **{
+            section: (
+                SECTION_SCHEMAS[section],
+                get_section_default(SECTION_SCHEMAS[section]),
+            )
+            for section in resume_sections
+        },
+    )
+    schema.__doc__ = "The requested resume sections."
+    return schema
+
+
+def validate_response(schema, data):
+    """Validate the parsed response against the schema. Return the coerced data (dicts and lists).
+    Raise a ValidationError if the response does not match the schema."""
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.parse_obj(data).dict()
+    return parse_obj_as(schema, data)
+
+
+###############################################################################
+#                   Structured output of the providers
+###############################################################################
+
+
+def is_structured_output_enabled(llm):
+    """Return True if the LLM was instantiated with structured output (see instantiate_LLM)."""
+    return bool((getattr(llm, "metadata", None) or {}).get("structured_output"))
+
+
+def get_schema_name(schema):
+    """Name of the schema, used in the LLM cache key and the traces."""
+    return getattr(schema, "__name__", None) or str(schema)
+
+
+def bind_schema(llm, provider, schema, json_mode=False):
+    """Return the LLM bound to the structured output of the schema, or the LLM itself
+    if the provider does not support structured output.
+    Models (classes) are sent as the only tool the LLM must call; other schemas, or all of them with json_mode
+    (the prompt must mention json), use JSON mode.
+    """
+    if provider not in ["OpenAI", "Fake"]:
+        return llm
+    if not json_mode and isinstance(schema, type) and issubclass(schema, BaseModel):
+        tool = convert_to_openai_tool(schema)
+        return llm.bind(
+            tools=[tool],
+            tool_choice={
+                "type": "function",
+                "function": {"name": tool["function"]["name"]},
+            },
+        )
+    return llm.bind(response_format={"type": "json_object"})
+
+
+def get_structured_response(response):
+    """Return the response with the arguments of its tool call (if any) as content."""
+    tool_calls = response.additional_kwargs.get("tool_calls")
+    if not tool_calls:
+        return response
+    return AIMessage(content=tool_calls[0]["function"]["arguments"])
+
+
+def get_streamed_text(chunk):
+    """Return the text of a streamed message chunk: its content, or the arguments delta of its tool call."""
+    tool_calls = chunk.additional_kwargs.get("tool_calls")
+    if not tool_calls:
+        return chunk.content
+    return tool_calls[0].get("function", {}).get("arguments") or ""
+
+
+###############################################################################
+#                           Parse statistics
+###############################################################################
+
+# Parse statistics of the current run (see `track_parsing`), copied to the asyncio tasks.
+current_parse_stats = contextvars.ContextVar("current_parse_stats", default=None)
+
+# Outcomes of a response parsing:
+# "valid": valid json matching the schema; "repaired": malformed json repaired by the json scanner;
+# "failed": no usable response (the section is "unknown").
+PARSE_OUTCOMES = ["valid", "repaired", "failed"]
+
+
+class ParseStats:
+    """Counters of the parse outcomes, per stage and in total."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, stage, outcome):
+        with self._lock:
+            counters = self.stages.setdefault(
+                stage or "other", {outcome: 0 for outcome in PARSE_OUTCOMES}
+            )
+            counters[outcome] += 1
+
+    def totals(self):
+        with self._lock:
+            totals = {outcome: 0 for outcome in PARSE_OUTCOMES}
+            for counters in self.stages.values():
+                for outcome in PARSE_OUTCOMES:
+                    totals[outcome] += counters[outcome]
+        return totals
+
+    def as_dict(self):
+        """Return the totals and the counters of each stage, with their failure rate
+        (share of the responses that were not valid)."""
+
+        def with_failure_rate(counters):
+            responses = sum(counters.values())
+            failures = responses - counters["valid"]
+            return dict(counters, failure_rate=failures / max(1, responses))
+
+        totals = self.totals()
+        with self._lock:
+            stages = {
+                stage: with_failure_rate(counters)
+                for stage, counters in self.stages.items()
+            }
+        return {"total": with_failure_rate(totals), "stages": stages}
+
+
+def track_parsing():
+    """Start counting the parse outcomes of a run in the current context. Return its ParseStats."""
+    parse_stats = ParseStats()
+    current_parse_stats.set(parse_stats)
+    return parse_stats
+
+
+def record_parse(outcome):
+    """Record the outcome of a response parsing in the current run and stage."""
+    parse_stats = current_parse_stats.get()
+    if parse_stats is not None:
+        parse_stats.record(current_stage.get(), outcome)
+
+
+def get_json_root(schema):
+    """Return the root container of the json responses of the schema: '{' for models and dictionaries,
+    '[' for lists, None if unknown (see json_scanner.find_json_start)."""
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return "{"
+    origin = get_origin(schema)
+    if origin is dict:
+        return "{"
+    if origin is list:
+        return "["
+    return None
+
+
+def is_valid_response(response_content, schema):
+    """Return True if the response is valid json matching the schema ("valid" outcome of parse_response:
+    malformed or truncated json, even if repaired, is not valid).
+    The outcome is not recorded in the parse statistics."""
+    try:
+        data, repairs = scan_json(response_content, get_json_root(schema))
+        validate_response(schema, data)
+    except Exception:
+        return False
+    return not repairs
+
+
+def parse_response(response_content, schema):
+    """Scan the json response (see json_scanner.py: malformed json is repaired), starting at the root container
+    expected by the schema, and validate it against the schema.
+    The outcome is recorded in the parse statistics of the current stage.
+    Parameters:
+     - response_content (str): the content of the LLM response.
+     - schema: the expected response (a ResponseModel class or a typing type).
+    Output:
+     - the validated response. Raise an exception if the response can not be parsed or does not match the schema.
+    """
+    try:
+        data, repairs = scan_json(response_content, get_json_root(schema))
+        parsed_response = validate_response(schema, data)
+    except Exception as e:
+        print("[ERROR] The response is not valid:", e)
+        record_parse("failed")
+        raise
+
+    if repairs:
+        print(f"[INFO] Repaired json response: {', '.join(sorted(repairs))}")
+        record_parse("repaired")
+    else:
+        record_parse("valid")
+    return parsed_response
@@ -0,0 +1,4 @@
+import os, sys
+
+# The modules of the app are imported from Streamlit_App (like the benchmarks).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,22 @@
+from json_scanner import scan_json
+
+
+def test_missing_comma_after_nested_object():
+    value, repairs = scan_json('{"a": {"b": "c"}  "d": "e"}')
+
+    assert value == {"a": {"b": "c"}, "d": "e"}
+    assert repairs == {"missing comma"}
+
+
+def test_missing_comma_after_nested_array():
+    value, repairs = scan_json('{"a": [1, 2]\n"d": "e"}')
+
+    assert value == {"a": [1, 2], "d": "e"}
+    assert repairs == {"missing comma"}
+
+
+def test_valid_nested_json_has_no_repairs():
+    assert scan_json('Here is the json: {"a": {"b": ["c"]}, "d": "e"} Done.') == (
+        {"a": {"b": ["c"]}, "d": "e"},
+        set(),
+    )
@@ -0,0 +1,51 @@
+import asyncio
+from typing import List
+
+from fake_models import FakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import llm_functions
+from llm_cache import LLMCache
+from structured_output import SummaryEvaluation
+
+
+class ScriptedChatModel(FakeChatModel):
+    """Fake chat model returning the scripted contents in order, without latency."""
+
+    contents: List[str] = []
+    calls: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        content = self.contents[self.calls]
+        self.calls += 1
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))]
+        )
+
+
+def test_invalid_response_is_not_served_from_the_cache(tmp_path, monkeypatch):
+    cache = LLMCache(db_path=tmp_path / "llm_cache.db")
+    monkeypatch.setattr(llm_functions, "get_llm_cache", lambda: cache)
+    valid_content = '{"evaluation__summary": "Clear.", "score__summary": 70, "CV__summary_enhanced": "Better."}'
+    llm = ScriptedChatModel(contents=['{"evaluation__summary": "Cle', valid_content])
+
+    for _ in range(2):
+        response = asyncio.run(
+            llm_functions.call_LLM(
+                llm, "Evaluate the summary.", schema=SummaryEvaluation
+            )
+        )
+
+    # The truncated response was not cached: the second call reached the model.
+    assert llm.calls == 2
+    assert response.content == valid_content
+    assert cache.stats()["entries"] == 1
+
+
+def test_invalid_cached_response_is_evicted(tmp_path):
+    cache = LLMCache(db_path=tmp_path / "llm_cache.db")
+    cache.update("key", "not json")
+
+    assert cache.lookup("key", is_valid=lambda content: False) is None
+    assert cache.stats()["entries"] == 0
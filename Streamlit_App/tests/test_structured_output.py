@@ -0,0 +1,37 @@
+from structured_output import get_sections_schema, parse_response
+
+CONTACT_AND_SKILLS = ("Contact__information", "candidate__skills", "CV__Certifications")
+
+
+def test_missing_section_keeps_the_other_sections():
+    response = '{"Contact__information": {"candidate__name": "Jane Doe"}, "candidate__skills": ["Python"]}'
+
+    sections = parse_response(response, get_sections_schema(CONTACT_AND_SKILLS))
+
+    assert sections["Contact__information"]["candidate__name"] == "Jane Doe"
+    assert sections["candidate__skills"] == ["Python"]
+    assert sections["CV__Certifications"] == []
+
+
+def test_social_media_list_of_dicts_is_converted_to_text():
+    response = """{"Contact__information": {"candidate__name": "Jane Doe", "candidate__social_media": [
+        {"platform": "GitHub", "url": "https://github.com/janedoe"}, "https://linkedin.com/in/janedoe"]}}"""
+
+    sections = parse_response(response, get_sections_schema(CONTACT_AND_SKILLS))
+
+    assert sections["Contact__information"]["candidate__social_media"] == [
+        "platform: GitHub, url: https://github.com/janedoe",
+        "https://linkedin.com/in/janedoe",
+    ]
+
+
+def test_list_sections_answered_as_unknown_are_empty():
+    for unknown in ['["unknown"]', '"unknown"', "null"]:
+        response = (
+            f'{{"candidate__skills": {unknown}, "CV__Certifications": {unknown}}}'
+        )
+
+        sections = parse_response(response, get_sections_schema(CONTACT_AND_SKILLS))
+
+        assert sections["candidate__skills"] == []
+        assert sections["CV__Certifications"] == []
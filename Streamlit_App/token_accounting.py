@@ -0,0 +1,200 @@
+import contextvars, functools, threading
+
+import tiktoken
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app_constants import LLM_PRICING
+
+# Token usage of the current run (see `track_run`) and the current analysis stage (set by the scheduler).
+# Context variables are copied to the asyncio tasks, so concurrent stages and runs are counted separately.
+current_run_usage = contextvars.ContextVar("current_run_usage", default=None)
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(model="gpt-3.5-turbo-0125"):
+    """Return the tiktoken encoding of the model (loaded once per model).
+    Models unknown to tiktoken (e.g. gemini-pro) use cl100k_base: their counts are estimates.
+    Return None if the encoding cannot be loaded."""
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"[ERROR] Could not load the tiktoken encoding of {model}: {e}")
+        return None
+
+
+def count_tokens(texts, model="gpt-3.5-turbo-0125"):
+    """Return the token count of each text, encoded in a single batch.
+    Without an encoding, the count is estimated from the text length (about 4 characters per token).
+    """
+    encoding = get_encoding(model or "gpt-3.5-turbo-0125")
+    if encoding is None:
+        return [len(text) // 4 + 1 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(list(texts))]
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Langchain callback collecting the token usage reported by the provider."""
+
+    def __init__(self):
+        super().__init__()
+        self.usage = None
+
+    def on_llm_end(self, response, **kwargs):
+        llm_output = response.llm_output or {}
+        self.usage = llm_output.get("token_usage") or llm_output.get("usage_metadata")
+
+
+def get_provider_usage(usage):
+    """Return (prompt_tokens, completion_tokens) from the usage metadata of OpenAI or Google,
+    or None if the usage is not available."""
+    if not usage:
+        return None
+    if "prompt_tokens" in usage:  # OpenAI
+        return usage["prompt_tokens"], usage.get("completion_tokens", 0)
+    if "prompt_token_count" in usage:  # Google
+        return usage["prompt_token_count"], usage.get("candidates_token_count", 0)
+    return None
+
+
+def get_cached_prompt_tokens(usage):
+    """Return the prompt tokens read from the prompt cache of the provider (OpenAI or Google), or 0."""
+    if not usage:
+        return 0
+    if "prompt_tokens" in usage:  # OpenAI
+        return (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return usage.get("cached_content_token_count") or 0  # Google
+
+
+def get_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens=0):
+    """Estimated cost in USD of the tokens, from LLM_PRICING (0 if the model is unknown).
+    The cached prompt tokens (included in prompt_tokens) are billed at the "cached_input" price.
+    """
+    pricing = LLM_PRICING.get(model)
+    if pricing is None:
+        return 0.0
+    return (
+        (prompt_tokens - cached_prompt_tokens) * pricing["input"]
+        + cached_prompt_tokens * pricing.get("cached_input", pricing["input"])
+        + completion_tokens * pricing["output"]
+    ) / 1e6
+
+
+class TokenUsage:
+    """Token counters, per stage and in total.
+    Calls answered by the LLM cache are counted separately (`cached_calls`): they are not billed.
+    `cached_prompt_tokens` are the prompt tokens read from the prompt cache of the provider
+    (included in `prompt_tokens`, billed at a discount).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def record(
+        self,
+        stage,
+        prompt_tokens,
+        completion_tokens,
+        cost,
+        cached=False,
+        cached_prompt_tokens=0,
+    ):
+        with self._lock:
+            counters = self.stages.setdefault(
+                stage or "other",
+                {
+                    "calls": 0,
+                    "cached_calls": 0,
+                    "prompt_tokens": 0,
+                    "cached_prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost_usd": 0.0,
+                },
+            )
+            if cached:
+                counters["cached_calls"] += 1
+                return
+            counters["calls"] += 1
+            counters["prompt_tokens"] += prompt_tokens
+            counters["cached_prompt_tokens"] += cached_prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            counters["cost_usd"] += cost
+
+    def totals(self):
+        with self._lock:
+            totals = {
+                "calls": 0,
+                "cached_calls": 0,
+                "prompt_tokens": 0,
+                "cached_prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cost_usd": 0.0,
+            }
+            for counters in self.stages.values():
+                for key in totals:
+                    totals[key] += counters[key]
+        return totals
+
+    def as_dict(self):
+        """Return the totals and the counters of each stage (saved with the results)."""
+        totals = self.totals()
+        with self._lock:
+            stages = {stage: dict(counters) for stage, counters in self.stages.items()}
+        return {"total": totals, "stages": stages}
+
+
+# Process-wide counters per provider: {provider: TokenUsage (one "stage" per model)}
+_provider_usage = {}
+_provider_usage_lock = threading.Lock()
+
+
+def record_LLM_call(provider, model, prompt, completion, usage=None, cached=False):
+    """Record the tokens of an LLM call in the current run, stage and provider counters.
+    The usage metadata of the provider is used when available; otherwise the tokens are counted locally.
+    Output:
+     - (prompt_tokens, completion_tokens, cached_prompt_tokens)
+    """
+    provider_usage = get_provider_usage(usage)
+    if provider_usage is not None:
+        prompt_tokens, completion_tokens = provider_usage
+    else:
+        prompt_tokens, completion_tokens = count_tokens([prompt, completion], model)
+    cached_prompt_tokens = get_cached_prompt_tokens(usage)
+    cost = get_cost(model, prompt_tokens, completion_tokens, cached_prompt_tokens)
+
+    run_usage = current_run_usage.get()
+    if run_usage is not None:
+        run_usage.record(
+            current_stage.get(),
+            prompt_tokens,
+            completion_tokens,
+            cost,
+            cached,
+            cached_prompt_tokens,
+        )
+
+    with _provider_usage_lock:
+        counters = _provider_usage.setdefault(provider, TokenUsage())
+    counters.record(
+        model, prompt_tokens, completion_tokens, cost, cached, cached_prompt_tokens
+    )
+
+    return prompt_tokens, completion_tokens, cached_prompt_tokens
+
+
+def track_run():
+    """Start counting the tokens of a run in the current context. Return its TokenUsage."""
+    run_usage = TokenUsage()
+    current_run_usage.set(run_usage)
+    return run_usage
+
+
+def get_provider_usage_totals():
+    """Return the process-wide token counters of each provider: {provider: {"total":..., "stages": {model:...}}}."""
+    with _provider_usage_lock:
+        providers = dict(_provider_usage)
+    return {provider: usage.as_dict() for provider, usage in providers.items()}
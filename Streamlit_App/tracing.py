@@ -0,0 +1,124 @@
+import asyncio, contextlib, contextvars, datetime, itertools, json, os, threading, time, uuid
+
+from app_constants import TRACES_DIR
+
+# The trace being recorded and the current span, copied to the asyncio tasks (see `trace` and `span`).
+current_tracer = contextvars.ContextVar("current_tracer", default=None)
+current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Collect the spans of a trace and export them in the Chrome trace event format
+    (viewable in chrome://tracing or https://ui.perfetto.dev).
+    Each span also carries OpenTelemetry-style trace_id, span_id and parent_span_id attributes.
+    Spans of concurrent asyncio tasks are displayed on separate lanes (one lane per task).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = uuid.uuid4().hex
+        self.start = time.perf_counter()
+        self.events = []
+        self._lanes = {}
+        self._span_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.trace_path = None  # set by `export`
+
+    def get_lane(self):
+        """Return the lane (Chrome trace tid) of the current asyncio task, or of the current thread."""
+        try:
+            owner = id(asyncio.current_task())
+        except RuntimeError:  # no running event loop
+            owner = threading.get_ident()
+        with self._lock:
+            return self._lanes.setdefault(owner, len(self._lanes) + 1)
+
+    def new_span_id(self):
+        with self._lock:
+            return f"{next(self._span_ids):016x}"
+
+    def add_event(self, name, category, start, end, lane, attributes):
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.start) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": lane,
+            "args": attributes,
+        }
+        with self._lock:
+            self.events.append(event)
+
+    def export(self, trace_path=None):
+        """Write the trace to trace_path (default: TRACES_DIR/trace_<timestamp>.json). Return the path."""
+        if trace_path is None:
+            TRACES_DIR.mkdir(parents=True, exist_ok=True)
+            now = (datetime.datetime.now()).strftime("%Y%m%d_%H%M%S_%f")
+            trace_path = TRACES_DIR.joinpath(f"trace_{now}.json")
+        with self._lock:
+            events = sorted(self.events, key=lambda event: event["ts"])
+        with open(trace_path, "w") as fp:
+            json.dump(
+                {
+                    "traceEvents": events,
+                    "displayTimeUnit": "ms",
+                    "otherData": {"name": self.name, "trace_id": self.trace_id},
+                },
+                fp,
+            )
+        self.trace_path = trace_path
+        return trace_path
+
+
+@contextlib.contextmanager
+def span(name, category="app", **attributes):
+    """Record a span around a block of code (sync or async).
+    Yield the attributes dict: add attributes known at the end of the block (token counts, cache hit...).
+    Does nothing but yield the attributes when no trace is being recorded."""
+    tracer = current_tracer.get()
+    if tracer is None:
+        yield attributes
+        return
+
+    span_id = tracer.new_span_id()
+    attributes.update(
+        trace_id=tracer.trace_id, span_id=span_id, parent_span_id=current_span.get()
+    )
+    token = current_span.set(span_id)
+    lane = tracer.get_lane()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield attributes
+    except BaseException as exception:
+        attributes["error"] = repr(exception)
+        raise
+    finally:
+        end = time.perf_counter()
+        # Process CPU time: includes the CPU time of the spans running at the same time.
+        attributes["cpu_s"] = round(time.process_time() - cpu_start, 6)
+        current_span.reset(token)
+        tracer.add_event(name, category, start, end, lane, attributes)
+
+
+@contextlib.contextmanager
+def trace(name, export=True, **attributes):
+    """Record a trace of the block (a root span named `name`), then export it to TRACES_DIR if `export`.
+    Yield the Tracer (its `trace_path` is set once the trace is exported)."""
+    tracer = Tracer(name)
+    tracer_token = current_tracer.set(tracer)
+    span_token = current_span.set(None)
+    try:
+        with span(name, "run", **attributes):
+            yield tracer
+    finally:
+        current_span.reset(span_token)
+        current_tracer.reset(tracer_token)
+        if export:
+            try:
+                trace_path = tracer.export()
+                print(f"[INFO] trace saved to {trace_path}")
+            except Exception as e:
+                print(f"[ERROR] Could not save the trace: {e}")